@@ -11,22 +11,96 @@ class Settings:
     EPICOR_PASSWORD = os.getenv("EPICOR_PASSWORD", "")
     EPICOR_COMPANY = os.getenv("EPICOR_COMPANY", "")
     EPICOR_BAQ_ID = os.getenv("EPICOR_BAQ_ID", "PO_Test")
+    EPICOR_TIMEOUT = int(os.getenv("EPICOR_TIMEOUT", "30"))  # seconds per request
+    EPICOR_PAGE_SIZE = int(os.getenv("EPICOR_PAGE_SIZE", "5000"))
+    EPICOR_MAX_CONCURRENT_PAGES = int(os.getenv("EPICOR_MAX_CONCURRENT_PAGES", "4"))
+    EPICOR_PAGE_ORDER_BY = os.getenv("EPICOR_PAGE_ORDER_BY", "PODetail_PONUM,PODetail_POLine")
+    EPICOR_CHANGE_FIELD = os.getenv("EPICOR_CHANGE_FIELD", "")  # BAQ column for delta syncs
+    PO_SYNC_CHUNK_SIZE = int(os.getenv("PO_SYNC_CHUNK_SIZE", "500"))
+    LIST_DEFAULT_LIMIT = int(os.getenv("LIST_DEFAULT_LIMIT", "100"))  # PO listing and review queue page size
+    LIST_MAX_LIMIT = int(os.getenv("LIST_MAX_LIMIT", "1000"))
     
     # Database
     DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./app.db")
+    ASYNC_DATABASE_URL = os.getenv("ASYNC_DATABASE_URL", "")  # default: DATABASE_URL with aiosqlite/asyncpg
+    DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+    DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "20"))
+    DB_POOL_TIMEOUT = int(os.getenv("DB_POOL_TIMEOUT", "30"))  # seconds
+    DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))  # seconds
+    DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "True").lower() == "true"
+    DB_STATEMENT_TIMEOUT_MS = int(os.getenv("DB_STATEMENT_TIMEOUT_MS", "30000"))
+    DB_AUTO_MIGRATE = os.getenv("DB_AUTO_MIGRATE", "True").lower() == "true"  # alembic upgrade head on startup
+    # SQLite only: WAL journal and connection pragmas, and one writer thread per
+    # process that commits queued writes in batches
+    SQLITE_WAL = os.getenv("SQLITE_WAL", "True").lower() == "true"
+    SQLITE_SYNCHRONOUS = os.getenv("SQLITE_SYNCHRONOUS", "NORMAL")
+    SQLITE_MMAP_SIZE = int(os.getenv("SQLITE_MMAP_SIZE", "268435456"))
+    SQLITE_CACHE_SIZE_KB = int(os.getenv("SQLITE_CACHE_SIZE_KB", "65536"))
+    SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", str(DB_STATEMENT_TIMEOUT_MS)))
+    SQLITE_WRITE_QUEUE = os.getenv("SQLITE_WRITE_QUEUE", "True").lower() == "true"
+    SQLITE_WRITE_BATCH_MAX = int(os.getenv("SQLITE_WRITE_BATCH_MAX", "64"))
     
     # AI Configuration
     OPENAI_API_KEY = os.getenv("OPENAI_API_KEY", "")
+    OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL", "")  # empty = api.openai.com; set for proxies or stubs
     AI_MODEL = os.getenv("AI_MODEL", "gpt-4-turbo-preview")
+    AI_REQUESTS_PER_MINUTE = int(os.getenv("AI_REQUESTS_PER_MINUTE", "500"))
+    AI_TOKENS_PER_MINUTE = int(os.getenv("AI_TOKENS_PER_MINUTE", "150000"))
+    AI_MAX_CONCURRENT_REQUESTS = int(os.getenv("AI_MAX_CONCURRENT_REQUESTS", "32"))
+    AI_REQUEST_TIMEOUT = float(os.getenv("AI_REQUEST_TIMEOUT", "60"))  # seconds per call
+    LLM_CACHE_ENABLED = os.getenv("LLM_CACHE_ENABLED", "True").lower() == "true"
+    LLM_CACHE_MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "1024"))  # in-process LRU size
+    LLM_CACHE_TTL_SECONDS = int(os.getenv("LLM_CACHE_TTL_SECONDS", "604800"))  # 7 days
+    MATCH_CANDIDATE_LIMIT = int(os.getenv("MATCH_CANDIDATE_LIMIT", "50"))  # POs scored per invoice
+    MATCH_BATCH_CONCURRENCY = int(os.getenv("MATCH_BATCH_CONCURRENCY", "8"))
+    # Open-PO candidate index published as a memory-mapped file all workers share
+    PO_SNAPSHOT_ENABLED = os.getenv("PO_SNAPSHOT_ENABLED", "True").lower() == "true"
+    PO_SNAPSHOT_DIR = os.getenv("PO_SNAPSHOT_DIR", "./snapshots")
+    PO_SNAPSHOT_KEEP = int(os.getenv("PO_SNAPSHOT_KEEP", "3"))  # versions kept on disk
     
     # App
     SECRET_KEY = os.getenv("SECRET_KEY", "dev-secret-key")
     DEBUG = os.getenv("DEBUG", "True").lower() == "true"
     CORS_ORIGINS = os.getenv("CORS_ORIGINS", "http://localhost:3000,http://localhost:5173,http://localhost:8080").split(",")
+    METRICS_ENABLED = os.getenv("METRICS_ENABLED", "True").lower() == "true"  # /metrics endpoint
+    
+    # Request profiling
+    PROFILING_ENABLED = os.getenv("PROFILING_ENABLED", "True").lower() == "true"
+    PROFILE_SLOW_REQUEST_MS = int(os.getenv("PROFILE_SLOW_REQUEST_MS", "10000"))  # save a profile above this
+    PROFILE_HEADER_ENABLED = os.getenv("PROFILE_HEADER_ENABLED", "False").lower() == "true"  # honour X-Profile: 1
+    PROFILE_DIR = os.getenv("PROFILE_DIR", "./profiles")
+    PROFILE_SAMPLE_INTERVAL_MS = int(os.getenv("PROFILE_SAMPLE_INTERVAL_MS", "0"))  # 0 = no stack sampling; 50 = 20 Hz
+    PROFILE_SAMPLE_WINDOW_SECONDS = int(os.getenv("PROFILE_SAMPLE_WINDOW_SECONDS", "300"))
+    PROFILE_MAX_FILES = int(os.getenv("PROFILE_MAX_FILES", "200"))  # captures kept on disk
     
     # File Upload
     MAX_FILE_SIZE = int(os.getenv("MAX_FILE_SIZE", "52428800"))  # 50MB
     UPLOAD_DIR = os.getenv("UPLOAD_DIR", "./uploads")
+    UPLOAD_CHUNK_SIZE = int(os.getenv("UPLOAD_CHUNK_SIZE", "1048576"))  # 1MB streamed write size
+    UPLOAD_BATCH_MAX_FILES = int(os.getenv("UPLOAD_BATCH_MAX_FILES", "500"))  # incl. zip members
+    
+    # Extraction
+    EXTRACTION_WORKERS = int(os.getenv("EXTRACTION_WORKERS", str(os.cpu_count() or 1)))  # 0 = no process pool
+    EXTRACTION_MAX_TASKS_PER_CHILD = int(os.getenv("EXTRACTION_MAX_TASKS_PER_CHILD", "50"))
+    EXTRACTION_TIMEOUT = float(os.getenv("EXTRACTION_TIMEOUT", "120"))  # seconds per document
+    PDF_EXTRACTION_MODE = os.getenv("PDF_EXTRACTION_MODE", "lazy")  # lazy (chunked, early stop) or full
+    PDF_PAGE_CHUNK_SIZE = int(os.getenv("PDF_PAGE_CHUNK_SIZE", "8"))  # pages per worker task
+    PDF_STOP_WHEN_RESOLVED = os.getenv("PDF_STOP_WHEN_RESOLVED", "True").lower() == "true"
+    PDF_REQUIRED_FIELDS = [f for f in os.getenv(
+        "PDF_REQUIRED_FIELDS", "invoice_number,invoice_date,invoice_amount,po_reference"
+    ).split(",") if f]
+    PDF_STOP_CONFIDENCE = float(os.getenv("PDF_STOP_CONFIDENCE", "0.9"))  # label-rule matches only
+    EXTRACTION_RULES_FILE = os.getenv("EXTRACTION_RULES_FILE", "")  # JSON field rules; empty = built-in
+    EXTRACTION_CACHE_ENABLED = os.getenv("EXTRACTION_CACHE_ENABLED", "True").lower() == "true"
+    
+    # Background jobs
+    JOBS_ENABLED = os.getenv("JOBS_ENABLED", "True").lower() == "true"
+    JOB_WORKERS = int(os.getenv("JOB_WORKERS", "4"))  # per API process
+    JOB_POLL_INTERVAL = float(os.getenv("JOB_POLL_INTERVAL", "1.0"))  # seconds
+    JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "5"))
+    JOB_RETRY_BASE_SECONDS = float(os.getenv("JOB_RETRY_BASE_SECONDS", "5"))
+    JOB_RETRY_MAX_SECONDS = float(os.getenv("JOB_RETRY_MAX_SECONDS", "600"))
+    JOB_LEASE_SECONDS = int(os.getenv("JOB_LEASE_SECONDS", "900"))  # reclaim jobs stuck "running"
     
     # Create upload directory if it doesn't exist
     os.makedirs(UPLOAD_DIR, exist_ok=True)
@@ -5,7 +5,8 @@ from fastapi.staticfiles import StaticFiles
 import logging
 import os
 from app.config import settings
-from app.routes import invoices, purchase_orders
+from app.middleware import ProfilingMiddleware, TimedJSONResponse
+from app.routes import invoices, jobs, metrics, purchase_orders
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -15,7 +16,8 @@ logger = logging.getLogger(__name__)
 app = FastAPI(
     title="Invoice to PO Matching API",
     description="AI-powered invoice to purchase order matching system for Epicor",
-    version="1.0.0"
+    version="1.0.0",
+    default_response_class=TimedJSONResponse
 )
 
 # Add CORS middleware
@@ -25,11 +27,18 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Request-ID", "Server-Timing"],
 )
 
+# Outermost, so the request timing covers every other middleware
+if settings.PROFILING_ENABLED:
+    app.add_middleware(ProfilingMiddleware)
+
 # Include routers
 app.include_router(invoices.router)
 app.include_router(purchase_orders.router)
+app.include_router(jobs.router)
+app.include_router(metrics.router)
 
 @app.get("/")
 def read_root():
@@ -49,20 +58,36 @@ def health_check():
 async def startup_event():
     """Initialize app on startup"""
     logger.info("Starting Invoice to PO Matching API")
-    # Initialize database tables
-    try:
-        from sqlalchemy import create_engine
-        from app.models.database import Base
-        engine = create_engine(settings.DATABASE_URL)
-        Base.metadata.create_all(bind=engine)
-        logger.info("Database tables created/verified")
-    except Exception as e:
-        logger.warning(f"Database initialization warning: {str(e)}")
+    # Bring the schema up to date
+    if settings.DB_AUTO_MIGRATE:
+        try:
+            from app.models.migrations import upgrade_database
+            upgrade_database()
+            logger.info("Database schema migrated to the latest revision")
+        except Exception as e:
+            logger.warning(f"Database migration warning: {str(e)}")
+    # Drop extraction results cached by older extraction rules
+    from app.services.invoice_extraction_service import invoice_extraction_service
+    from app.services.extraction_cache_service import extraction_cache_service
+    extraction_cache_service.prune(invoice_extraction_service.extractor_version)
+    # Start background job workers
+    if settings.JOBS_ENABLED:
+        from app.services.job_service import job_service
+        job_service.start()
 
 @app.on_event("shutdown")
 async def shutdown_event():
     """Cleanup on shutdown"""
     logger.info("Shutting down Invoice to PO Matching API")
+    from app.services.job_service import job_service
+    await job_service.stop()
+    from app.services.invoice_extraction_service import invoice_extraction_service
+    invoice_extraction_service.shutdown()
+    # Commit any queued writes before the pools close
+    from app.models.write_queue import write_queue
+    write_queue.stop()
+    from app.models.session import dispose_engine
+    await dispose_engine()
 
 if __name__ == "__main__":
     import uvicorn
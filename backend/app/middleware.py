@@ -0,0 +1,52 @@
+"""ASGI middleware and response classes shared by the app"""
+import time
+import uuid
+from typing import Any
+from fastapi.responses import JSONResponse
+from app.config import settings
+from app.services.profiling_service import profiling_service, record_stage
+
+class TimedJSONResponse(JSONResponse):
+    """JSONResponse whose serialization shows up as a stage in request profiles"""
+
+    def render(self, content: Any) -> bytes:
+        started = time.perf_counter()
+        body = super().render(content)
+        record_stage("json_render", time.perf_counter() - started)
+        return body
+
+class ProfilingMiddleware:
+    """
+    Traces every HTTP request: assigns a request ID (X-Request-ID, echoed
+    back), collects the stage breakdown, and hands slow or X-Profile: 1
+    requests to the profiling service for capture
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        headers = dict(scope.get("headers") or [])
+        request_id = headers.get(b"x-request-id", b"").decode("latin-1")[:64] or uuid.uuid4().hex
+        forced = settings.PROFILE_HEADER_ENABLED and headers.get(b"x-profile", b"").lower() in (b"1", b"true")
+        trace, token = profiling_service.begin(request_id, scope.get("method", ""), scope.get("path", ""), forced)
+        status = 500
+
+        async def send_with_headers(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                extra = [(b"x-request-id", request_id.encode("latin-1"))]
+                if forced:
+                    extra.append((b"server-timing", trace.server_timing().encode("latin-1")))
+                message["headers"] = list(message.get("headers") or []) + extra
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_headers)
+        finally:
+            await profiling_service.finish(trace, token, status)
@@ -1,5 +1,5 @@
 """Database models for Invoice and PO"""
-from sqlalchemy import Column, String, Integer, Float, DateTime, Boolean, Text, ForeignKey
+from sqlalchemy import Column, String, Integer, Float, DateTime, Boolean, Text, ForeignKey, UniqueConstraint, Index, text
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship
 from datetime import datetime
@@ -9,9 +9,20 @@ Base = declarative_base()
 class PurchaseOrder(Base):
     """Purchase Order model from Epicor BAQ"""
     __tablename__ = "purchase_orders"
+    __table_args__ = (
+        # BAQ rows are per PO line, so uniqueness is on the (PO, line) pair
+        UniqueConstraint("po_number", "po_line", name="uq_purchase_orders_po_line"),
+        # Open lines in id order: the candidate index rebuild and open_only listing pages
+        Index(
+            "ix_purchase_orders_open", "id",
+            postgresql_where=text("remaining_amount > 0"), sqlite_where=text("remaining_amount > 0")
+        ),
+        Index("ix_purchase_orders_vendor_id", "vendor_id", "id"),
+        Index("ix_purchase_orders_due_date", "due_date"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
-    po_number = Column(String, unique=True, index=True)
+    po_number = Column(String)  # Lookups use the (po_number, po_line) unique index
     po_line = Column(Integer)
     vendor_id = Column(String)
     vendor_name = Column(String)
@@ -20,6 +31,7 @@ class PurchaseOrder(Base):
     received_amount = Column(Float, default=0.0)
     remaining_amount = Column(Float)
     due_date = Column(DateTime)
+    row_hash = Column(String(40))  # Content hash of the synced BAQ fields
     created_date = Column(DateTime, default=datetime.utcnow)
     updated_date = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
@@ -30,6 +42,10 @@ class PurchaseOrder(Base):
 class Invoice(Base):
     """Invoice model"""
     __tablename__ = "invoices"
+    __table_args__ = (
+        # PO detail pages a PO's invoices in id order
+        Index("ix_invoices_purchase_order_id", "purchase_order_id", "id"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     invoice_number = Column(String, index=True)
@@ -51,10 +67,17 @@ class Invoice(Base):
 class InvoiceMatch(Base):
     """Invoice to PO Match result"""
     __tablename__ = "invoice_matches"
+    __table_args__ = (
+        # The review queue: unapproved matches in id order
+        Index(
+            "ix_invoice_matches_pending", "id",
+            postgresql_where=text("is_approved = false"), sqlite_where=text("is_approved = 0")
+        ),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
-    invoice_id = Column(Integer, ForeignKey("invoices.id"))
-    po_id = Column(Integer, ForeignKey("purchase_orders.id"))
+    invoice_id = Column(Integer, ForeignKey("invoices.id"), index=True)
+    po_id = Column(Integer, ForeignKey("purchase_orders.id"), index=True)
     match_score = Column(Float)  # 0-1 confidence score
     matched_amount = Column(Float)
     match_type = Column(String)  # Exact, Fuzzy, Manual
@@ -67,3 +90,58 @@ class InvoiceMatch(Base):
     # Relationships
     invoice = relationship("Invoice", back_populates="matches")
     purchase_order = relationship("PurchaseOrder", back_populates="matches")
+
+class SyncState(Base):
+    """Watermark for incremental syncs from an external source"""
+    __tablename__ = "sync_state"
+    
+    name = Column(String, primary_key=True)  # e.g. "epicor_po"
+    watermark = Column(String, nullable=True)  # Last change timestamp seen
+    last_synced = Column(DateTime, nullable=True)
+    last_row_count = Column(Integer, default=0)
+
+class LLMCacheEntry(Base):
+    """Cached chat completion response"""
+    __tablename__ = "llm_cache"
+    
+    cache_key = Column(String(64), primary_key=True)  # SHA-256 of model + prompt context
+    kind = Column(String, index=True)  # match, validate
+    model = Column(String)
+    response = Column(Text)
+    created_date = Column(DateTime, default=datetime.utcnow)
+    expires_at = Column(DateTime, index=True)
+
+class ExtractionCacheEntry(Base):
+    """Cached extraction result for one document's bytes under one extractor version"""
+    __tablename__ = "extraction_cache"
+    
+    file_hash = Column(String(64), primary_key=True)  # SHA-256 of the file bytes
+    extractor_version = Column(String(16), primary_key=True, index=True)
+    result = Column(Text)  # JSON of extracted data
+    hits = Column(Integer, default=0)
+    created_date = Column(DateTime, default=datetime.utcnow)
+    last_hit_date = Column(DateTime)
+
+class Job(Base):
+    """Background job taking an uploaded invoice through extract -> match"""
+    __tablename__ = "jobs"
+    __table_args__ = (
+        Index("ix_jobs_status_next_run", "status", "next_run_at"),
+    )
+    
+    id = Column(Integer, primary_key=True, index=True)
+    stage = Column(String, default="extract")  # extract, match, done
+    status = Column(String, default="queued")  # queued, running, succeeded, failed
+    file_path = Column(String)
+    filename = Column(String)
+    invoice_id = Column(Integer, ForeignKey("invoices.id"), nullable=True, index=True)
+    match_id = Column(Integer, ForeignKey("invoice_matches.id"), nullable=True, index=True)
+    attempts = Column(Integer, default=0)
+    max_attempts = Column(Integer, default=5)
+    next_run_at = Column(DateTime, default=datetime.utcnow)
+    locked_by = Column(String, nullable=True)
+    locked_at = Column(DateTime, nullable=True)
+    last_error = Column(Text, nullable=True)
+    result = Column(Text, nullable=True)  # JSON summary of the finished job
+    created_date = Column(DateTime, default=datetime.utcnow)
+    updated_date = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
@@ -0,0 +1,61 @@
+"""Apply Alembic migrations from the app"""
+import logging
+import os
+from alembic import command
+from alembic.config import Config
+from sqlalchemy import inspect
+from sqlalchemy.engine import Connection
+from app.models.session import engine
+
+logger = logging.getLogger(__name__)
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# The schema Base.metadata.create_all built before migrations existed
+INITIAL_REVISION = "0001"
+# Arbitrary key for the PostgreSQL advisory lock serializing migrations
+_PG_LOCK_KEY = 7_301_246_991
+
+def alembic_config(connection: Connection = None) -> Config:
+    """Alembic config for backend/alembic.ini, optionally bound to a connection"""
+    config = Config(os.path.join(BACKEND_DIR, "alembic.ini"))
+    config.set_main_option("script_location", os.path.join(BACKEND_DIR, "migrations"))
+    if connection is not None:
+        config.attributes["connection"] = connection
+    return config
+
+def upgrade_database():
+    """Migrate the shared engine's database to the newest revision
+
+    Every API worker calls this on startup, so migrations run under a
+    database-wide lock and later workers find nothing to do. Databases that
+    create_all built before migrations existed are stamped at the initial
+    revision first.
+    """
+    with engine.connect() as connection:
+        dialect = connection.dialect.name
+        if dialect == "postgresql":
+            # Index builds on big tables can outlast DB_STATEMENT_TIMEOUT_MS
+            connection.exec_driver_sql("SET statement_timeout = 0")
+            connection.exec_driver_sql(f"SELECT pg_advisory_lock({_PG_LOCK_KEY})")
+            connection.commit()
+        elif dialect == "sqlite":
+            # Held until the migration transaction commits
+            connection.exec_driver_sql("BEGIN IMMEDIATE")
+        try:
+            tables = inspect(connection).get_table_names()
+            if dialect != "sqlite":
+                # Alembic then runs its own transactions, and can step outside
+                # them for PostgreSQL's CREATE INDEX CONCURRENTLY
+                connection.commit()
+            config = alembic_config(connection)
+            if "alembic_version" not in tables and "purchase_orders" in tables:
+                logger.info(f"Adopting an unversioned database at revision {INITIAL_REVISION}")
+                command.stamp(config, INITIAL_REVISION)
+            command.upgrade(config, "head")
+            connection.commit()
+        finally:
+            if dialect == "postgresql":
+                connection.rollback()
+                connection.exec_driver_sql(f"SELECT pg_advisory_unlock({_PG_LOCK_KEY})")
+                connection.exec_driver_sql("RESET statement_timeout")
+                connection.commit()
@@ -0,0 +1,133 @@
+"""Shared database engine and session factory"""
+import logging
+from typing import Any, Dict
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import Engine, make_url
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.orm import sessionmaker
+from app.config import settings
+from app.services.metrics_service import instrument_engine
+
+logger = logging.getLogger(__name__)
+
+def _engine_kwargs(database_url: str) -> Dict[str, Any]:
+    """Build pool and connect arguments for the configured database"""
+    url = make_url(database_url)
+    kwargs: Dict[str, Any] = {
+        "pool_pre_ping": settings.DB_POOL_PRE_PING,
+        "pool_recycle": settings.DB_POOL_RECYCLE,
+    }
+    connect_args: Dict[str, Any] = {}
+
+    if url.get_backend_name() == "sqlite":
+        # FastAPI runs sync dependencies in a threadpool, so connections
+        # must be shareable across threads
+        connect_args["check_same_thread"] = False
+        if settings.SQLITE_BUSY_TIMEOUT_MS:
+            # How long a connection waits on another writer's lock
+            connect_args["timeout"] = settings.SQLITE_BUSY_TIMEOUT_MS / 1000
+        if url.database not in (None, "", ":memory:"):
+            kwargs["pool_size"] = settings.DB_POOL_SIZE
+            kwargs["max_overflow"] = settings.DB_MAX_OVERFLOW
+            kwargs["pool_timeout"] = settings.DB_POOL_TIMEOUT
+    else:
+        kwargs["pool_size"] = settings.DB_POOL_SIZE
+        kwargs["max_overflow"] = settings.DB_MAX_OVERFLOW
+        kwargs["pool_timeout"] = settings.DB_POOL_TIMEOUT
+        if url.get_backend_name() == "postgresql" and settings.DB_STATEMENT_TIMEOUT_MS:
+            connect_args["options"] = f"-c statement_timeout={settings.DB_STATEMENT_TIMEOUT_MS}"
+
+    if connect_args:
+        kwargs["connect_args"] = connect_args
+    return kwargs
+
+def _sqlite_pragmas() -> Dict[str, Any]:
+    pragmas: Dict[str, Any] = {
+        "synchronous": settings.SQLITE_SYNCHRONOUS,
+        "mmap_size": settings.SQLITE_MMAP_SIZE,
+        "cache_size": -settings.SQLITE_CACHE_SIZE_KB,  # negative: KiB rather than pages
+        "temp_store": "MEMORY",
+    }
+    if settings.SQLITE_WAL:
+        # Readers keep going while a write commits; the setting persists in the file
+        pragmas = {"journal_mode": "WAL", **pragmas}
+    return pragmas
+
+def configure_sqlite(engine: Engine):
+    """Set the SQLite connection pragmas on every new connection of an engine
+
+    Does nothing for other databases or an in-memory SQLite. Pass the
+    sync_engine of an async engine.
+    """
+    url = engine.url
+    if url.get_backend_name() != "sqlite" or url.database in (None, "", ":memory:"):
+        return
+    pragmas = _sqlite_pragmas()
+
+    @event.listens_for(engine, "connect")
+    def _set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for name, value in pragmas.items():
+                cursor.execute(f"PRAGMA {name} = {value}")
+        finally:
+            cursor.close()
+
+# Async drivers for the sync URLs DATABASE_URL usually holds
+_ASYNC_DRIVERS = {"sqlite": "aiosqlite", "postgresql": "asyncpg"}
+
+def async_database_url(database_url: str) -> str:
+    """The asyncio-driver form of a database URL (sqlite+aiosqlite, postgresql+asyncpg)"""
+    url = make_url(database_url)
+    driver = _ASYNC_DRIVERS.get(url.get_backend_name())
+    if driver is None or url.get_driver_name() == driver:
+        return database_url
+    return url.set(drivername=f"{url.get_backend_name()}+{driver}").render_as_string(hide_password=False)
+
+def _async_engine_kwargs(database_url: str) -> Dict[str, Any]:
+    kwargs = _engine_kwargs(database_url)
+    connect_args = kwargs.pop("connect_args", {})
+    connect_args.pop("check_same_thread", None)  # aiosqlite owns its connection thread
+    if make_url(database_url).get_driver_name() == "asyncpg" and "options" in connect_args:
+        # asyncpg takes server settings instead of a libpq options string
+        del connect_args["options"]
+        connect_args["server_settings"] = {"statement_timeout": str(settings.DB_STATEMENT_TIMEOUT_MS)}
+    if connect_args:
+        kwargs["connect_args"] = connect_args
+    return kwargs
+
+# One engine (and connection pool) per process, shared by every route
+engine = create_engine(settings.DATABASE_URL, **_engine_kwargs(settings.DATABASE_URL))
+SessionLocal = sessionmaker(bind=engine)
+configure_sqlite(engine)
+if settings.METRICS_ENABLED:
+    instrument_engine(engine)
+
+# Async engine for the routes: the same database through an asyncio driver, so
+# a worker keeps serving other requests while a query waits
+ASYNC_DATABASE_URL = settings.ASYNC_DATABASE_URL or async_database_url(settings.DATABASE_URL)
+async_engine = create_async_engine(ASYNC_DATABASE_URL, **_async_engine_kwargs(ASYNC_DATABASE_URL))
+# Objects stay readable after commit, as the routes build responses from them
+AsyncSessionLocal = async_sessionmaker(async_engine, expire_on_commit=False)
+configure_sqlite(async_engine.sync_engine)
+if settings.METRICS_ENABLED:
+    instrument_engine(async_engine.sync_engine)
+
+def get_db():
+    """FastAPI dependency yielding a session from the shared pool"""
+    db = SessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+async def get_async_db():
+    """FastAPI dependency yielding an AsyncSession from the shared async pool"""
+    async with AsyncSessionLocal() as db:
+        yield db
+
+async def dispose_engine():
+    """Close all pooled connections (called on application shutdown)"""
+    engine.dispose()
+    await async_engine.dispose()
+    logger.info("Database connection pools disposed")
@@ -0,0 +1,182 @@
+"""Single-writer queue batching the app's SQLite writes into shared commits"""
+import asyncio
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Callable, List, Optional, Tuple
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, sessionmaker
+from app.config import settings
+from app.models.session import SessionLocal, _engine_kwargs, configure_sqlite
+from app.services.metrics_service import DB_WRITE_BATCH_SIZE, DB_WRITE_QUEUE_SECONDS, instrument_engine
+
+logger = logging.getLogger(__name__)
+
+# A write: fn(session, *args), run in the writer's transaction
+WriteFn = Callable[..., Any]
+
+def add_rows(db: Session, *rows):
+    """Write fn inserting ORM objects; their ids are set once it commits"""
+    db.add_all(rows)
+    db.flush()
+
+class WriteQueue:
+    """One writer thread per process that commits queued writes in batches
+
+    SQLite takes a single database-wide write lock, so concurrent writers
+    only queue on it (and spin in the busy handler) while each pays for its
+    own commit. Funnelling writes through one connection lets a batch share
+    one BEGIN IMMEDIATE and one commit. Each write runs in its own savepoint,
+    so a failing write is rolled back and reported to its caller alone.
+    Reads are untouched and keep using the pool, which WAL lets run alongside
+    the writer.
+
+    Other databases, an in-memory SQLite or SQLITE_WRITE_QUEUE=False run the
+    write on the caller's session and commit it straight away.
+    """
+
+    def __init__(self):
+        url = make_url(settings.DATABASE_URL)
+        self.enabled = (
+            settings.SQLITE_WRITE_QUEUE
+            and url.get_backend_name() == "sqlite"
+            and url.database not in (None, "", ":memory:")
+        )
+        self.batch_max = max(1, settings.SQLITE_WRITE_BATCH_MAX)
+        self._queue: "queue.Queue[Optional[Tuple[WriteFn, tuple, Future]]]" = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self._sessionmaker: Optional[sessionmaker] = None
+
+    def _start(self):
+        with self._lock:
+            if self._thread is not None:
+                return
+            kwargs = _engine_kwargs(settings.DATABASE_URL)
+            kwargs.update(pool_size=1, max_overflow=0)
+            writer_engine = create_engine(settings.DATABASE_URL, **kwargs)
+            configure_sqlite(writer_engine)
+
+            @event.listens_for(writer_engine, "connect")
+            def _manual_transactions(dbapi_connection, connection_record):
+                # Let SQLAlchemy's begin event issue BEGIN IMMEDIATE below
+                dbapi_connection.isolation_level = None
+
+            @event.listens_for(writer_engine, "begin")
+            def _begin_immediate(connection):
+                # Take the write lock up front, so no other process can make
+                # a batch fail halfway through
+                connection.exec_driver_sql("BEGIN IMMEDIATE")
+
+            if settings.METRICS_ENABLED:
+                instrument_engine(writer_engine)
+            self._sessionmaker = sessionmaker(bind=writer_engine, expire_on_commit=False)
+            self._thread = threading.Thread(target=self._writer_loop, name="sqlite-writer", daemon=True)
+            self._thread.start()
+            logger.info(f"SQLite writer started (batches of up to {self.batch_max})")
+
+    def submit(self, fn: WriteFn, *args) -> Future:
+        """Queue fn(session, *args); the future resolves once its batch commits"""
+        future: Future = Future()
+        if not self.enabled:
+            try:
+                future.set_result(self._run_direct(fn, *args))
+            except Exception as e:
+                future.set_exception(e)
+            return future
+        if self._thread is None:
+            self._start()
+        self._queue.put((fn, args, future))
+        return future
+
+    def run(self, fn: WriteFn, *args) -> Any:
+        """Run a write from a worker thread and return fn's result once committed"""
+        with DB_WRITE_QUEUE_SECONDS.time():
+            return self.submit(fn, *args).result()
+
+    async def run_async(self, fn: WriteFn, *args) -> Any:
+        """Run a write from async code without a session of its own"""
+        with DB_WRITE_QUEUE_SECONDS.time():
+            if self.enabled:
+                return await asyncio.wrap_future(self.submit(fn, *args))
+            return await asyncio.to_thread(self._run_direct, fn, *args)
+
+    async def write(self, db: AsyncSession, fn: WriteFn, *args) -> Any:
+        """Run a write for a route; without the queue it runs and commits on db"""
+        if self.enabled:
+            return await self.run_async(fn, *args)
+        with DB_WRITE_QUEUE_SECONDS.time():
+            result = await db.run_sync(fn, *args)
+            await db.commit()
+            return result
+
+    def stop(self, timeout: float = 10.0):
+        """Commit what is queued, then stop the writer thread"""
+        if self._thread is None:
+            return
+        self._queue.put(None)
+        self._thread.join(timeout)
+        self._thread = None
+        self._sessionmaker.kw["bind"].dispose()
+        logger.info("SQLite writer stopped")
+
+    def _run_direct(self, fn: WriteFn, *args) -> Any:
+        with SessionLocal(expire_on_commit=False) as db:
+            result = fn(db, *args)
+            db.commit()
+            return result
+
+    def _writer_loop(self):
+        stopping = False
+        while not stopping:
+            item = self._queue.get()
+            if item is None:
+                break
+            batch = [item]
+            # Whatever queued up during the last commit goes into this one
+            while len(batch) < self.batch_max:
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is None:
+                    stopping = True
+                    break
+                batch.append(item)
+            try:
+                self._commit_batch(batch)
+            except Exception as e:
+                logger.error(f"SQLite write batch of {len(batch)} failed: {str(e)}")
+                for _, _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+
+    def _commit_batch(self, batch: List[Tuple[WriteFn, tuple, Future]]):
+        started = time.perf_counter()
+        outcomes = []
+        with self._sessionmaker() as db:
+            for fn, args, future in batch:
+                if not future.set_running_or_notify_cancel():
+                    continue
+                try:
+                    with db.begin_nested():
+                        outcomes.append((future, fn(db, *args), None))
+                except Exception as e:
+                    outcomes.append((future, None, e))
+            db.commit()
+            # Results are handed to other threads; detach them from this session
+            db.expunge_all()
+        DB_WRITE_BATCH_SIZE.observe(len(batch))
+        logger.debug(f"Committed {len(batch)} writes in {(time.perf_counter() - started) * 1000:.1f}ms")
+        for future, result, error in outcomes:
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(result)
+
+# Global instance
+write_queue = WriteQueue()
@@ -1,67 +1,63 @@
 """Invoice upload and matching routes"""
-from fastapi import APIRouter, UploadFile, File, HTTPException, Depends
-from sqlalchemy.orm import Session
-from typing import List
+from fastapi import APIRouter, UploadFile, File, HTTPException, Depends, Query
+from pydantic import BaseModel
+from sqlalchemy import func, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Any, Dict, List, Optional
+import asyncio
+import json
 import os
+import time
+from pathlib import Path
 from app.models.database import Invoice, InvoiceMatch, PurchaseOrder, Base
-from app.services.invoice_extraction_service import invoice_extraction_service
+from app.models.session import get_async_db
+from app.models.write_queue import add_rows, write_queue
+from app.routes.pagination import decode_cursor, encode_cursor, page_limit
+from app.services.invoice_extraction_service import invoice_extraction_service, load_extracted_data
 from app.services.ai_matching_service import ai_matching_service
+from app.services.po_candidate_index import po_candidate_index
+from app.services.job_service import job_service
+from app.services.upload_storage_service import (
+    SUPPORTED_EXTENSIONS,
+    StoredUpload,
+    UploadTooLargeError,
+    upload_storage_service
+)
 from app.config import settings
 import logging
 
 logger = logging.getLogger(__name__)
 router = APIRouter(prefix="/api/invoices", tags=["invoices"])
 
-# Dependency to get database session (placeholder - configure with actual DB)
-def get_db():
-    from sqlalchemy import create_engine
-    from sqlalchemy.orm import sessionmaker
-    engine = create_engine(settings.DATABASE_URL)
-    SessionLocal = sessionmaker(bind=engine)
-    db = SessionLocal()
+async def _save_upload(file: UploadFile) -> StoredUpload:
+    """Validate and stream an uploaded file to content-addressed storage"""
+    # Validate file
+    if Path(file.filename or "").suffix.lower() not in SUPPORTED_EXTENSIONS:
+        raise HTTPException(status_code=400, detail="Unsupported file type")
+    if file.size is not None and file.size > settings.MAX_FILE_SIZE:
+        raise HTTPException(status_code=413, detail="File too large")
+    
+    # Save file in chunks to its content-addressed path
     try:
-        yield db
-    finally:
-        db.close()
+        stored = await upload_storage_service.save_upload(file)
+    except UploadTooLargeError:
+        raise HTTPException(status_code=413, detail="File too large")
+    return stored
 
 @router.post("/upload")
-async def upload_invoice(file: UploadFile = File(...), db: Session = Depends(get_db)):
+async def upload_invoice(file: UploadFile = File(...), db: AsyncSession = Depends(get_async_db)):
     """Upload and process an invoice document"""
     try:
-        # Validate file
-        if file.size > settings.MAX_FILE_SIZE:
-            raise HTTPException(status_code=413, detail="File too large")
+        stored = await _save_upload(file)
         
-        # Save file
-        file_path = os.path.join(settings.UPLOAD_DIR, file.filename)
-        with open(file_path, "wb") as f:
-            f.write(await file.read())
-        
-        # Extract invoice data
-        extracted_data = invoice_extraction_service.extract_from_file(file_path)
+        # Extract invoice data (cached by content hash, else in the process pool)
+        extracted_data = await invoice_extraction_service.extract_from_file_async(
+            stored.file_path, file_hash=stored.sha256
+        )
         
         # Create invoice record
-        from datetime import datetime
-        invoice_date = extracted_data.get("invoice_date")
-        # Parse date if it's a string
-        if isinstance(invoice_date, str):
-            try:
-                invoice_date = datetime.strptime(invoice_date, "%m/%d/%Y")
-            except:
-                invoice_date = None
-        
-        invoice = Invoice(
-            invoice_number=extracted_data.get("invoice_number"),
-            vendor_name=extracted_data.get("vendor_name"),
-            invoice_date=invoice_date,
-            invoice_amount=extracted_data.get("invoice_amount"),
-            invoice_type=extracted_data.get("invoice_type"),
-            file_path=file_path,
-            extracted_data=str(extracted_data)
-        )
-        db.add(invoice)
-        db.commit()
-        db.refresh(invoice)
+        invoice = invoice_extraction_service.build_invoice(stored.file_path, extracted_data)
+        await write_queue.write(db, add_rows, invoice)
         
         logger.info(f"Invoice uploaded: {invoice.id}")
         
@@ -73,46 +69,133 @@ async def upload_invoice(file: UploadFile = File(...), db: Session = Depends(get
             "type": invoice.invoice_type
         }
         
+    except HTTPException:
+        raise
+    except TimeoutError as e:
+        logger.error(f"Error uploading invoice: {str(e)}")
+        raise HTTPException(status_code=504, detail=str(e))
     except Exception as e:
         logger.error(f"Error uploading invoice: {str(e)}")
         raise HTTPException(status_code=400, detail=str(e))
 
+@router.post("/upload-async")
+async def upload_invoice_async(file: UploadFile = File(...), db: AsyncSession = Depends(get_async_db)):
+    """Store an invoice and queue extraction and matching as a background job"""
+    try:
+        stored = await _save_upload(file)
+        job = await job_service.enqueue(db, stored.file_path, file.filename)
+        
+        logger.info(f"Invoice queued: job {job.id}")
+        
+        return {
+            "job_id": job.id,
+            "status": job.status,
+            "stage": job.stage,
+            "status_url": f"/api/jobs/{job.id}"
+        }
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error queueing invoice: {str(e)}")
+        raise HTTPException(status_code=400, detail=str(e))
+
+@router.post("/upload-batch")
+async def upload_invoices_batch(files: List[UploadFile] = File(...), db: AsyncSession = Depends(get_async_db)):
+    """Store many invoices (or zip archives of invoices) and queue a background job for each"""
+    try:
+        started = time.perf_counter()
+        stored = []
+        skipped = []
+        
+        for file in files:
+            remaining = settings.UPLOAD_BATCH_MAX_FILES - len(stored)
+            extension = Path(file.filename or "").suffix.lower()
+            if extension == ".zip":
+                # Members are extracted one at a time, off the event loop
+                archive_stored, archive_skipped = await asyncio.to_thread(
+                    upload_storage_service.save_archive, file.file, file.filename, remaining
+                )
+                stored.extend(archive_stored)
+                skipped.extend(archive_skipped)
+            elif extension not in SUPPORTED_EXTENSIONS:
+                skipped.append({"filename": file.filename, "error": "Unsupported file type"})
+            elif remaining <= 0:
+                skipped.append({"filename": file.filename, "error": "Too many files in request"})
+            else:
+                try:
+                    stored.append(await upload_storage_service.save_upload(file))
+                except UploadTooLargeError:
+                    skipped.append({"filename": file.filename, "error": "File too large"})
+            await file.close()
+        
+        # The same document twice in one request is queued once
+        unique = {}
+        for item in stored:
+            if item.sha256 in unique:
+                skipped.append({"filename": item.filename, "error": "Duplicate of another file in this request"})
+            else:
+                unique[item.sha256] = item
+        
+        jobs = await job_service.enqueue_many(db, [(item.file_path, item.filename) for item in unique.values()])
+        
+        elapsed = time.perf_counter() - started
+        logger.info(f"Batch upload queued {len(jobs)} invoices, skipped {len(skipped)} in {elapsed:.2f}s")
+        
+        return {
+            "jobs": [
+                {
+                    "job_id": job.id,
+                    "filename": item.filename,
+                    "sha256": item.sha256,
+                    "size": item.size,
+                    "previously_uploaded": item.duplicate,
+                    "status_url": f"/api/jobs/{job.id}"
+                }
+                for job, item in zip(jobs, unique.values())
+            ],
+            "skipped": skipped,
+            "stats": {
+                "queued": len(jobs),
+                "skipped": len(skipped),
+                "bytes": sum(item.size for item in unique.values()),
+                "elapsed_seconds": round(elapsed, 3)
+            }
+        }
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error uploading invoice batch: {str(e)}")
+        raise HTTPException(status_code=400, detail=str(e))
+
 @router.post("/match/{invoice_id}")
-async def match_invoice_to_po(invoice_id: int, db: Session = Depends(get_db)):
+async def match_invoice_to_po(invoice_id: int, db: AsyncSession = Depends(get_async_db)):
     """Match an invoice to a purchase order using AI"""
     try:
         # Get invoice
-        invoice = db.query(Invoice).filter(Invoice.id == invoice_id).first()
+        invoice = await db.get(Invoice, invoice_id)
         if not invoice:
             raise HTTPException(status_code=404, detail="Invoice not found")
         
-        # Get available POs
-        available_pos = db.query(PurchaseOrder).filter(
-            PurchaseOrder.remaining_amount > 0
-        ).all()
+        # Parse invoice data
+        invoice_data = load_extracted_data(invoice.extracted_data)
         
-        if not available_pos:
+        # Narrow open POs to plausible candidates via the blocking index
+        await po_candidate_index.ensure_built_async(db)
+        if not po_candidate_index.size:
             raise HTTPException(status_code=404, detail="No available purchase orders")
+        pos_data = po_candidate_index.candidates(invoice_data)
         
-        # Prepare PO data
-        pos_data = [
-            {
-                "po_number": po.po_number,
-                "po_line": po.po_line,
-                "vendor_name": po.vendor_name,
-                "line_amount": po.line_amount,
-                "remaining_amount": po.remaining_amount,
-                "line_description": po.line_description
+        if not pos_data:
+            return {
+                "invoice_id": invoice_id,
+                "match_found": False,
+                "message": "No suitable purchase order found"
             }
-            for po in available_pos
-        ]
         
-        # Parse invoice data
-        import json
-        invoice_data = json.loads(invoice.extracted_data)
-        
-        # Find best match
-        best_po, match_score, reasoning = ai_matching_service.find_best_match(
+        # Find best match without blocking the event loop
+        best_po, match_score, reasoning = await ai_matching_service.find_best_match_async(
             invoice_data, pos_data
         )
         
@@ -123,23 +206,9 @@ async def match_invoice_to_po(invoice_id: int, db: Session = Depends(get_db)):
                 "message": "No suitable purchase order found"
             }
         
-        # Find PO record
-        po_record = db.query(PurchaseOrder).filter(
-            PurchaseOrder.po_number == best_po.get("po_number")
-        ).first()
-        
         # Create match record
-        match = InvoiceMatch(
-            invoice_id=invoice_id,
-            po_id=po_record.id if po_record else None,
-            match_score=match_score,
-            matched_amount=invoice.invoice_amount,
-            match_type="AI",
-            ai_reasoning=reasoning
-        )
-        db.add(match)
-        db.commit()
-        db.refresh(match)
+        match = _build_match(invoice, best_po, match_score, reasoning)
+        await write_queue.write(db, add_rows, match)
         
         logger.info(f"Match created: Invoice {invoice_id} to PO {best_po.get('po_number')}")
         
@@ -158,44 +227,227 @@ async def match_invoice_to_po(invoice_id: int, db: Session = Depends(get_db)):
         logger.error(f"Error matching invoice: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
-@router.get("/pending-matches")
-async def get_pending_matches(db: Session = Depends(get_db)):
-    """Get all invoices waiting for approval"""
+class BatchMatchRequest(BaseModel):
+    """Invoices to match: explicit IDs, or every invoice without a match yet"""
+    invoice_ids: Optional[List[int]] = None
+    all_unmatched: bool = False
+    concurrency: Optional[int] = None
+
+def _build_match(invoice: Invoice, best_po: Dict[str, Any], match_score: float, reasoning: str) -> InvoiceMatch:
+    """Create the InvoiceMatch row for a matcher result"""
+    return InvoiceMatch(
+        invoice_id=invoice.id,
+        po_id=best_po.get("po_id"),
+        match_score=match_score,
+        matched_amount=invoice.invoice_amount,
+        match_type="AI",
+        ai_reasoning=reasoning
+    )
+
+def _fuzzy_match_fallbacks(outcomes: List[Dict[str, Any]]):
+    """Fuzzy match batch outcomes in place, one fuzzy_match_batch per shared candidate set"""
+    groups: Dict[tuple, List[Dict[str, Any]]] = {}
+    for outcome in outcomes:
+        groups.setdefault(tuple(po.get("po_id") for po in outcome["pos_data"]), []).append(outcome)
+    for group in groups.values():
+        results = ai_matching_service.fuzzy_match_batch(
+            [outcome["invoice_data"] for outcome in group], group[0]["pos_data"]
+        )
+        for outcome, (best_po, match_score, reasoning) in zip(group, results):
+            outcome.update(best_po=best_po, score=match_score, reasoning=reasoning)
+
+@router.post("/match-batch")
+async def match_invoices_batch(request: BatchMatchRequest, db: AsyncSession = Depends(get_async_db)):
+    """Match many invoices against one PO snapshot and store all matches in one transaction"""
     try:
-        pending = db.query(InvoiceMatch).filter(
-            InvoiceMatch.is_approved == False
-        ).all()
+        started = time.perf_counter()
+        
+        query = select(Invoice)
+        if request.all_unmatched:
+            query = query.where(~Invoice.matches.any())
+        elif request.invoice_ids:
+            query = query.where(Invoice.id.in_(request.invoice_ids))
+        else:
+            raise HTTPException(status_code=400, detail="Provide invoice_ids or set all_unmatched")
+        invoices = (await db.scalars(query)).all()
+        
+        # One candidate snapshot for the whole batch
+        await po_candidate_index.ensure_built_async(db)
+        if not po_candidate_index.size:
+            raise HTTPException(status_code=404, detail="No available purchase orders")
+        
+        concurrency = max(1, request.concurrency or settings.MATCH_BATCH_CONCURRENCY)
+        semaphore = asyncio.Semaphore(concurrency)
+        
+        async def match_one(invoice: Invoice) -> Dict[str, Any]:
+            try:
+                invoice_data = load_extracted_data(invoice.extracted_data)
+            except ValueError as e:
+                return {"invoice": invoice, "error": str(e)}
+            pos_data = po_candidate_index.candidates(invoice_data)
+            if not pos_data:
+                return {"invoice": invoice, "best_po": None}
+            try:
+                async with semaphore:
+                    best_po, match_score, reasoning = await ai_matching_service.find_best_match_async(
+                        invoice_data, pos_data, fallback=False
+                    )
+            except Exception:
+                # Fuzzy matched below, together with the others the model failed on
+                return {"invoice": invoice, "invoice_data": invoice_data, "pos_data": pos_data, "fallback": True}
+            return {"invoice": invoice, "best_po": best_po, "score": match_score, "reasoning": reasoning}
+        
+        outcomes = await asyncio.gather(*(match_one(inv) for inv in invoices))
+        fallbacks = [outcome for outcome in outcomes if outcome.get("fallback")]
+        if fallbacks:
+            await asyncio.to_thread(_fuzzy_match_fallbacks, fallbacks)
+        
+        matches = []
+        for outcome in outcomes:
+            if outcome.get("best_po"):
+                match = _build_match(outcome["invoice"], outcome["best_po"], outcome["score"], outcome["reasoning"])
+                outcome["match"] = match
+                matches.append(match)
+        if matches:
+            await write_queue.write(db, add_rows, *matches)
         
         results = []
-        for match in pending:
-            results.append({
-                "match_id": match.id,
-                "invoice_number": match.invoice.invoice_number,
-                "po_number": match.purchase_order.po_number if match.purchase_order else None,
-                "amount": match.matched_amount,
-                "score": match.match_score,
-                "reasoning": match.ai_reasoning
-            })
-        
-        return results
+        for outcome in outcomes:
+            invoice = outcome["invoice"]
+            if "error" in outcome:
+                results.append({"invoice_id": invoice.id, "match_found": False, "error": outcome["error"]})
+            elif not outcome.get("best_po"):
+                results.append({
+                    "invoice_id": invoice.id,
+                    "match_found": False,
+                    "message": "No suitable purchase order found"
+                })
+            else:
+                results.append({
+                    "invoice_id": invoice.id,
+                    "match_found": True,
+                    "match_id": outcome["match"].id,
+                    "po_number": outcome["best_po"].get("po_number"),
+                    "match_score": outcome["score"],
+                    "reasoning": outcome["reasoning"],
+                    "requires_approval": outcome["score"] < 0.8
+                })
+        
+        elapsed = time.perf_counter() - started
+        logger.info(f"Batch matched {len(matches)}/{len(invoices)} invoices in {elapsed:.2f}s")
+        
+        return {
+            "results": results,
+            "stats": {
+                "requested": len(invoices),
+                "matched": len(matches),
+                "unmatched": len(invoices) - len(matches),
+                "concurrency": concurrency,
+                "elapsed_seconds": round(elapsed, 3),
+                "invoices_per_second": round(len(invoices) / elapsed, 2) if elapsed > 0 else None
+            }
+        }
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error batch matching invoices: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+# The review queue: one row per unapproved match, denormalized with the
+# invoice and PO columns the approval screen shows
+REVIEW_QUEUE_FIELDS = {
+    "match_id": InvoiceMatch.id,
+    "invoice_id": InvoiceMatch.invoice_id,
+    "invoice_number": Invoice.invoice_number,
+    "vendor_name": Invoice.vendor_name,
+    "invoice_date": Invoice.invoice_date,
+    "invoice_amount": Invoice.invoice_amount,
+    "invoice_type": Invoice.invoice_type,
+    "po_id": InvoiceMatch.po_id,
+    "po_number": PurchaseOrder.po_number,
+    "po_line": PurchaseOrder.po_line,
+    "po_remaining_amount": PurchaseOrder.remaining_amount,
+    "amount": InvoiceMatch.matched_amount,
+    "score": InvoiceMatch.match_score,
+    "match_type": InvoiceMatch.match_type,
+    "reasoning": InvoiceMatch.ai_reasoning,
+    "created_date": InvoiceMatch.created_date,
+}
+
+def review_queue_query():
+    """SELECT over the review queue in match id order (oldest first)"""
+    return (
+        select(*(column.label(name) for name, column in REVIEW_QUEUE_FIELDS.items()))
+        .select_from(InvoiceMatch)
+        .outerjoin(Invoice, Invoice.id == InvoiceMatch.invoice_id)
+        .outerjoin(PurchaseOrder, PurchaseOrder.id == InvoiceMatch.po_id)
+        .where(InvoiceMatch.is_approved == False)
+        .order_by(InvoiceMatch.id)
+    )
+
+async def _count_pending_matches(db: AsyncSession) -> int:
+    return await db.scalar(select(func.count(InvoiceMatch.id)).where(InvoiceMatch.is_approved == False))
+
+@router.get("/pending-matches")
+async def get_pending_matches(
+    limit: int = Query(None, ge=1, description="Page size (default LIST_DEFAULT_LIMIT)"),
+    cursor: Optional[str] = Query(None, description="next_cursor from the previous page"),
+    include_total: bool = Query(False, description="Also count every pending match"),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Get one page of matches waiting for approval
+    
+    Each page is a single joined, column-only query (plus a COUNT when
+    include_total is set), however deep the backlog is.
+    """
+    try:
+        limit = page_limit(limit)
+        stmt = review_queue_query()
+        if cursor:
+            stmt = stmt.where(InvoiceMatch.id > decode_cursor(cursor))
+        rows = (await db.execute(stmt.limit(limit + 1))).mappings().all()
+        items = [dict(row) for row in rows[:limit]]
+        
+        return {
+            "items": items,
+            "next_cursor": encode_cursor(items[-1]["match_id"]) if len(rows) > limit else None,
+            "limit": limit,
+            "total": await _count_pending_matches(db) if include_total else None
+        }
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error fetching pending matches: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.get("/pending-matches/count")
+async def count_pending_matches(db: AsyncSession = Depends(get_async_db)):
+    """Count matches waiting for approval"""
+    try:
+        return {"count": await _count_pending_matches(db)}
+    except Exception as e:
+        logger.error(f"Error counting pending matches: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+def _approve(db, match_id: int) -> bool:
+    """Write fn approving a match; False if there is no such match"""
+    return db.execute(
+        update(InvoiceMatch).where(InvoiceMatch.id == match_id).values(is_approved=True)
+    ).rowcount > 0
+
 @router.post("/approve-match/{match_id}")
-async def approve_match(match_id: int, db: Session = Depends(get_db)):
+async def approve_match(match_id: int, db: AsyncSession = Depends(get_async_db)):
     """Approve an invoice-to-PO match"""
     try:
-        match = db.query(InvoiceMatch).filter(InvoiceMatch.id == match_id).first()
-        if not match:
+        if not await write_queue.write(db, _approve, match_id):
             raise HTTPException(status_code=404, detail="Match not found")
         
-        match.is_approved = True
-        db.commit()
-        
         logger.info(f"Match approved: {match_id}")
         
         return {"message": "Match approved successfully"}
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error approving match: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
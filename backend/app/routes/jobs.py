@@ -0,0 +1,18 @@
+"""Background job status routes"""
+from fastapi import APIRouter, HTTPException, Depends
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.models.database import Job
+from app.models.session import get_async_db
+from app.services.job_service import job_service
+import logging
+
+logger = logging.getLogger(__name__)
+router = APIRouter(prefix="/api/jobs", tags=["jobs"])
+
+@router.get("/{job_id}")
+async def get_job(job_id: int, db: AsyncSession = Depends(get_async_db)):
+    """Get the status and result of a background job"""
+    job = await db.get(Job, job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job_service.to_dict(job)
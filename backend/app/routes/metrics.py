@@ -0,0 +1,31 @@
+"""Prometheus metrics route"""
+from fastapi import APIRouter, HTTPException
+from fastapi.responses import PlainTextResponse
+from sqlalchemy import func
+from app.config import settings
+from app.models.database import InvoiceMatch, PurchaseOrder
+from app.models.session import SessionLocal
+from app.services.metrics_service import metrics
+import logging
+
+logger = logging.getLogger(__name__)
+router = APIRouter(tags=["metrics"])
+
+def _count_open_purchase_orders() -> int:
+    # Same definition of "open" as the candidate index
+    with SessionLocal() as db:
+        return db.query(func.count(PurchaseOrder.id)).filter(PurchaseOrder.remaining_amount > 0).scalar()
+
+def _count_pending_matches() -> int:
+    with SessionLocal() as db:
+        return db.query(func.count(InvoiceMatch.id)).filter(InvoiceMatch.is_approved == False).scalar()
+
+metrics.gauge("open_purchase_orders", "Open PO lines (remaining amount > 0)", _count_open_purchase_orders)
+metrics.gauge("pending_matches", "Matches waiting for approval", _count_pending_matches)
+
+@router.get("/metrics", response_class=PlainTextResponse)
+def get_metrics():
+    """Counters, gauges and stage latency histograms of this API process"""
+    if not settings.METRICS_ENABLED:
+        raise HTTPException(status_code=404, detail="Metrics are disabled")
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
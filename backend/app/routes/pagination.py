@@ -0,0 +1,22 @@
+"""Keyset pagination helpers shared by the listing routes"""
+import base64
+from typing import Optional
+from fastapi import HTTPException
+from app.config import settings
+
+def page_limit(limit: Optional[int]) -> int:
+    """Requested page size, defaulted and capped by the listing settings"""
+    return min(limit or settings.LIST_DEFAULT_LIMIT, settings.LIST_MAX_LIMIT)
+
+def encode_cursor(last_id: int) -> str:
+    return base64.urlsafe_b64encode(f"id:{last_id}".encode()).decode().rstrip("=")
+
+def decode_cursor(cursor: str) -> int:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        kind, _, value = raw.partition(":")
+        if kind != "id":
+            raise ValueError(kind)
+        return int(value)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
@@ -1,75 +1,68 @@
 """Purchase Order and Epicor integration routes"""
-from fastapi import APIRouter, HTTPException, Depends
+from datetime import date, datetime, time, timedelta
+from typing import Any, Dict, List, Optional
+from fastapi import APIRouter, HTTPException, Depends, Query
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from app.services.epicor_service import epicor_service
-from app.models.database import PurchaseOrder
+from app.services.po_sync_service import po_sync_service
+from app.services.po_candidate_index import po_candidate_index
+from app.services.llm_cache_service import llm_cache_service
+from app.models.database import Invoice, PurchaseOrder
+from app.models.session import get_async_db, get_db
+from app.routes.pagination import decode_cursor, encode_cursor, page_limit
 import logging
 
 logger = logging.getLogger(__name__)
 router = APIRouter(prefix="/api/purchase-orders", tags=["purchase-orders"])
 
-def get_db():
-    from sqlalchemy import create_engine
-    from sqlalchemy.orm import sessionmaker
-    from app.config import settings
-    engine = create_engine(settings.DATABASE_URL)
-    SessionLocal = sessionmaker(bind=engine)
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
 @router.get("/sync-from-epicor")
-def sync_purchase_orders_from_epicor(db: Session = Depends(get_db)):
-    """Fetch and sync purchase orders from Epicor BAQ"""
+def sync_purchase_orders_from_epicor(delta: bool = False, db: Session = Depends(get_db)):
+    """Fetch and sync purchase orders from Epicor BAQ
+    
+    A long batch on the blocking Epicor client and bulk upserts, so it stays
+    a sync route on a threadpool thread with a sync Session for its reads.
+    The upserts go through the shared writer, one write per chunk.
+    
+    With delta=true, only lines changed since the last recorded watermark are
+    requested (needs EPICOR_CHANGE_FIELD); unchanged lines are always skipped
+    by content hash. A full sync also closes stored open lines the open-PO
+    BAQ no longer returns.
+    """
     try:
-        # Fetch POs from Epicor
-        epicor_pos = epicor_service.get_purchase_orders()
+        changed_since = po_sync_service.get_watermark(db) if delta else None
         
-        if not epicor_pos:
-            return {"message": "No purchase orders found in Epicor"}
+        # Stream POs from Epicor page by page
+        epicor_pos = epicor_service.iter_purchase_orders(changed_since=changed_since)
+        
+        # Set-based upsert keyed on (po_number, po_line)
+        result = po_sync_service.sync_queued(epicor_pos, full=not changed_since)
+        synced_count = result["total"]
+        # End the read transaction the watermark read began, so what follows
+        # sees the rows the writer just committed
+        db.rollback()
+        
+        # Refresh matching candidates with the new open-PO set, and drop LLM
+        # answers that were given against the old one
+        if result["inserted"] or result["updated"] or result["closed"]:
+            po_candidate_index.rebuild(db)
+            llm_cache_service.invalidate("match")
         
-        # Upsert POs in database
-        synced_count = 0
-        for po_data in epicor_pos:
-            po_key = f"{po_data['po_number']}-{po_data['po_line']}"
-            
-            # Check if PO exists
-            existing_po = db.query(PurchaseOrder).filter(
-                PurchaseOrder.po_number == po_data['po_number'],
-                PurchaseOrder.po_line == po_data['po_line']
-            ).first()
-            
-            remaining_amount = po_data['line_amount'] - po_data['received_amount']
-            
-            if existing_po:
-                # Update
-                existing_po.line_amount = po_data['line_amount']
-                existing_po.received_amount = po_data['received_amount']
-                existing_po.remaining_amount = remaining_amount
-            else:
-                # Create new
-                new_po = PurchaseOrder(
-                    po_number=po_data['po_number'],
-                    po_line=po_data['po_line'],
-                    vendor_id=po_data['vendor_id'],
-                    vendor_name=po_data['vendor_name'],
-                    line_description=po_data['line_description'],
-                    line_amount=po_data['line_amount'],
-                    received_amount=po_data['received_amount'],
-                    remaining_amount=remaining_amount,
-                    due_date=po_data['due_date']
-                )
-                db.add(new_po)
-            
-            synced_count += 1
+        if not synced_count:
+            if changed_since:
+                return {"message": f"No purchase orders changed since {changed_since}"}
+            return {"message": "No purchase orders found in Epicor"}
         
-        db.commit()
         logger.info(f"Synced {synced_count} purchase orders from Epicor")
         
         return {
             "synced_count": synced_count,
+            "inserted": result["inserted"],
+            "updated": result["updated"],
+            "closed": result["closed"],
+            "unchanged": result["unchanged"],
+            "watermark": result["watermark"],
             "message": f"Successfully synced {synced_count} purchase orders"
         }
         
@@ -77,57 +70,165 @@ def sync_purchase_orders_from_epicor(db: Session = Depends(get_db)):
         logger.error(f"Error syncing POs from Epicor: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
+# Output field -> column for listing projections
+PO_LIST_FIELDS = {
+    "po_id": PurchaseOrder.id,
+    "po_number": PurchaseOrder.po_number,
+    "po_line": PurchaseOrder.po_line,
+    "vendor_id": PurchaseOrder.vendor_id,
+    "vendor_name": PurchaseOrder.vendor_name,
+    "description": PurchaseOrder.line_description,
+    "line_amount": PurchaseOrder.line_amount,
+    "received_amount": PurchaseOrder.received_amount,
+    "remaining_amount": PurchaseOrder.remaining_amount,
+    "due_date": PurchaseOrder.due_date,
+    "updated_date": PurchaseOrder.updated_date,
+}
+DEFAULT_PO_LIST_FIELDS = [
+    "po_id", "po_number", "po_line", "vendor_name", "description", "line_amount", "remaining_amount", "due_date"
+]
+PO_DETAIL_FIELDS = [
+    "po_id", "po_number", "po_line", "vendor_name", "description",
+    "line_amount", "received_amount", "remaining_amount", "due_date"
+]
+
+def po_filters(
+    vendor: Optional[str] = Query(None, description="Case-insensitive vendor name substring"),
+    vendor_id: Optional[str] = None,
+    po_number: Optional[str] = None,
+    open_only: bool = Query(False, description="Only lines with a remaining amount"),
+    min_amount: Optional[float] = Query(None, description="Minimum line amount"),
+    max_amount: Optional[float] = Query(None, description="Maximum line amount"),
+    due_from: Optional[date] = Query(None, description="Due on or after this date"),
+    due_to: Optional[date] = Query(None, description="Due on or before this date")
+) -> List[Any]:
+    """Shared WHERE clauses for listing and counting purchase orders"""
+    conditions = []
+    if vendor:
+        conditions.append(PurchaseOrder.vendor_name.ilike(f"%{vendor}%"))
+    if vendor_id:
+        conditions.append(PurchaseOrder.vendor_id == vendor_id)
+    if po_number:
+        conditions.append(PurchaseOrder.po_number == po_number)
+    if open_only:
+        # Same definition of "open" as the candidate index
+        conditions.append(PurchaseOrder.remaining_amount > 0)
+    if min_amount is not None:
+        conditions.append(PurchaseOrder.line_amount >= min_amount)
+    if max_amount is not None:
+        conditions.append(PurchaseOrder.line_amount <= max_amount)
+    if due_from:
+        conditions.append(PurchaseOrder.due_date >= datetime.combine(due_from, time.min))
+    if due_to:
+        conditions.append(PurchaseOrder.due_date < datetime.combine(due_to + timedelta(days=1), time.min))
+    return conditions
+
 @router.get("/")
-async def get_all_purchase_orders(db: Session = Depends(get_db)):
-    """Get all purchase orders"""
+async def get_all_purchase_orders(
+    limit: int = Query(None, ge=1, description="Page size (default LIST_DEFAULT_LIMIT)"),
+    cursor: Optional[str] = Query(None, description="next_cursor from the previous page"),
+    fields: Optional[str] = Query(None, description="Comma-separated fields to return"),
+    include_total: bool = Query(False, description="Also count every matching line"),
+    conditions: List[Any] = Depends(po_filters),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """List purchase orders one keyset page at a time
+    
+    Pages are ordered by id and continue after the last id of the previous
+    page, so every page costs the same however deep it is. Only the
+    requested fields are selected.
+    """
     try:
-        pos = db.query(PurchaseOrder).all()
+        limit = page_limit(limit)
+        names = [f.strip() for f in fields.split(",") if f.strip()] if fields else DEFAULT_PO_LIST_FIELDS
+        unknown = [name for name in names if name not in PO_LIST_FIELDS]
+        if unknown:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Unknown field(s): {', '.join(unknown)}; choose from {', '.join(PO_LIST_FIELDS)}"
+            )
+        # po_id is always selected: it is the keyset
+        names = ["po_id"] + [name for name in dict.fromkeys(names) if name != "po_id"]
+        
+        stmt = select(*(PO_LIST_FIELDS[name].label(name) for name in names)).where(*conditions)
+        if cursor:
+            stmt = stmt.where(PurchaseOrder.id > decode_cursor(cursor))
+        # One extra row tells whether another page exists
+        rows = (await db.execute(stmt.order_by(PurchaseOrder.id).limit(limit + 1))).mappings().all()
+        
+        has_more = len(rows) > limit
+        items: List[Dict[str, Any]] = [dict(row) for row in rows[:limit]]
         
-        results = []
-        for po in pos:
-            results.append({
-                "po_id": po.id,
-                "po_number": po.po_number,
-                "po_line": po.po_line,
-                "vendor_name": po.vendor_name,
-                "description": po.line_description,
-                "line_amount": po.line_amount,
-                "remaining_amount": po.remaining_amount,
-                "due_date": po.due_date
-            })
+        total = None
+        if include_total:
+            total = await db.scalar(select(func.count(PurchaseOrder.id)).where(*conditions))
         
-        return results
+        return {
+            "items": items,
+            "next_cursor": encode_cursor(items[-1]["po_id"]) if has_more else None,
+            "limit": limit,
+            "total": total
+        }
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error fetching purchase orders: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.get("/count")
+async def count_purchase_orders(
+    conditions: List[Any] = Depends(po_filters),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Count purchase order lines matching the listing filters"""
+    try:
+        count = await db.scalar(select(func.count(PurchaseOrder.id)).where(*conditions))
+        return {"count": count}
+    except Exception as e:
+        logger.error(f"Error counting purchase orders: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+# Output field -> column for the PO detail's invoice list
+PO_INVOICE_FIELDS = {
+    "invoice_id": Invoice.id,
+    "invoice_number": Invoice.invoice_number,
+    "amount": Invoice.invoice_amount,
+}
+
 @router.get("/{po_id}")
-async def get_purchase_order(po_id: int, db: Session = Depends(get_db)):
-    """Get a specific purchase order with its invoices"""
+async def get_purchase_order(
+    po_id: int,
+    invoices_limit: int = Query(None, ge=1, description="Invoices per page (default LIST_DEFAULT_LIMIT)"),
+    invoices_cursor: Optional[str] = Query(None, description="invoices_next_cursor from the previous response"),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Get a specific purchase order with one page of its invoices
+    
+    Two column-only queries: the PO line, then a keyset page of its invoices,
+    instead of loading the ORM object and lazy-loading every invoice.
+    """
     try:
-        po = db.query(PurchaseOrder).filter(PurchaseOrder.id == po_id).first()
+        po = (await db.execute(
+            select(*(PO_LIST_FIELDS[name].label(name) for name in PO_DETAIL_FIELDS))
+            .where(PurchaseOrder.id == po_id)
+        )).mappings().first()
         
         if not po:
             raise HTTPException(status_code=404, detail="Purchase order not found")
         
+        limit = page_limit(invoices_limit)
+        stmt = select(*(column.label(name) for name, column in PO_INVOICE_FIELDS.items())).where(
+            Invoice.purchase_order_id == po_id
+        )
+        if invoices_cursor:
+            stmt = stmt.where(Invoice.id > decode_cursor(invoices_cursor))
+        rows = (await db.execute(stmt.order_by(Invoice.id).limit(limit + 1))).mappings().all()
+        invoices = [dict(row) for row in rows[:limit]]
+        
         return {
-            "po_id": po.id,
-            "po_number": po.po_number,
-            "po_line": po.po_line,
-            "vendor_name": po.vendor_name,
-            "description": po.line_description,
-            "line_amount": po.line_amount,
-            "received_amount": po.received_amount,
-            "remaining_amount": po.remaining_amount,
-            "due_date": po.due_date,
-            "invoices": [
-                {
-                    "invoice_id": inv.id,
-                    "invoice_number": inv.invoice_number,
-                    "amount": inv.invoice_amount
-                }
-                for inv in po.invoices
-            ]
+            **po,
+            "invoices": invoices,
+            "invoices_next_cursor": encode_cursor(invoices[-1]["invoice_id"]) if len(rows) > limit else None
         }
     except HTTPException:
         raise
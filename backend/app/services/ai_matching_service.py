@@ -1,18 +1,41 @@
 """Service for AI-powered invoice to PO matching"""
+import asyncio
 import json
 import logging
-from typing import Dict, Any, List, Tuple, Optional
-from openai import OpenAI
+import time
+from typing import Dict, Any, List, Tuple, Optional, Sequence, Union
+from openai import AsyncOpenAI, OpenAI
 from app.config import settings
+from app.services.fuzzy_matcher import POMatrix
+from app.services.llm_cache_service import llm_cache_service
+from app.services.metrics_service import (
+    FUZZY_MATCH_SECONDS,
+    LLM_CACHE_LOOKUPS,
+    LLM_REQUEST_SECONDS,
+    LLM_TOKENS,
+    MATCH_FALLBACKS
+)
+from app.services.rate_limiter import AsyncRateLimiter
 
 logger = logging.getLogger(__name__)
 
+MATCH_MAX_TOKENS = 1000
+
 class AIMatchingService:
     """Use AI to match invoices to purchase orders"""
     
     def __init__(self):
-        self.client = OpenAI(api_key=settings.OPENAI_API_KEY)
+        base_url = settings.OPENAI_BASE_URL or None
+        self.client = OpenAI(api_key=settings.OPENAI_API_KEY, base_url=base_url)
+        self.async_client = AsyncOpenAI(
+            api_key=settings.OPENAI_API_KEY, base_url=base_url, timeout=settings.AI_REQUEST_TIMEOUT
+        )
         self.model = settings.AI_MODEL
+        self.rate_limiter = AsyncRateLimiter(
+            settings.AI_REQUESTS_PER_MINUTE, settings.AI_TOKENS_PER_MINUTE
+        )
+        # Created on first use so it binds to the running event loop
+        self._semaphore: Optional[asyncio.Semaphore] = None
     
     def find_best_match(
         self,
@@ -23,7 +46,123 @@ class AIMatchingService:
         Find the best matching PO for an invoice using AI
         Returns: (best_po, match_score, reasoning)
         """
+        available_pos, messages, cache_key = self._prepare_match_request(invoice_data, available_pos)
+        
+        try:
+            response_text = llm_cache_service.get(cache_key)
+            cache_miss = response_text is None
+            LLM_CACHE_LOOKUPS.labels("match", "miss" if cache_miss else "hit").inc()
+            if cache_miss:
+                response_text = self._complete("match", messages, MATCH_MAX_TOKENS)
+            
+            match_result = self._finish_match(response_text, available_pos, cache_key, cache_miss)
+            return match_result["po"], match_result["score"], match_result["reasoning"]
+            
+        except Exception as e:
+            logger.error(f"Error in AI matching: {str(e)}")
+            MATCH_FALLBACKS.inc()
+            # Fallback to fuzzy matching
+            return self.fuzzy_match(invoice_data, available_pos)
+    
+    async def find_best_match_async(
+        self,
+        invoice_data: Dict[str, Any],
+        available_pos: List[Dict[str, Any]],
+        fallback: bool = True
+    ) -> Tuple[Optional[Dict[str, Any]], float, str]:
+        """
+        Non-blocking find_best_match for async routes
+        Calls go through the async client behind the rate limiter, a
+        concurrency cap and a per-call timeout, so the event loop stays free
+        while the model responds. With fallback=False a failed call raises,
+        for callers that fuzzy match their failures together.
+        """
+        available_pos, messages, cache_key = self._prepare_match_request(invoice_data, available_pos)
+        
+        try:
+            response_text = await asyncio.to_thread(llm_cache_service.get, cache_key)
+            cache_miss = response_text is None
+            LLM_CACHE_LOOKUPS.labels("match", "miss" if cache_miss else "hit").inc()
+            if cache_miss:
+                response_text = await self._complete_async(messages, MATCH_MAX_TOKENS)
+            
+            match_result = await asyncio.to_thread(
+                self._finish_match, response_text, available_pos, cache_key, cache_miss
+            )
+            return match_result["po"], match_result["score"], match_result["reasoning"]
+            
+        except Exception as e:
+            logger.error(f"Error in AI matching: {str(e) or type(e).__name__}")
+            MATCH_FALLBACKS.inc()
+            if not fallback:
+                raise
+            # Fallback to fuzzy matching
+            return self.fuzzy_match(invoice_data, available_pos)
+    
+    def _complete(self, kind: str, messages: List[Dict[str, str]], max_tokens: int) -> str:
+        """Blocking chat completion, timed and token-counted"""
+        started = time.perf_counter()
+        try:
+            response = self.client.chat.completions.create(
+                model=self.model,
+                messages=messages,
+                temperature=0.3,
+                max_tokens=max_tokens
+            )
+        except Exception:
+            self._record_completion(kind, started, "error")
+            raise
+        self._record_completion(kind, started, "ok", response)
+        return response.choices[0].message.content
+    
+    def _record_completion(self, kind: str, started: float, outcome: str, response: Any = None):
+        """Latency and token usage of one chat completion"""
+        LLM_REQUEST_SECONDS.labels(kind, outcome).observe(time.perf_counter() - started)
+        usage = getattr(response, "usage", None)
+        if usage:
+            LLM_TOKENS.labels(kind, "prompt").inc(usage.prompt_tokens or 0)
+            LLM_TOKENS.labels(kind, "completion").inc(usage.completion_tokens or 0)
+    
+    async def _complete_async(self, messages: List[Dict[str, str]], max_tokens: int, kind: str = "match") -> str:
+        """Rate-limited, concurrency-capped chat completion with a hard timeout"""
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(settings.AI_MAX_CONCURRENT_REQUESTS)
+        # Rough prompt size (~4 characters per token) plus the completion budget
+        estimated_tokens = sum(len(m["content"]) for m in messages) // 4 + max_tokens
         
+        async with self._semaphore:
+            await self.rate_limiter.acquire(estimated_tokens)
+            # Timed from here so queueing behind the limits is not counted as model latency
+            started = time.perf_counter()
+            try:
+                response = await asyncio.wait_for(
+                    self.async_client.chat.completions.create(
+                        model=self.model,
+                        messages=messages,
+                        temperature=0.3,
+                        max_tokens=max_tokens
+                    ),
+                    timeout=settings.AI_REQUEST_TIMEOUT
+                )
+            except asyncio.TimeoutError:
+                self._record_completion(kind, started, "timeout")
+                raise
+            except Exception:
+                self._record_completion(kind, started, "error")
+                raise
+            self._record_completion(kind, started, "ok", response)
+        
+        usage = getattr(response, "usage", None)
+        if usage and usage.total_tokens:
+            self.rate_limiter.refund(estimated_tokens - usage.total_tokens)
+        return response.choices[0].message.content
+    
+    def _prepare_match_request(
+        self,
+        invoice_data: Dict[str, Any],
+        available_pos: List[Dict[str, Any]]
+    ) -> Tuple[List[Dict[str, Any]], List[Dict[str, str]], str]:
+        """Build the chat messages and cache key for a match call"""
         if not available_pos:
             logger.warning("No available POs to match against")
             # --- DEMO MODE: Inject Dummy PO for testing ---
@@ -45,43 +184,54 @@ class AIMatchingService:
         
         # Create AI prompt
         prompt = self._create_matching_prompt(invoice_context, pos_context)
+        messages = [
+            {
+                "role": "system",
+                "content": "You are an expert in accounts payable automation and invoice matching. "
+                           "Analyze invoices and purchase orders to find the best matches. "
+                           "Return results as valid JSON."
+            },
+            {
+                "role": "user",
+                "content": prompt
+            }
+        ]
         
-        try:
-            response = self.client.chat.completions.create(
-                model=self.model,
-                messages=[
-                    {
-                        "role": "system",
-                        "content": "You are an expert in accounts payable automation and invoice matching. "
-                                   "Analyze invoices and purchase orders to find the best matches. "
-                                   "Return results as valid JSON."
-                    },
-                    {
-                        "role": "user",
-                        "content": prompt
-                    }
-                ],
-                temperature=0.3,
-                max_tokens=1000
-            )
-            
-            # Parse AI response
-            response_text = response.choices[0].message.content
-            match_result = self._parse_ai_response(response_text, available_pos)
-            
-            return match_result["po"], match_result["score"], match_result["reasoning"]
-            
-        except Exception as e:
-            logger.error(f"Error in AI matching: {str(e)}")
-            # Fallback to fuzzy matching
-            return self.fuzzy_match(invoice_data, available_pos)
+        # Same invoice, same candidate POs, same model -> same answer
+        cache_key = llm_cache_service.make_key("match", self.model, invoice_context, pos_context)
+        return available_pos, messages, cache_key
+    
+    def _finish_match(
+        self,
+        response_text: str,
+        available_pos: List[Dict[str, Any]],
+        cache_key: str,
+        cache_miss: bool
+    ) -> Dict[str, Any]:
+        """Parse the model's answer and cache it if it was fresh and well-formed"""
+        match_result = self._parse_ai_response(response_text, available_pos)
+        if cache_miss and match_result["reasoning"] != "Error parsing AI response":
+            llm_cache_service.set(cache_key, "match", self.model, response_text)
+        return match_result
     
     def fuzzy_match(
         self,
         invoice_data: Dict[str, Any],
-        available_pos: List[Dict[str, Any]]
+        available_pos: Union[List[Dict[str, Any]], POMatrix]
     ) -> Tuple[Optional[Dict[str, Any]], float, str]:
-        """Fallback fuzzy matching using BAQ fields when AI is not available"""
+        """Fallback fuzzy matching using BAQ fields when AI is not available
+        
+        A POMatrix is scored with the vectorized engine and returns the same
+        (po, score, reasoning) as the loop below. Matching only ever scores
+        the candidate index's MATCH_CANDIDATE_LIMIT lines, where the loop is
+        faster, so only the benchmarks pass one.
+        """
+        started = time.perf_counter()
+        if isinstance(available_pos, POMatrix):
+            result = available_pos.best_match(invoice_data)
+            FUZZY_MATCH_SECONDS.labels("matrix").observe(time.perf_counter() - started)
+            return result
+        
         best_po = None
         best_score = 0.0
         best_reasoning = ""
@@ -145,8 +295,19 @@ class AIMatchingService:
                 best_reasoning = "; ".join(reasoning_parts) if reasoning_parts else "Partial match"
         
         reasoning = best_reasoning if best_po else "No suitable matches found"
+        FUZZY_MATCH_SECONDS.labels("loop").observe(time.perf_counter() - started)
         return best_po, min(best_score, 1.0), reasoning
     
+    def fuzzy_match_batch(
+        self,
+        invoices: Sequence[Dict[str, Any]],
+        available_pos: Union[List[Dict[str, Any]], POMatrix]
+    ) -> List[Tuple[Optional[Dict[str, Any]], float, str]]:
+        """Fuzzy match many invoices against one PO set; a POMatrix scores them in one pass"""
+        if isinstance(available_pos, POMatrix):
+            return available_pos.best_matches(invoices)
+        return [self.fuzzy_match(invoice_data, available_pos) for invoice_data in invoices]
+    
     def _prepare_invoice_context(self, invoice_data: Dict[str, Any]) -> str:
         """Format invoice data for AI analysis with BAQ field support"""
         return json.dumps({
@@ -287,16 +448,17 @@ Please validate this match and provide:
 Return as JSON.
 """
         
+        cache_key = llm_cache_service.make_key("validate", self.model, prompt)
+        
         try:
-            response = self.client.chat.completions.create(
-                model=self.model,
-                messages=[{"role": "user", "content": prompt}],
-                temperature=0.3,
-                max_tokens=500
-            )
+            response_text = llm_cache_service.get(cache_key)
+            LLM_CACHE_LOOKUPS.labels("validate", "miss" if response_text is None else "hit").inc()
+            if response_text is not None:
+                return json.loads(response_text)
             
-            response_text = response.choices[0].message.content
+            response_text = self._complete("validate", [{"role": "user", "content": prompt}], 500)
             validation_result = json.loads(response_text)
+            llm_cache_service.set(cache_key, "validate", self.model, response_text)
             return validation_result
             
         except Exception as e:
@@ -2,8 +2,12 @@
 import requests
 import base64
 import os
-from typing import List, Dict, Any
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import List, Dict, Any, Deque, Iterator, Optional
 from app.config import settings
+from app.services.metrics_service import EPICOR_ERRORS, EPICOR_FETCH_SECONDS, EPICOR_MAP_SECONDS, EPICOR_ROWS
 import urllib3
 import logging
 
@@ -39,32 +43,56 @@ class EpicorService:
         except (ValueError, TypeError):
             return default
 
+    def _baq_url(self, baq_id: Optional[str]) -> str:
+        """Construct URL: https://199.5.83.159/EpicorERP/api/v1/BaqSvc/PO_Test"""
+        if baq_id is None:
+            baq_id = os.getenv("EPICOR_BAQ_ID", "PO_Test")
+        base = self.base_url.rstrip('/')
+        return f"{base}/BaqSvc/{baq_id}"
+
+    def _call_headers(self) -> Dict[str, str]:
+        """Add Company Header (only if company is set)"""
+        headers = {}
+        if self.company:
+            headers["CallSettings"] = f'{{"Company":"{self.company}"}}'
+        return headers
+
+    def _map_po_row(self, po: Dict[str, Any]) -> Dict[str, Any]:
+        """Map a raw BAQ row to invoice matching fields"""
+        return {
+            "po_number": po.get("PODetail_PONUM"),
+            "po_line": po.get("PODetail_POLine"),
+            "vendor_id": po.get("Vendor_VendorID"),
+            "vendor_name": po.get("Vendor_Name"),
+            "part_number": po.get("PODetail_PartNum"),
+            "supplier_part": po.get("PODetail_VenPartNum"),
+            "line_description": po.get("PODetail_LineDesc"),
+            "unit_cost": self._safe_float(po.get("PODetail_UnitCost")),
+            "order_qty": self._safe_float(po.get("PODetail_OrderQty")),
+            "our_qty": self._safe_float(po.get("PODetail_XOrderQty")),
+            "base_uom": po.get("PODetail_BaseUOM"),
+            "line_amount": self._safe_float(po.get("PODetail_DocExitCost")),
+            "open_line": po.get("PODetail_OpenLine"),
+            "changed_at": po.get(settings.EPICOR_CHANGE_FIELD) if settings.EPICOR_CHANGE_FIELD else None,
+        }
+
     def get_purchase_orders(self, baq_id: str = None) -> List[Dict[str, Any]]:
         """
         Fetch purchase orders using BAQ
         Maps BAQ fields to invoice matching requirements
         """
-        if baq_id is None:
-            baq_id = os.getenv("EPICOR_BAQ_ID", "PO_Test")
-            
         try:
-            # Construct URL: https://199.5.83.159/EpicorERP/api/v1/BaqSvc/PO_Test
-            base = self.base_url.rstrip('/')
-            url = f"{base}/BaqSvc/{baq_id}"
+            url = self._baq_url(baq_id)
             
             logger.info(f"🔌 Connecting to Epicor BAQ: {url}")
             
-            # Add Company Header (only if company is set)
-            headers = {}
-            if self.company:
-                headers["CallSettings"] = f'{{"Company":"{self.company}"}}'
-            
             # verify=False is CRITICAL for IP address connections
-            response = self.session.get(url, headers=headers, verify=False, timeout=30)
-            response.raise_for_status()
-            
-            data = response.json()
-            pos = []
+            with EPICOR_FETCH_SECONDS.time():
+                response = self.session.get(
+                    url, headers=self._call_headers(), verify=False, timeout=settings.EPICOR_TIMEOUT
+                )
+                response.raise_for_status()
+                data = response.json()
             
             items = data.get("value", [])
             if items:
@@ -75,27 +103,113 @@ class EpicorService:
                 logger.warning(f"⚠️ BAQ returned 0 records. Response keys: {list(data.keys())}")
                 logger.debug(f"Raw Response: {data}")
 
-            for po in items:
-                pos.append({
-                    "po_number": po.get("PODetail_PONUM"),
-                    "po_line": po.get("PODetail_POLine"),
-                    "vendor_id": po.get("Vendor_VendorID"),
-                    "vendor_name": po.get("Vendor_Name"),
-                    "part_number": po.get("PODetail_PartNum"),
-                    "supplier_part": po.get("PODetail_VenPartNum"),
-                    "line_description": po.get("PODetail_LineDesc"),
-                    "unit_cost": self._safe_float(po.get("PODetail_UnitCost")),
-                    "order_qty": self._safe_float(po.get("PODetail_OrderQty")),
-                    "our_qty": self._safe_float(po.get("PODetail_XOrderQty")),
-                    "base_uom": po.get("PODetail_BaseUOM"),
-                    "line_amount": self._safe_float(po.get("PODetail_DocExitCost")),
-                })
+            EPICOR_ROWS.inc(len(items))
+            with EPICOR_MAP_SECONDS.time():
+                pos = [self._map_po_row(po) for po in items]
             
             logger.info(f"Successfully fetched {len(pos)} purchase orders from Epicor BAQ")
             return pos
             
         except requests.exceptions.RequestException as e:
+            EPICOR_ERRORS.inc()
             logger.error(f"Error fetching purchase orders from Epicor BAQ: {str(e)}")
             raise
 
+    def iter_purchase_orders(
+        self,
+        baq_id: str = None,
+        page_size: Optional[int] = None,
+        max_concurrency: Optional[int] = None,
+        changed_since: Optional[str] = None
+    ) -> Iterator[Dict[str, Any]]:
+        """
+        Stream purchase orders from the BAQ one OData page at a time
+        Pages are requested with $top/$skip, up to max_concurrency in flight,
+        and yielded in order so only a bounded number of pages is held in memory.
+        A short page followed by an empty one is the end; rows after a short
+        page mean the server caps $top, and paging restarts at the size it
+        serves. A cap only shows past the first page_size rows, so keep
+        EPICOR_PAGE_SIZE at or below the server's limit.
+        With changed_since, only rows whose EPICOR_CHANGE_FIELD is at or after
+        that watermark are requested.
+        """
+        page_size = page_size or settings.EPICOR_PAGE_SIZE
+        max_concurrency = max(1, max_concurrency or settings.EPICOR_MAX_CONCURRENT_PAGES)
+        url = self._baq_url(baq_id)
+        logger.info(f"🔌 Streaming Epicor BAQ: {url} (page size {page_size}, concurrency {max_concurrency})")
+
+        total = 0
+        next_skip = 0
+        # Size of the last page when it came back short, until the next page says why
+        short_page: Optional[int] = None
+        in_flight: Deque[Future] = deque()
+        with ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix="epicor-baq") as pool:
+            try:
+                while True:
+                    # Keep the window full; pages past the end come back empty.
+                    # After a short page, only the page already behind it is needed
+                    while len(in_flight) < (1 if short_page else max_concurrency):
+                        in_flight.append(pool.submit(self._fetch_page, url, next_skip, page_size, changed_since))
+                        next_skip += page_size
+
+                    items = in_flight.popleft().result()
+                    if not items:
+                        # A short page followed by an empty one was just the last page
+                        break
+                    if short_page:
+                        # Rows after a short page: the server caps $top below
+                        # page_size, so this page and the ones in flight skipped
+                        # past rows. Refetch from here at the size served
+                        logger.debug(f"BAQ serves {short_page} of {page_size} rows per page; paging by {short_page}")
+                        page_size, short_page = short_page, None
+                        for future in in_flight:
+                            future.cancel()
+                        in_flight.clear()
+                        next_skip = total
+                        continue
+                    # Map the page in one go so it is timed as a stage of its own
+                    started = time.perf_counter()
+                    pos = [self._map_po_row(po) for po in items]
+                    EPICOR_MAP_SECONDS.observe(time.perf_counter() - started)
+                    yield from pos
+                    total += len(items)
+
+                    if len(items) < page_size:
+                        short_page = len(items)
+            finally:
+                for future in in_flight:
+                    future.cancel()
+
+        logger.info(f"Successfully streamed {total} purchase orders from Epicor BAQ")
+
+    def _fetch_page(
+        self, url: str, skip: int, top: int, changed_since: Optional[str] = None
+    ) -> List[Dict[str, Any]]:
+        """Fetch a single $top/$skip page of raw BAQ rows"""
+        params = {"$top": top, "$skip": skip}
+        if changed_since and settings.EPICOR_CHANGE_FIELD:
+            # "ge" rather than "gt": rows sharing the watermark timestamp are
+            # re-read, and the row hash check makes that re-read free
+            params["$filter"] = f"{settings.EPICOR_CHANGE_FIELD} ge {changed_since}"
+        if settings.EPICOR_PAGE_ORDER_BY:
+            # Paging is only stable over a deterministic ordering
+            params["$orderby"] = settings.EPICOR_PAGE_ORDER_BY
+        try:
+            with EPICOR_FETCH_SECONDS.time():
+                response = self.session.get(
+                    url,
+                    params=params,
+                    headers=self._call_headers(),
+                    verify=False,
+                    timeout=settings.EPICOR_TIMEOUT
+                )
+                response.raise_for_status()
+                items = response.json().get("value", [])
+            EPICOR_ROWS.inc(len(items))
+            return items
+        except requests.exceptions.RequestException as e:
+            EPICOR_ERRORS.inc()
+            logger.error(f"Error fetching BAQ page (skip={skip}, top={top}): {str(e)}")
+            raise
+
 epicor_service = EpicorService()
@@ -0,0 +1,91 @@
+"""Persistent cache of invoice extraction results keyed by file content"""
+import json
+import logging
+import threading
+from datetime import datetime
+from typing import Any, Dict, Optional
+from sqlalchemy import delete, func, update
+from app.config import settings
+from app.models.database import ExtractionCacheEntry
+from app.models.session import SessionLocal
+from app.models.write_queue import write_queue
+
+logger = logging.getLogger(__name__)
+
+class ExtractionCacheService:
+    """Extraction results stored per (file SHA-256, extractor version)"""
+
+    def __init__(self, enabled: Optional[bool] = None):
+        self.enabled = settings.EXTRACTION_CACHE_ENABLED if enabled is None else enabled
+        self._lock = threading.Lock()
+        self._counters = {"hits": 0, "misses": 0, "stores": 0}
+
+    def get(self, file_hash: str, extractor_version: str) -> Optional[Dict[str, Any]]:
+        """Return the cached extraction for these bytes, or None"""
+        if not self.enabled:
+            return None
+        try:
+            with SessionLocal() as db:
+                entry = db.get(ExtractionCacheEntry, (file_hash, extractor_version))
+                if entry is None:
+                    self._count("misses")
+                    return None
+                result = json.loads(entry.result)
+            # Hit statistics are not waited on; the extraction is already in hand
+            write_queue.submit(self._record_hit, file_hash, extractor_version, datetime.utcnow())
+        except Exception as e:
+            logger.warning(f"Could not read extraction cache: {str(e)}")
+            return None
+        self._count("hits")
+        return result
+
+    def set(self, file_hash: str, extractor_version: str, extracted_data: Dict[str, Any]):
+        if not self.enabled:
+            return
+        try:
+            entry = ExtractionCacheEntry(
+                file_hash=file_hash,
+                extractor_version=extractor_version,
+                result=json.dumps(extracted_data, default=str),
+                hits=0,
+                created_date=datetime.utcnow()
+            )
+            write_queue.run(lambda db: db.merge(entry))
+            self._count("stores")
+        except Exception as e:
+            logger.warning(f"Could not persist extraction cache entry: {str(e)}")
+
+    def prune(self, extractor_version: str) -> int:
+        """Delete entries written by any other extractor version"""
+        try:
+            removed = write_queue.run(lambda db: db.execute(
+                delete(ExtractionCacheEntry)
+                .where(ExtractionCacheEntry.extractor_version != extractor_version)
+            ).rowcount)
+        except Exception as e:
+            logger.warning(f"Could not prune extraction cache: {str(e)}")
+            return 0
+        if removed:
+            logger.info(f"Pruned {removed} extraction cache entries from older extractor versions")
+        return removed
+
+    @staticmethod
+    def _record_hit(db, file_hash: str, extractor_version: str, hit_date: datetime):
+        db.execute(
+            update(ExtractionCacheEntry)
+            .where(
+                ExtractionCacheEntry.file_hash == file_hash,
+                ExtractionCacheEntry.extractor_version == extractor_version
+            )
+            .values(hits=func.coalesce(ExtractionCacheEntry.hits, 0) + 1, last_hit_date=hit_date)
+        )
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self._counters)
+
+    def _count(self, name: str):
+        with self._lock:
+            self._counters[name] += 1
+
+extraction_cache_service = ExtractionCacheService()
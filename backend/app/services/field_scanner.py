@@ -0,0 +1,147 @@
+"""Single-pass, precompiled scanner for invoice header fields"""
+import json
+import re
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional
+
+# Value shapes shared by the default rules
+_DATE = r"\d{1,2}/\d{1,2}/\d{2,4}|\d{4}-\d{2}-\d{2}"
+_AMOUNT = r"\d[\d,]*(?:\.\d{1,2})?(?![\w/\-]|\.\d)"  # not part of a code or date
+_ID = r"(?=[A-Za-z\-/]*\d)[A-Za-z0-9][A-Za-z0-9\-/]*"  # must contain a digit
+_NAME = r"[A-Z][A-Za-z0-9&.,'\-]*(?:[^\S\n]+[A-Za-z0-9&.,'\-]+)*"  # one line of words
+
+class FieldRule(NamedTuple):
+    """
+    One way of recognising a field: `pattern` has exactly one capturing group
+    around the value. Matches start at word boundaries only; rules are tried in
+    list order at each word start, so specific label rules go before loose fallbacks.
+    """
+    field: str
+    pattern: str
+    confidence: float
+    prefer: str = "first"  # tie-break among equal-confidence candidates: first, last, max
+    value_type: str = "text"  # text or amount
+
+class FieldCandidate(NamedTuple):
+    field: str
+    value: Any
+    start: int
+    end: int
+    confidence: float
+    rule: int  # index of the rule that produced it
+
+# Scoped (?i:...) keeps label keywords case-insensitive while values keep their case rules
+DEFAULT_RULES: List[FieldRule] = [
+    FieldRule("invoice_number", rf"(?i:invoice)\s*(?i:number|num\.?|no\.?|#)[\s:#.]*({_ID})", 0.9),
+    FieldRule("invoice_number", rf"(?i:inv)\.?\s*(?i:number|no\.?|#)[\s:#.]*({_ID})", 0.8),
+    FieldRule("invoice_date", rf"(?i:invoice|bill)\s+(?i:date|issued)[\s:]*({_DATE})", 0.9),
+    # Consumes "Due Date: ..." so the generic date rule never sees it
+    FieldRule("due_date", rf"(?i:due)\s+(?i:date)[\s:]*({_DATE})", 0.9),
+    FieldRule("invoice_date", rf"(?i:date)\b[\s:]*({_DATE})", 0.6),
+    FieldRule(
+        "invoice_amount",
+        rf"(?i:total\s+amount\s+due|amount\s+due|balance\s+due|total\s+due|grand\s+total|invoice\s+total)"
+        rf"\b[\s:]*\$?\s*({_AMOUNT})",
+        0.95, "last", "amount"
+    ),
+    FieldRule("invoice_amount", rf"(?i:total)\b[\s:]*\$?\s*({_AMOUNT})", 0.7, "last", "amount"),
+    FieldRule("invoice_amount", rf"(?i:amount|due)\b[\s:]*\$?\s*({_AMOUNT})", 0.6, "last", "amount"),
+    FieldRule(
+        "po_reference",
+        rf"(?i:purchase\s+order|p\.?\s?o\.?)(?:\s*(?i:number|num|no\.?|ref(?:erence)?\.?|#))?[\s:#.]*({_ID})",
+        0.9
+    ),
+    FieldRule("po_reference", r"(PO-?\d[\w\-]*)", 0.6),
+    FieldRule(
+        "vendor_name",
+        rf"(?i:bill\s+from|remit\s+to|vendor|supplier)\b[^\S\n]*:?[^\S\n]*\n?[^\S\n]*({_NAME})",
+        0.9
+    ),
+    FieldRule("vendor_name", rf"(?i:from)\b[^\S\n]*:?[^\S\n]*\n?[^\S\n]*({_NAME})", 0.7),
+    # A bare identifier alone on its line
+    FieldRule("invoice_number", r"^((?=[A-Z\-]*\d)[A-Z0-9\-]{5,20})[^\S\n]*$", 0.2),
+    FieldRule("invoice_date", rf"({_DATE})", 0.3),
+    # Letterhead: the document's first line, unless it is a document title
+    FieldRule(
+        "vendor_name",
+        rf"\A(?!(?i:invoice|bill|statement|credit|debit|remit)\b)({_NAME})[^\S\n]*$",
+        0.3
+    ),
+    FieldRule("invoice_amount", r"(?<=\$)(\d[\d,]*\.\d{2})\b", 0.3, "max", "amount"),
+    FieldRule("invoice_amount", r"(?<![\w/.\-])(\d{1,3}(?:,\d{3})+(?:\.\d{2})?|\d+\.\d{2})(?![\w/])", 0.1, "max", "amount"),
+]
+
+class FieldScanner:
+    """
+    Compiles a rule set into one alternation and walks the text once with
+    finditer, collecting every candidate with its position and confidence
+    """
+
+    def __init__(self, rules: Optional[Iterable[FieldRule]] = None):
+        self.rules = list(DEFAULT_RULES if rules is None else rules)
+        for i, rule in enumerate(self.rules):
+            if rule.prefer not in ("first", "last", "max"):
+                raise ValueError(f"Rule {i} ({rule.field}): unknown prefer '{rule.prefer}'")
+            groups = re.compile(rule.pattern, re.MULTILINE).groups
+            if groups != 1:
+                raise ValueError(f"Rule {i} ({rule.field}): expected 1 capturing group, found {groups}")
+        # Rule i owns group i + 1, so match.lastindex names the rule without
+        # wrapper groups; one leading \b rejects positions inside words before
+        # any rule is tried
+        self._master = re.compile(
+            r"\b(?:" + "|".join(rule.pattern for rule in self.rules) + ")", re.MULTILINE
+        )
+
+    @classmethod
+    def from_file(cls, path: str) -> "FieldScanner":
+        """Load a rule set from a JSON list of FieldRule objects"""
+        with open(path, "r", encoding="utf-8") as f:
+            return cls(FieldRule(**rule) for rule in json.load(f))
+
+    @property
+    def signature(self) -> str:
+        """Stable description of the rule set, for cache versioning"""
+        return json.dumps([rule._asdict() for rule in self.rules], sort_keys=True)
+
+    def scan(self, text: str) -> Dict[str, List[FieldCandidate]]:
+        """All candidates per field, in text order"""
+        candidates: Dict[str, List[FieldCandidate]] = {}
+        # Leading whitespace is dropped so \A rules see the first text;
+        # positions stay relative to the original string
+        body = text.lstrip()
+        offset = len(text) - len(body)
+        for match in self._master.finditer(body):
+            group = match.lastindex
+            rule = self.rules[group - 1]
+            value = self._convert(match.group(group), rule.value_type)
+            if value is None:
+                continue
+            start, end = match.span(group)
+            candidates.setdefault(rule.field, []).append(FieldCandidate(
+                rule.field, value, start + offset, end + offset, rule.confidence, group - 1
+            ))
+        return candidates
+
+    def extract(self, text: str) -> Dict[str, FieldCandidate]:
+        """Best candidate per field: highest confidence, then the rule's tie-break"""
+        best: Dict[str, FieldCandidate] = {}
+        for field, found in self.scan(text).items():
+            top = max(c.confidence for c in found)
+            tied = [c for c in found if c.confidence == top]
+            prefer = self.rules[tied[0].rule].prefer
+            if prefer == "last":
+                best[field] = tied[-1]
+            elif prefer == "max":
+                best[field] = max(tied, key=lambda c: c.value)
+            else:
+                best[field] = tied[0]
+        return best
+
+    @staticmethod
+    def _convert(raw: str, value_type: str) -> Any:
+        raw = raw.strip()
+        if value_type == "amount":
+            try:
+                return float(raw.replace(",", ""))
+            except ValueError:
+                return None
+        return raw or None
@@ -0,0 +1,217 @@
+"""NumPy-vectorized fuzzy scoring of invoices against columnar PO data
+
+Only pays off from about 200 POs shared by 4+ invoices (benchmarks.run).
+Matching scores at most MATCH_CANDIDATE_LIMIT candidates from the blocking
+index, so the app uses fuzzy_match's loop and this engine is benchmark-only.
+"""
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+import numpy as np
+
+# Match terms as bit flags, in AIMatchingService.fuzzy_match's scoring order
+VENDOR_EXACT = 1
+VENDOR_PARTIAL = 2
+PO_REFERENCE = 4
+AMOUNT_EXACT = 8
+AMOUNT_CLOSE = 16
+PART = 32
+DESCRIPTION = 64
+
+TERMS = (
+    (VENDOR_EXACT, 0.3, "Exact vendor match"),
+    (VENDOR_PARTIAL, 0.15, "Partial vendor match"),
+    (PO_REFERENCE, 0.4, "PO number reference match"),
+    (AMOUNT_EXACT, 0.3, "Exact amount match"),
+    (AMOUNT_CLOSE, 0.15, "Amount close match"),
+    (PART, 0.25, "Part number match"),
+    (DESCRIPTION, 0.1, "Description match"),
+)
+AMOUNT_TOLERANCE = 0.05
+
+def _score_tables() -> Tuple[np.ndarray, np.ndarray]:
+    """Score of every flag combination, summed in the loop's order so float
+    results match bit for bit, plus a dense rank usable with argmax"""
+    scores = np.zeros(1 << len(TERMS), dtype=np.float64)
+    for code in range(len(scores)):
+        total = 0.0
+        for bit, value, _ in TERMS:
+            if code & bit:
+                total += value
+        scores[code] = total
+    ranks = np.unique(scores, return_inverse=True)[1].astype(np.uint8)
+    return scores, ranks
+
+_SCORE_TABLE, _SCORE_RANK = _score_tables()
+
+# Invoices scored together per broadcast block (block x POs float64 matrices)
+BATCH_BLOCK_SIZE = 32
+
+MatchResult = Tuple[Optional[Dict[str, Any]], float, str]
+
+class _Vocabulary:
+    """Integer codes for strings; code 0 is reserved for empty/missing"""
+
+    def __init__(self):
+        self.codes: Dict[str, int] = {"": 0}
+        self.values: List[str] = [""]
+
+    def encode(self, value: str) -> int:
+        code = self.codes.get(value)
+        if code is None:
+            code = len(self.values)
+            self.codes[value] = code
+            self.values.append(value)
+        return code
+
+    def lookup(self, value: str) -> int:
+        """Code for value, or -1 if it never occurs in the PO set"""
+        return self.codes.get(value, -1) if value else 0
+
+class _StringColumn:
+    """Integer-coded string column with fast substring lookups over its distinct values"""
+
+    def __init__(self, values: Sequence[str]):
+        self.vocabulary = _Vocabulary()
+        self.codes = np.fromiter(
+            (self.vocabulary.encode(v) for v in values), dtype=np.int32, count=len(values)
+        )
+        # All distinct values as one NUL-separated UTF-8 buffer, so a substring
+        # search is a few vectorized byte comparisons instead of a Python loop
+        encoded = [v.encode("utf-8") for v in self.vocabulary.values]
+        self._buffer = np.frombuffer(b"\x00".join(encoded), dtype=np.uint8)
+        self._starts = np.cumsum([0] + [len(v) + 1 for v in encoded[:-1]])
+
+    def codes_containing(self, needle: str) -> np.ndarray:
+        """Boolean mask over distinct codes whose value contains needle"""
+        mask = np.zeros(len(self.vocabulary.values), dtype=bool)
+        pattern = needle.encode("utf-8")
+        if not pattern or b"\x00" in pattern or len(pattern) > len(self._buffer):
+            return mask
+        # Whole-buffer comparisons for the first few bytes, then narrow the
+        # surviving positions one byte at a time
+        span = len(self._buffer) - len(pattern) + 1
+        prefix = min(len(pattern), 3)
+        candidates = self._buffer[:span] == pattern[0]
+        for offset in range(1, prefix):
+            candidates &= self._buffer[offset:offset + span] == pattern[offset]
+        positions = np.flatnonzero(candidates)
+        for offset in range(prefix, len(pattern)):
+            if not positions.size:
+                break
+            positions = positions[self._buffer[positions + offset] == pattern[offset]]
+        mask[np.searchsorted(self._starts, positions, side="right") - 1] = True
+        mask[0] = False
+        return mask
+
+    def codes_within(self, text: str) -> np.ndarray:
+        """Boolean mask over distinct codes whose value is a substring of text"""
+        mask = np.zeros(len(self.vocabulary.values), dtype=bool)
+        codes = self.vocabulary.codes
+        for i in range(len(text)):
+            for j in range(i + 1, len(text) + 1):
+                code = codes.get(text[i:j])
+                if code:
+                    mask[code] = True
+        return mask
+
+class POMatrix:
+    """Columnar view of a PO list: float amounts and integer-coded vendor/part keys"""
+
+    def __init__(self, available_pos: Sequence[Dict[str, Any]]):
+        self.pos = list(available_pos)
+        n = len(self.pos)
+
+        self.vendors = _StringColumn([(po.get("vendor_name") or "").lower() for po in self.pos])
+        self.po_numbers = _StringColumn([str(po.get("po_number")) for po in self.pos])
+        self.descriptions = _StringColumn([(po.get("line_description") or "").lower() for po in self.pos])
+        self.amounts = np.fromiter(
+            (po.get("line_amount", 0) or 0.0 for po in self.pos), dtype=np.float64, count=n
+        )
+
+        # fuzzy_match skips POs without an amount; a negative tolerance does the same
+        self._tolerance = np.where(self.amounts != 0, self.amounts * AMOUNT_TOLERANCE, -1.0)
+        self._close_tolerance = self._tolerance * 2
+
+        self.parts = _Vocabulary()
+        self.part_codes = np.fromiter(
+            (self.parts.encode((po.get("part_number") or "").lower()) for po in self.pos),
+            dtype=np.int32, count=n
+        )
+        self.supplier_part_codes = np.fromiter(
+            (self.parts.encode((po.get("supplier_part") or "").lower()) for po in self.pos),
+            dtype=np.int32, count=n
+        )
+
+    def __len__(self) -> int:
+        return len(self.pos)
+
+    def best_match(self, invoice_data: Dict[str, Any]) -> MatchResult:
+        """Score one invoice against every PO; same contract as fuzzy_match"""
+        return self.best_matches([invoice_data])[0]
+
+    def best_matches(self, invoices: Sequence[Dict[str, Any]]) -> List[MatchResult]:
+        """Score a batch of invoices, broadcasting over (invoice block x PO) arrays"""
+        results: List[MatchResult] = []
+        if not len(self):
+            return [(None, 0.0, "No suitable matches found") for _ in invoices]
+        for start in range(0, len(invoices), BATCH_BLOCK_SIZE):
+            block = invoices[start:start + BATCH_BLOCK_SIZE]
+            flags = self._flags(block)
+            # Rank of each PO's score; argmax returns the first best PO, the
+            # same one fuzzy_match's strict ">" keeps
+            best = np.argmax(_SCORE_RANK[flags], axis=1)
+            for row, col in enumerate(best):
+                code = int(flags[row, col])
+                score = float(_SCORE_TABLE[code])
+                if score <= 0:
+                    results.append((None, 0.0, "No suitable matches found"))
+                    continue
+                reasoning = "; ".join(reason for bit, _, reason in TERMS if code & bit)
+                results.append((self.pos[int(col)], min(score, 1.0), reasoning))
+        return results
+
+    def _flags(self, block: Sequence[Dict[str, Any]]) -> np.ndarray:
+        """Bitmask of matched TERMS for every (invoice, PO) pair as a uint8 array"""
+        flags = np.zeros((len(block), len(self)), dtype=np.uint8)
+
+        vendor_names = [(inv.get("vendor_name") or "").lower() for inv in block]
+        # Partial vendor containment is decided once per distinct PO vendor,
+        # then gathered through the vendor codes
+        vendor_table = np.zeros((len(block), len(self.vendors.vocabulary.values)), dtype=np.uint8)
+        for row, vendor in enumerate(vendor_names):
+            if vendor:
+                partial = self.vendors.codes_containing(vendor) | self.vendors.codes_within(vendor)
+                vendor_table[row, partial] = VENDOR_PARTIAL
+                exact = self.vendors.vocabulary.lookup(vendor)
+                if exact > 0:
+                    vendor_table[row, exact] = VENDOR_EXACT
+        flags |= vendor_table[:, self.vendors.codes]
+
+        invoice_amounts = np.array(
+            [inv.get("invoice_amount", 0) or 0.0 for inv in block], dtype=np.float64
+        )[:, None]
+        diff = np.abs(invoice_amounts - self.amounts)
+        # "close" includes "exact"; exact lines end up with AMOUNT_EXACT only
+        amount_bits = (diff <= self._close_tolerance).view(np.uint8) * np.uint8(AMOUNT_CLOSE)
+        amount_bits -= (diff <= self._tolerance).view(np.uint8) * np.uint8(AMOUNT_CLOSE - AMOUNT_EXACT)
+        amount_bits[invoice_amounts[:, 0] == 0] = 0
+        flags |= amount_bits
+
+        for row, invoice_data in enumerate(block):
+            part = self.parts.lookup((invoice_data.get("part_number") or "").lower())
+            if part > 0:
+                mask = (self.part_codes == part) | (self.supplier_part_codes == part)
+                np.bitwise_or(flags[row], PART, out=flags[row], where=mask)
+
+            po_reference = invoice_data.get("po_reference")
+            if po_reference:
+                ref = str(po_reference)
+                # ref in po_number, or po_number in ref
+                codes = self.po_numbers.codes_containing(ref) | self.po_numbers.codes_within(ref)
+                np.bitwise_or(flags[row], PO_REFERENCE, out=flags[row], where=codes[self.po_numbers.codes])
+
+            description = (invoice_data.get("description") or "").lower()
+            if description:
+                codes = self.descriptions.codes_containing(description)
+                np.bitwise_or(flags[row], DESCRIPTION, out=flags[row], where=codes[self.descriptions.codes])
+
+        return flags
@@ -1,41 +1,76 @@
 """Service for extracting data from invoice documents"""
 import os
+import ast
 import json
+import asyncio
+import hashlib
+import inspect
 import logging
-from typing import Dict, Any, Optional
+import multiprocessing
+import threading
+import time
+from concurrent.futures import Future, ProcessPoolExecutor, wait
+from typing import Dict, Any, List, Optional, Set
 import pdfplumber
 from pathlib import Path
 import re
+from datetime import datetime
+from app.config import settings
+from app.models.database import Invoice
+from app.services.extraction_cache_service import extraction_cache_service
+from app.services.field_scanner import FieldScanner
+from app.services.metrics_service import FIELD_EXTRACTION_SECONDS, PDF_EXTRACTION_SECONDS, PDF_PAGES, metrics
+from app.services.upload_storage_service import file_sha256
 
 logger = logging.getLogger(__name__)
 
+# Signals that a PDF page holds a line-item table
+_LINE_ITEM_HEADING_RE = re.compile(r"\b(?:qty|quantity|unit\s+price|item\s+(?:no|number|#)|description)\b", re.IGNORECASE)
+_AMOUNT_LINE_RE = re.compile(r"\d[\d,]*\.\d{2}[^\S\n]*$", re.MULTILINE)
+
 class InvoiceExtractionService:
     """Extract structured data from various invoice formats"""
     
-    # Common invoice field patterns
-    INVOICE_NUMBER_PATTERNS = [
-        r"invoice\s+(?:number|#|no\.?)[\s:]*([A-Z0-9\-]+)",
-        r"inv\s+(?:number|#|no\.?)[\s:]*([A-Z0-9\-]+)",
-        r"^([A-Z0-9\-]{5,20})$"  # Standalone invoice number
-    ]
-    
-    AMOUNT_PATTERNS = [
-        r"(?:total|amount|due)\s+(?:amount)?[\s:]*\$?([\d,]+\.?\d*)",
-        r"\$?([\d,]+\.?\d*)(?:\s*(?:total|amount|due))?",
-    ]
-    
-    DATE_PATTERNS = [
-        r"(?:invoice|bill)\s+(?:date|issued)[\s:]*(\d{1,2}/\d{1,2}/\d{2,4})",
-        r"(\d{1,2}/\d{1,2}/\d{2,4})",
-        r"(\d{4}-\d{2}-\d{2})",
-    ]
+    # Bump when extraction output changes in a way the rule fingerprint cannot see
+    # (e.g. a pdfplumber upgrade)
+    EXTRACTOR_VERSION = "1"
     
-    VENDOR_PATTERNS = [
-        r"(?:from|bill\s+from|vendor|supplier)[\s:]*\n?([A-Z][A-Za-z\s&.,']+)",
-    ]
+    def __init__(self):
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._executor_lock = threading.RLock()
+        # Tasks submitted to each pool and not finished yet, the ones given up
+        # on after a timeout, and pools waiting for their healthy tasks to drain
+        self._in_flight: Dict[ProcessPoolExecutor, Set[Future]] = {}
+        self._abandoned: Set[Future] = set()
+        self._retiring: Set[ProcessPoolExecutor] = set()
+        self._extractor_version: Optional[str] = None
+        # Header fields come from one precompiled single-pass scanner
+        self.scanner = (
+            FieldScanner.from_file(settings.EXTRACTION_RULES_FILE)
+            if settings.EXTRACTION_RULES_FILE else FieldScanner()
+        )
     
     def extract_from_pdf(self, file_path: str) -> Dict[str, Any]:
         """Extract data from PDF invoice"""
+        if settings.PDF_EXTRACTION_MODE == "full":
+            return self._extract_pdf_full(file_path)
+        try:
+            started = time.perf_counter()
+            pages: List[Dict[str, Any]] = []
+            with pdfplumber.open(file_path) as pdf:
+                page_count = len(pdf.pages)
+                for chunk in self._page_chunks(page_count):
+                    pages.extend(self._scan_pages([pdf.pages[n - 1] for n in chunk]))
+                    if self._header_resolved(pages):
+                        break
+            return self._assemble_pdf(file_path, pages, page_count, started)
+        except Exception as e:
+            logger.error(f"Error extracting data from PDF {file_path}: {str(e)}")
+            raise
+    
+    def _extract_pdf_full(self, file_path: str) -> Dict[str, Any]:
+        """Extract data from every page of a PDF invoice in one pass"""
+        started = time.perf_counter()
         try:
             extracted_data = {
                 "invoice_number": None,
@@ -63,12 +98,125 @@ class InvoiceExtractionService:
                 # Extract fields using regex patterns
                 self._extract_fields(full_text, extracted_data)
                 
+                PDF_PAGES.labels("scanned").inc(len(pdf.pages))
                 logger.info(f"Successfully extracted data from PDF: {file_path}")
                 
         except Exception as e:
             logger.error(f"Error extracting data from PDF {file_path}: {str(e)}")
             raise
         
+        PDF_EXTRACTION_SECONDS.labels("full").observe(time.perf_counter() - started)
+        return extracted_data
+    
+    def count_pdf_pages(self, file_path: str) -> int:
+        with pdfplumber.open(file_path) as pdf:
+            return len(pdf.pages)
+    
+    def extract_pdf_pages(self, file_path: str, page_numbers: List[int]) -> List[Dict[str, Any]]:
+        """
+        Text (and, on line-item pages, tables) for the given 1-based pages
+        Only these pages are loaded, so a pool worker's memory stays bounded
+        by the chunk size.
+        """
+        with pdfplumber.open(file_path, pages=page_numbers) as pdf:
+            return self._scan_pages(pdf.pages)
+    
+    def _scan_pages(self, pages: list) -> List[Dict[str, Any]]:
+        """Per-page text, line items and timings; each page's cache is released when done"""
+        results = []
+        for page in pages:
+            started = time.perf_counter()
+            text = page.extract_text() or ""
+            text_done = time.perf_counter()
+            line_items = []
+            has_tables = self._looks_like_line_items(text)
+            if has_tables:
+                tables = page.extract_tables()
+                if tables:
+                    line_items = self._extract_line_items(tables)
+            finished = time.perf_counter()
+            _release_page(page)
+            results.append({
+                "page": page.page_number,
+                "text": text,
+                "line_items": line_items,
+                "tables": has_tables,
+                "text_ms": round((text_done - started) * 1000, 2),
+                "tables_ms": round((finished - text_done) * 1000, 2)
+            })
+        return results
+    
+    def _page_chunks(self, page_count: int) -> List[List[int]]:
+        """
+        Page numbers in PDF_PAGE_CHUNK_SIZE chunks, ordered first chunk, last
+        chunk, then the middle: headers sit up front and totals at the end, so
+        early stopping usually needs only the first two
+        """
+        size = max(1, settings.PDF_PAGE_CHUNK_SIZE)
+        chunks = [list(range(start, min(start + size, page_count + 1)))
+                  for start in range(1, page_count + 1, size)]
+        if len(chunks) > 2:
+            chunks = [chunks[0], chunks[-1]] + chunks[1:-1]
+        return chunks
+    
+    def _looks_like_line_items(self, text: str) -> bool:
+        """Cheap text test deciding whether a page is worth extract_tables()"""
+        if _LINE_ITEM_HEADING_RE.search(text):
+            return True
+        return len(_AMOUNT_LINE_RE.findall(text)) >= 3
+    
+    def _header_resolved(self, pages: List[Dict[str, Any]]) -> bool:
+        """True once every PDF_REQUIRED_FIELDS field has a confident candidate"""
+        if not settings.PDF_STOP_WHEN_RESOLVED or not settings.PDF_REQUIRED_FIELDS:
+            return False
+        text = "\n".join(p["text"] for p in sorted(pages, key=lambda p: p["page"]))
+        best = self.scanner.extract(text)
+        return all(
+            field in best and best[field].confidence >= settings.PDF_STOP_CONFIDENCE
+            for field in settings.PDF_REQUIRED_FIELDS
+        )
+    
+    def _assemble_pdf(
+        self,
+        file_path: str,
+        pages: List[Dict[str, Any]],
+        page_count: int,
+        started: float
+    ) -> Dict[str, Any]:
+        """Merge per-page results (in page order) into the extracted data dict"""
+        pages = sorted(pages, key=lambda p: p["page"])
+        full_text = "\n".join(p["text"] for p in pages)
+        extracted_data = {
+            "invoice_number": None,
+            "vendor_name": None,
+            "invoice_amount": None,
+            "invoice_date": None,
+            "po_reference": None,
+            "invoice_type": "Standard",
+            "line_items": [item for p in pages for item in p["line_items"]],
+            "raw_text": full_text
+        }
+        self._extract_fields(full_text, extracted_data)
+        
+        elapsed = time.perf_counter() - started
+        elapsed_ms = round(elapsed * 1000, 2)
+        PDF_EXTRACTION_SECONDS.labels("lazy").observe(elapsed)
+        PDF_PAGES.labels("scanned").inc(len(pages))
+        PDF_PAGES.labels("skipped").inc(page_count - len(pages))
+        timings = [{k: v for k, v in p.items() if k not in ("text", "line_items")} for p in pages]
+        extracted_data["extraction_stats"] = {
+            "mode": "lazy",
+            "page_count": page_count,
+            "pages_scanned": len(pages),
+            "stopped_early": len(pages) < page_count,
+            "elapsed_ms": elapsed_ms,
+            "pages": timings
+        }
+        slowest = max(timings, key=lambda t: t["text_ms"] + t["tables_ms"], default=None)
+        logger.info(
+            f"Extracted PDF {file_path}: {len(pages)}/{page_count} pages in {elapsed_ms}ms"
+            + (f", slowest page {slowest['page']} ({slowest['text_ms'] + slowest['tables_ms']:.0f}ms)" if slowest else "")
+        )
         return extracted_data
     
     def extract_from_text(self, text: str) -> Dict[str, Any]:
@@ -91,44 +239,11 @@ class InvoiceExtractionService:
     
     def _extract_fields(self, text: str, data: Dict[str, Any]):
         """Extract structured fields from text"""
-        text_lower = text.lower()
-        
-        # Extract invoice number
-        for pattern in self.INVOICE_NUMBER_PATTERNS:
-            match = re.search(pattern, text, re.IGNORECASE)
-            if match:
-                data["invoice_number"] = match.group(1).strip()
-                break
-        
-        # Extract amount
-        for pattern in self.AMOUNT_PATTERNS:
-            match = re.search(pattern, text, re.IGNORECASE)
-            if match:
-                try:
-                    amount_str = match.group(1).replace(",", "")
-                    data["invoice_amount"] = float(amount_str)
-                    break
-                except ValueError:
-                    continue
-        
-        # Extract date
-        for pattern in self.DATE_PATTERNS:
-            match = re.search(pattern, text)
-            if match:
-                data["invoice_date"] = match.group(1)
-                break
-        
-        # Extract vendor name
-        for pattern in self.VENDOR_PATTERNS:
-            match = re.search(pattern, text, re.IGNORECASE | re.MULTILINE)
-            if match:
-                data["vendor_name"] = match.group(1).strip()
-                break
-        
-        # Look for PO reference
-        po_match = re.search(r"(?:p\.?o\.?|purchase\s+order)\s*[#:]*\s*([A-Z0-9\-]+)", text, re.IGNORECASE)
-        if po_match:
-            data["po_reference"] = po_match.group(1)
+        with FIELD_EXTRACTION_SECONDS.time():
+            best = self.scanner.extract(text)
+        for field, candidate in best.items():
+            data[field] = candidate.value
+        data["field_confidence"] = {field: c.confidence for field, c in best.items()}
     
     def _detect_invoice_type(self, text: str, data: Dict[str, Any]):
         """Detect invoice type (Standard, Credit Memo, Debit Memo)"""
@@ -168,5 +283,243 @@ class InvoiceExtractionService:
             return self.extract_from_text(text)
         else:
             raise ValueError(f"Unsupported file type: {file_ext}")
+    
+    def build_invoice(self, file_path: str, extracted_data: Dict[str, Any]) -> Invoice:
+        """Create (unsaved) Invoice record from extracted data"""
+        invoice_date = extracted_data.get("invoice_date")
+        # Parse date if it's a string
+        if isinstance(invoice_date, str):
+            try:
+                invoice_date = datetime.strptime(invoice_date, "%m/%d/%Y")
+            except ValueError:
+                invoice_date = None
+        
+        return Invoice(
+            invoice_number=extracted_data.get("invoice_number"),
+            vendor_name=extracted_data.get("vendor_name"),
+            invoice_date=invoice_date,
+            invoice_amount=extracted_data.get("invoice_amount"),
+            invoice_type=extracted_data.get("invoice_type"),
+            file_path=file_path,
+            # Real JSON so matching can json.loads it back
+            extracted_data=json.dumps(extracted_data, default=str)
+        )
+    
+    @property
+    def extractor_version(self) -> str:
+        """
+        EXTRACTOR_VERSION plus a fingerprint of the extraction rules, so cached
+        results are invalidated automatically whenever a pattern or rule changes
+        """
+        if self._extractor_version is None:
+            digest = hashlib.sha256(self.EXTRACTOR_VERSION.encode("utf-8"))
+            digest.update(self.scanner.signature.encode("utf-8"))
+            # PDF mode settings change what a PDF yields (e.g. early stopping)
+            digest.update(repr((
+                settings.PDF_EXTRACTION_MODE, settings.PDF_STOP_WHEN_RESOLVED,
+                settings.PDF_REQUIRED_FIELDS, settings.PDF_STOP_CONFIDENCE
+            )).encode("utf-8"))
+            for rule in (self.extract_from_pdf, self._extract_pdf_full, self.extract_pdf_pages,
+                         self._scan_pages, self._looks_like_line_items, self._assemble_pdf, self.extract_from_text,
+                         self._extract_fields, self._detect_invoice_type, self._extract_line_items,
+                         self.extract_from_file, FieldScanner):
+                try:
+                    digest.update(inspect.getsource(rule).encode("utf-8"))
+                except (OSError, TypeError):
+                    # No source available (e.g. frozen build): EXTRACTOR_VERSION alone decides
+                    pass
+            self._extractor_version = digest.hexdigest()[:16]
+        return self._extractor_version
+    
+    async def extract_from_file_async(self, file_path: str, file_hash: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Extract a document, reusing the cached result for identical bytes
+        file_hash is the SHA-256 of the file when the caller already knows it.
+        """
+        if not extraction_cache_service.enabled:
+            return await self._extract_in_pool(file_path)
+        
+        file_hash = file_hash or await asyncio.to_thread(file_sha256, file_path)
+        version = self.extractor_version
+        cached = await asyncio.to_thread(extraction_cache_service.get, file_hash, version)
+        if cached is not None:
+            logger.info(f"Extraction cache hit for {file_path}")
+            return cached
+        
+        extracted_data = await self._extract_in_pool(file_path)
+        await asyncio.to_thread(extraction_cache_service.set, file_hash, version, extracted_data)
+        return extracted_data
+    
+    async def _extract_in_pool(self, file_path: str) -> Dict[str, Any]:
+        """
+        Run extract_from_file in the extraction process pool
+        pdfplumber parsing is CPU-bound, so it runs outside the event loop and
+        outside the GIL; jobs exceeding EXTRACTION_TIMEOUT raise TimeoutError.
+        """
+        # Pool tasks this extraction submitted, so a timeout knows which are stuck
+        submitted: List[Future] = []
+        if settings.EXTRACTION_WORKERS <= 0:
+            # EXTRACTION_WORKERS=0: no process pool, fall back to a thread.
+            # to_thread carries the request's context, so its stage timings
+            # still reach the request trace
+            future = asyncio.to_thread(self.extract_from_file, file_path)
+        elif Path(file_path).suffix.lower() == ".pdf" and settings.PDF_EXTRACTION_MODE != "full":
+            future = self._extract_pdf_parallel(submitted, file_path)
+        else:
+            future = self._run_in_worker(submitted, _extract_in_worker, file_path)
+        try:
+            return await asyncio.wait_for(future, timeout=settings.EXTRACTION_TIMEOUT)
+        except asyncio.TimeoutError:
+            logger.error(f"Extraction timed out after {settings.EXTRACTION_TIMEOUT}s: {file_path}")
+            self._abandon(submitted)
+            raise TimeoutError(f"Extraction timed out after {settings.EXTRACTION_TIMEOUT}s")
+    
+    async def _extract_pdf_parallel(self, submitted: List[Future], file_path: str) -> Dict[str, Any]:
+        """
+        Spread a PDF's page chunks over the pool, one wave of EXTRACTION_WORKERS
+        chunks at a time, stopping after the wave that resolves the header
+        """
+        started = time.perf_counter()
+        page_count = await self._run_in_worker(submitted, _count_pages_in_worker, file_path)
+        chunks = self._page_chunks(page_count)
+        if len(chunks) == 1:
+            return await self._run_in_worker(submitted, _extract_in_worker, file_path)
+        
+        pages: List[Dict[str, Any]] = []
+        wave_size = max(1, settings.EXTRACTION_WORKERS)
+        for start in range(0, len(chunks), wave_size):
+            wave = chunks[start:start + wave_size]
+            results = await asyncio.gather(*(
+                self._run_in_worker(submitted, _extract_pages_in_worker, file_path, chunk)
+                for chunk in wave
+            ))
+            for chunk_pages in results:
+                pages.extend(chunk_pages)
+            if await asyncio.to_thread(self._header_resolved, pages):
+                break
+        return await asyncio.to_thread(self._assemble_pdf, file_path, pages, page_count, started)
+    
+    async def _run_in_worker(self, submitted: List[Future], fn, *args):
+        """Run fn in the pool and fold the worker's stage metrics into this process"""
+        with self._executor_lock:
+            executor = self._get_executor()
+            future = executor.submit(_with_metrics, fn, *args)
+            self._in_flight.setdefault(executor, set()).add(future)
+        future.add_done_callback(lambda done: self._task_done(executor, done))
+        submitted.append(future)
+        result, worker_metrics = await asyncio.wrap_future(future)
+        metrics.merge(worker_metrics)
+        return result
+    
+    def _task_done(self, executor: ProcessPoolExecutor, future: Future):
+        with self._executor_lock:
+            self._in_flight.get(executor, set()).discard(future)
+            self._abandoned.discard(future)
+    
+    def _get_executor(self) -> Optional[ProcessPoolExecutor]:
+        if settings.EXTRACTION_WORKERS <= 0:
+            return None
+        with self._executor_lock:
+            if self._executor is None:
+                # spawn, not fork: the server process holds threads and
+                # pooled DB sockets that must not be copied into workers
+                self._executor = ProcessPoolExecutor(
+                    max_workers=settings.EXTRACTION_WORKERS,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    max_tasks_per_child=settings.EXTRACTION_MAX_TASKS_PER_CHILD or None
+                )
+                logger.info(f"Started extraction pool with {settings.EXTRACTION_WORKERS} workers")
+            return self._executor
+    
+    def _abandon(self, submitted: List[Future]):
+        """
+        Give up on a timed-out extraction's tasks
+        Queued ones are cancelled. A running one keeps its worker busy until
+        that process is killed, and killing one worker breaks the whole pool,
+        so its pool is retired instead: new work goes to a fresh pool, and the
+        old one is terminated once every other task it holds has finished.
+        """
+        stuck = [future for future in submitted if not future.cancel() and not future.done()]
+        if not stuck:
+            return
+        with self._executor_lock:
+            self._abandoned.update(stuck)
+            for executor, futures in list(self._in_flight.items()):
+                if executor in self._retiring or not futures.intersection(stuck):
+                    continue
+                if self._executor is executor:
+                    self._executor = None
+                self._retiring.add(executor)
+                threading.Thread(
+                    target=self._retire_executor, args=(executor,), name="extraction-pool-reaper", daemon=True
+                ).start()
+    
+    def _retire_executor(self, executor: ProcessPoolExecutor):
+        """Wait out a retired pool's healthy tasks, then kill its stuck workers"""
+        while True:
+            with self._executor_lock:
+                healthy = [f for f in self._in_flight.get(executor, ()) if f not in self._abandoned]
+            if not healthy:
+                break
+            # Re-checked every second: another timeout may abandon one of these
+            wait(healthy, timeout=1.0)
+        for process in list(getattr(executor, "_processes", {}).values()):
+            process.terminate()
+        executor.shutdown(wait=False, cancel_futures=True)
+        with self._executor_lock:
+            self._retiring.discard(executor)
+            self._in_flight.pop(executor, None)
+        logger.info("Retired an extraction pool with a stuck worker")
+    
+    def _reset_executor(self):
+        with self._executor_lock:
+            executor, self._executor = self._executor, None
+        if executor is None:
+            return
+        executor.shutdown(wait=True, cancel_futures=True)
+    
+    def shutdown(self):
+        """Stop the extraction pool (called on application shutdown)"""
+        self._reset_executor()
+
+def load_extracted_data(value: Optional[str]) -> Dict[str, Any]:
+    """
+    Parse Invoice.extracted_data
+    Rows written before it was stored as JSON hold a Python dict repr instead;
+    those are read with ast.literal_eval (no code execution).
+    """
+    if not value:
+        return {}
+    try:
+        return json.loads(value)
+    except ValueError:
+        pass
+    try:
+        data = ast.literal_eval(value)
+    except (ValueError, SyntaxError) as e:
+        raise ValueError(f"Unreadable extracted data: {str(e)}")
+    if not isinstance(data, dict):
+        raise ValueError("Unreadable extracted data: not a mapping")
+    return data
+
+def _with_metrics(fn, *args):
+    """Process pool entry point: fn's result plus the metrics it recorded in the worker"""
+    return fn(*args), metrics.take_snapshot()
+
+def _extract_in_worker(file_path: str) -> Dict[str, Any]:
+    """Process pool entry point; uses the worker process's own service instance"""
+    return invoice_extraction_service.extract_from_file(file_path)
+
+def _count_pages_in_worker(file_path: str) -> int:
+    return invoice_extraction_service.count_pdf_pages(file_path)
+
+def _extract_pages_in_worker(file_path: str, page_numbers: List[int]) -> List[Dict[str, Any]]:
+    return invoice_extraction_service.extract_pdf_pages(file_path, page_numbers)
+
+def _release_page(page):
+    """Drop a pdfplumber page's cached layout objects"""
+    close = getattr(page, "close", None) or getattr(page, "flush_cache", None)
+    if close is not None:
+        close()
 
 invoice_extraction_service = InvoiceExtractionService()
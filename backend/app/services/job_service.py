@@ -0,0 +1,281 @@
+"""Durable background jobs for the upload -> extract -> match pipeline"""
+import asyncio
+import json
+import logging
+import os
+import socket
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+from sqlalchemy import update
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.config import settings
+from app.models.database import Invoice, InvoiceMatch, Job
+from app.models.session import SessionLocal
+from app.models.write_queue import add_rows, write_queue
+from app.services.ai_matching_service import ai_matching_service
+from app.services.invoice_extraction_service import invoice_extraction_service, load_extracted_data
+from app.services.po_candidate_index import po_candidate_index
+
+logger = logging.getLogger(__name__)
+
+# Failures a retry cannot fix: unsupported or unreadable files, a file gone from storage
+PERMANENT_ERRORS = (ValueError, FileNotFoundError)
+
+class JobService:
+    """Database-backed job queue worked by a pool of in-process async workers"""
+
+    def __init__(self):
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}"
+        self._tasks: List[asyncio.Task] = []
+        self._stopping: Optional[asyncio.Event] = None
+
+    async def enqueue(self, db: AsyncSession, file_path: str, filename: str) -> Job:
+        """Record a job for an uploaded file; workers pick it up from the table"""
+        job = Job(
+            stage="extract",
+            status="queued",
+            file_path=file_path,
+            filename=filename,
+            max_attempts=settings.JOB_MAX_ATTEMPTS,
+            next_run_at=datetime.utcnow()
+        )
+        await write_queue.write(db, add_rows, job)
+        return job
+
+    async def enqueue_many(self, db: AsyncSession, files: List[Tuple[str, str]]) -> List[Job]:
+        """Record one job per (file_path, filename) in a single transaction"""
+        now = datetime.utcnow()
+        jobs = [
+            Job(
+                stage="extract",
+                status="queued",
+                file_path=file_path,
+                filename=filename,
+                max_attempts=settings.JOB_MAX_ATTEMPTS,
+                next_run_at=now
+            )
+            for file_path, filename in files
+        ]
+        if jobs:
+            await write_queue.write(db, add_rows, *jobs)
+        return jobs
+
+    def to_dict(self, job: Job) -> Dict[str, Any]:
+        return {
+            "job_id": job.id,
+            "status": job.status,
+            "stage": job.stage,
+            "filename": job.filename,
+            "invoice_id": job.invoice_id,
+            "match_id": job.match_id,
+            "attempts": job.attempts,
+            "max_attempts": job.max_attempts,
+            "next_run_at": job.next_run_at,
+            "last_error": job.last_error,
+            "result": json.loads(job.result) if job.result else None,
+            "created_date": job.created_date,
+            "updated_date": job.updated_date
+        }
+
+    def start(self, worker_count: Optional[int] = None):
+        """Start the worker tasks on the running event loop"""
+        worker_count = settings.JOB_WORKERS if worker_count is None else worker_count
+        self._stopping = asyncio.Event()
+        self._tasks = [
+            asyncio.create_task(self._worker_loop(n), name=f"job-worker-{n}")
+            for n in range(worker_count)
+        ]
+        logger.info(f"Started {worker_count} job workers ({self.worker_id})")
+
+    async def stop(self):
+        """Stop the workers; a job interrupted mid-stage is retried after its lease expires"""
+        if self._stopping is None:
+            return
+        self._stopping.set()
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        logger.info("Job workers stopped")
+
+    async def _worker_loop(self, n: int):
+        while not self._stopping.is_set():
+            try:
+                job_id = None
+                now = datetime.utcnow()
+                # An idle poll is a plain read; the writer is only asked for a claim
+                due, expired = await asyncio.to_thread(self._poll, now)
+                if due or expired:
+                    job_id = await write_queue.run_async(self._claim_next, now, expired)
+            except Exception as e:
+                logger.error(f"Job worker {n} could not claim a job: {str(e)}")
+                job_id = None
+            if job_id is None:
+                try:
+                    await asyncio.wait_for(self._stopping.wait(), timeout=settings.JOB_POLL_INTERVAL)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            try:
+                await self._run(job_id)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # Never let one job take a worker down; its lease expiry retries it
+                logger.error(f"Job worker {n} could not run job {job_id}: {str(e) or type(e).__name__}")
+
+    def _poll(self, now: datetime) -> Tuple[bool, bool]:
+        """Whether a job is due, and whether a lease has expired, read without a write"""
+        with SessionLocal() as db:
+            due = db.query(Job.id).filter(Job.status == "queued", Job.next_run_at <= now).first()
+            expired = db.query(Job.id).filter(
+                Job.status == "running",
+                Job.locked_at < now - timedelta(seconds=settings.JOB_LEASE_SECONDS)
+            ).first()
+            return due is not None, expired is not None
+
+    def _claim_next(self, db, now: datetime, reclaim: bool = False) -> Optional[int]:
+        """Write fn atomically moving one due job from queued to running"""
+        if reclaim:
+            # Jobs left "running" by a dead worker go back on the queue
+            db.execute(
+                update(Job)
+                .where(Job.status == "running")
+                .where(Job.locked_at < now - timedelta(seconds=settings.JOB_LEASE_SECONDS))
+                .values(status="queued", locked_by=None, locked_at=None)
+            )
+
+        candidates = db.query(Job.id).filter(
+            Job.status == "queued",
+            Job.next_run_at <= now
+        ).order_by(Job.next_run_at, Job.id).limit(5).all()
+
+        for (job_id,) in candidates:
+            # Conditional update: only one worker (in any process) wins the row
+            claimed = db.execute(
+                update(Job)
+                .where(Job.id == job_id, Job.status == "queued")
+                .values(
+                    status="running",
+                    locked_by=self.worker_id,
+                    locked_at=now,
+                    attempts=Job.attempts + 1
+                )
+            ).rowcount
+            if claimed:
+                return job_id
+        return None
+
+    async def _run(self, job_id: int):
+        """Run the job's remaining stages, recording progress after each one"""
+        try:
+            loaded = await asyncio.to_thread(self._load_job, job_id)
+            if loaded is None:
+                logger.warning(f"Job {job_id} no longer exists")
+                return
+            stage, file_path = loaded
+            if stage == "extract":
+                await self._run_extract(job_id, file_path)
+                stage = "match"
+            if stage == "match":
+                await self._run_match(job_id)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            error = str(e) or type(e).__name__
+            retryable = not isinstance(e, PERMANENT_ERRORS)
+            logger.error(f"Job {job_id} failed{'' if retryable else ' permanently'}: {error}")
+            try:
+                await write_queue.run_async(self._record_failure, job_id, error, retryable)
+            except Exception as record_error:
+                logger.error(f"Job {job_id}: could not record failure: {str(record_error)}")
+
+    def _load_job(self, job_id: int) -> Optional[Tuple[str, str]]:
+        with SessionLocal() as db:
+            job = db.get(Job, job_id)
+            return (job.stage, job.file_path) if job else None
+
+    async def _run_extract(self, job_id: int, file_path: str):
+        extracted_data = await invoice_extraction_service.extract_from_file_async(file_path)
+
+        def save(db):
+            job = db.get(Job, job_id)
+            invoice = invoice_extraction_service.build_invoice(file_path, extracted_data)
+            db.add(invoice)
+            db.flush()
+            job.invoice_id = invoice.id
+            job.stage = "match"
+            return invoice.id
+
+        invoice_id = await write_queue.run_async(save)
+        logger.info(f"Job {job_id}: extracted invoice {invoice_id}")
+
+    async def _run_match(self, job_id: int):
+        def load():
+            with SessionLocal() as db:
+                job = db.get(Job, job_id)
+                invoice = db.get(Invoice, job.invoice_id)
+                po_candidate_index.ensure_built(db)
+                return invoice.id, invoice.invoice_amount, load_extracted_data(invoice.extracted_data)
+
+        invoice_id, invoice_amount, invoice_data = await asyncio.to_thread(load)
+        pos_data = po_candidate_index.candidates(invoice_data)
+        best_po, match_score, reasoning = None, 0.0, "No suitable purchase order found"
+        if pos_data:
+            best_po, match_score, reasoning = await ai_matching_service.find_best_match_async(
+                invoice_data, pos_data
+            )
+
+        def save(db):
+            job = db.get(Job, job_id)
+            result = {"invoice_id": invoice_id, "match_found": bool(best_po)}
+            if best_po:
+                match = InvoiceMatch(
+                    invoice_id=invoice_id,
+                    po_id=best_po.get("po_id"),
+                    match_score=match_score,
+                    matched_amount=invoice_amount,
+                    match_type="AI",
+                    ai_reasoning=reasoning
+                )
+                db.add(match)
+                db.flush()
+                job.match_id = match.id
+                result.update({
+                    "match_id": match.id,
+                    "po_number": best_po.get("po_number"),
+                    "match_score": match_score,
+                    "reasoning": reasoning,
+                    "requires_approval": match_score < 0.8
+                })
+            else:
+                result["message"] = reasoning
+            job.stage = "done"
+            job.status = "succeeded"
+            job.result = json.dumps(result)
+            job.last_error = None
+            job.locked_by = None
+            job.locked_at = None
+
+        await write_queue.run_async(save)
+        logger.info(f"Job {job_id}: finished (match found: {bool(best_po)})")
+
+    def _record_failure(self, db, job_id: int, error: str, retryable: bool = True):
+        """Write fn scheduling a retry with exponential backoff, or failing the job for good"""
+        job = db.get(Job, job_id)
+        if job is None:
+            return
+        job.last_error = error
+        job.locked_by = None
+        job.locked_at = None
+        if not retryable or job.attempts >= job.max_attempts:
+            job.status = "failed"
+        else:
+            delay = min(
+                settings.JOB_RETRY_BASE_SECONDS * (2 ** (job.attempts - 1)),
+                settings.JOB_RETRY_MAX_SECONDS
+            )
+            job.status = "queued"
+            job.next_run_at = datetime.utcnow() + timedelta(seconds=delay)
+
+job_service = JobService()
@@ -0,0 +1,129 @@
+"""Two-level cache for LLM responses: in-process LRU over a database table"""
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Dict, Optional, Tuple
+from sqlalchemy import delete
+from app.config import settings
+from app.models.database import LLMCacheEntry
+from app.models.session import SessionLocal
+from app.models.write_queue import write_queue
+
+logger = logging.getLogger(__name__)
+
+class LLMCacheService:
+    """Cache chat completion responses keyed by a hash of model and prompt context"""
+
+    def __init__(
+        self,
+        max_entries: Optional[int] = None,
+        ttl_seconds: Optional[int] = None,
+        enabled: Optional[bool] = None
+    ):
+        self.max_entries = max_entries or settings.LLM_CACHE_MAX_ENTRIES
+        self.ttl = timedelta(seconds=ttl_seconds or settings.LLM_CACHE_TTL_SECONDS)
+        self.enabled = settings.LLM_CACHE_ENABLED if enabled is None else enabled
+        self._lru: "OrderedDict[str, Tuple[str, datetime]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._counters = {"hits": 0, "memory_hits": 0, "misses": 0, "stores": 0, "invalidations": 0}
+
+    @staticmethod
+    def make_key(*parts: str) -> str:
+        """Stable SHA-256 over the parts that determine the model's answer"""
+        digest = hashlib.sha256()
+        for part in parts:
+            digest.update((part or "").encode("utf-8"))
+            digest.update(b"\x1f")
+        return digest.hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        """Return the cached response text, or None on a miss or expired entry"""
+        if not self.enabled:
+            return None
+        now = datetime.utcnow()
+
+        with self._lock:
+            entry = self._lru.get(key)
+            if entry is not None:
+                value, expires_at = entry
+                if expires_at > now:
+                    self._lru.move_to_end(key)
+                    self._counters["hits"] += 1
+                    self._counters["memory_hits"] += 1
+                    return value
+                del self._lru[key]
+
+        value, expires_at = self._load(key, now)
+        with self._lock:
+            if value is None:
+                self._counters["misses"] += 1
+                return None
+            self._counters["hits"] += 1
+            self._remember(key, value, expires_at)
+        return value
+
+    def set(self, key: str, kind: str, model: str, value: str):
+        """Store a response in both layers"""
+        if not self.enabled:
+            return
+        now = datetime.utcnow()
+        expires_at = now + self.ttl
+        with self._lock:
+            self._remember(key, value, expires_at)
+            self._counters["stores"] += 1
+        try:
+            write_queue.run(lambda db: db.merge(LLMCacheEntry(
+                cache_key=key,
+                kind=kind,
+                model=model,
+                response=value,
+                created_date=now,
+                expires_at=expires_at
+            )))
+        except Exception as e:
+            logger.warning(f"Could not persist LLM cache entry: {str(e)}")
+
+    def invalidate(self, kind: Optional[str] = None):
+        """Drop cached responses (all, or one kind); called when the PO set changes"""
+        with self._lock:
+            self._lru.clear()
+            self._counters["invalidations"] += 1
+        stmt = delete(LLMCacheEntry)
+        if kind:
+            stmt = stmt.where(LLMCacheEntry.kind == kind)
+        try:
+            write_queue.run(lambda db: db.execute(stmt))
+        except Exception as e:
+            logger.warning(f"Could not clear persistent LLM cache: {str(e)}")
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self._counters, entries=len(self._lru))
+
+    def _remember(self, key: str, value: str, expires_at: datetime):
+        """Insert into the LRU layer, evicting the least recently used entries (lock held)"""
+        self._lru[key] = (value, expires_at)
+        self._lru.move_to_end(key)
+        while len(self._lru) > self.max_entries:
+            self._lru.popitem(last=False)
+
+    def _load(self, key: str, now: datetime) -> Tuple[Optional[str], Optional[datetime]]:
+        try:
+            with SessionLocal() as db:
+                entry = db.get(LLMCacheEntry, key)
+                if entry is None:
+                    return None, None
+                if entry.expires_at <= now:
+                    # Not waited on: a miss needs no commit
+                    write_queue.submit(lambda db: db.execute(
+                        delete(LLMCacheEntry).where(LLMCacheEntry.cache_key == key, LLMCacheEntry.expires_at <= now)
+                    ))
+                    return None, None
+                return entry.response, entry.expires_at
+        except Exception as e:
+            logger.warning(f"Could not read persistent LLM cache: {str(e)}")
+            return None, None
+
+llm_cache_service = LLMCacheService()
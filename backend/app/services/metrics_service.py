@@ -0,0 +1,296 @@
+"""In-process counters, gauges and latency histograms in Prometheus text format"""
+import bisect
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+from app.config import settings
+from app.services.profiling_service import record_stage
+
+# Seconds; covers sub-millisecond regex work up to multi-minute syncs
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+                   1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+
+LabelValues = Tuple[str, ...]
+
+def _format_labels(names: Sequence[str], values: LabelValues, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) and not value.is_integer() else str(int(value))
+
+class _Timer:
+    """Context manager observing the elapsed time into a histogram"""
+    __slots__ = ("_histogram", "_labels", "_started")
+
+    def __init__(self, histogram: "Histogram", labels: LabelValues):
+        self._histogram = histogram
+        self._labels = labels
+
+    def __enter__(self):
+        self._started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self._histogram._observe(self._labels, time.perf_counter() - self._started)
+        return False
+
+class _Child:
+    """A metric bound to one set of label values"""
+    __slots__ = ("_metric", "_labels")
+
+    def __init__(self, metric, labels: LabelValues):
+        self._metric = metric
+        self._labels = labels
+
+    def inc(self, amount: float = 1.0):
+        self._metric._inc(self._labels, amount)
+
+    def observe(self, value: float):
+        self._metric._observe(self._labels, value)
+
+    def time(self) -> _Timer:
+        return _Timer(self._metric, self._labels)
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, registry: "MetricsRegistry", name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.registry = registry
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[LabelValues, float] = {}
+
+    def labels(self, *values: str) -> _Child:
+        return _Child(self, tuple(str(v) for v in values))
+
+    def inc(self, amount: float = 1.0):
+        self._inc((), amount)
+
+    def _inc(self, labels: LabelValues, amount: float):
+        if not self.registry.enabled:
+            return
+        with self.registry._lock:
+            self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def snapshot(self) -> Dict[LabelValues, float]:
+        return dict(self._values)
+
+    def merge(self, values: Dict[LabelValues, float]):
+        with self.registry._lock:
+            for labels, amount in values.items():
+                self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def render(self) -> List[str]:
+        return [f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}"
+                for labels, value in sorted(self._values.items())]
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(
+        self,
+        registry: "MetricsRegistry",
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS
+    ):
+        self.registry = registry
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # Latency histograms also feed the per-request stage breakdown
+        stage = name[len(registry.prefix):]
+        self.stage = stage[:-len("_seconds")] if stage.endswith("_seconds") else None
+        # Per label set: [bucket counts..., +Inf count], sum
+        self._values: Dict[LabelValues, Tuple[List[int], List[float]]] = {}
+
+    def labels(self, *values: str) -> _Child:
+        return _Child(self, tuple(str(v) for v in values))
+
+    def observe(self, value: float):
+        self._observe((), value)
+
+    def time(self) -> _Timer:
+        return _Timer(self, ())
+
+    def _observe(self, labels: LabelValues, value: float):
+        if self.stage:
+            record_stage(self.stage, value, labels)
+        if not self.registry.enabled:
+            return
+        # Non-cumulative slot; render() accumulates
+        slot = bisect.bisect_left(self.buckets, value)
+        with self.registry._lock:
+            entry = self._values.get(labels)
+            if entry is None:
+                entry = self._values[labels] = ([0] * (len(self.buckets) + 1), [0.0])
+            entry[0][slot] += 1
+            entry[1][0] += value
+
+    def snapshot(self) -> Dict[LabelValues, Tuple[List[int], float]]:
+        return {labels: (list(counts), total[0]) for labels, (counts, total) in self._values.items()}
+
+    def merge(self, values: Dict[LabelValues, Tuple[List[int], float]]):
+        with self.registry._lock:
+            for labels, (counts, total) in values.items():
+                entry = self._values.get(labels)
+                if entry is None:
+                    entry = self._values[labels] = ([0] * (len(self.buckets) + 1), [0.0])
+                for i, count in enumerate(counts):
+                    entry[0][i] += count
+                entry[1][0] += total
+                if self.stage:
+                    record_stage(self.stage, total, labels, sum(counts))
+
+    def render(self) -> List[str]:
+        lines = []
+        for labels, (counts, total) in sorted(self._values.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = 'le="' + _format_value(bound) + '"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, labels, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, labels)} {_format_value(total[0])}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, labels)} {cumulative}")
+        return lines
+
+class Gauge:
+    """A value read from a callback at scrape time"""
+    kind = "gauge"
+
+    def __init__(self, registry: "MetricsRegistry", name: str, documentation: str, callback: Callable[[], float]):
+        self.registry = registry
+        self.name = name
+        self.documentation = documentation
+        self.callback = callback
+
+    def render(self) -> List[str]:
+        return [f"{self.name} {_format_value(self.callback())}"]
+
+class MetricsRegistry:
+    """
+    Holds every metric of this process; one lock guards all updates, which
+    are a dict lookup and an increment, so instrumentation can stay on in
+    production. Metrics are per process: scrape each API worker.
+    """
+
+    def __init__(self, enabled: bool = True, prefix: str = "invoice_matching_"):
+        self.enabled = enabled
+        self.prefix = prefix
+        self._lock = threading.Lock()
+        self._metrics: Dict[str, object] = {}
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(self, self.prefix + name, documentation, labelnames))
+
+    def histogram(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS
+    ) -> Histogram:
+        return self._register(Histogram(self, self.prefix + name, documentation, labelnames, buckets))
+
+    def gauge(self, name: str, documentation: str, callback: Callable[[], float]) -> Gauge:
+        return self._register(Gauge(self, self.prefix + name, documentation, callback))
+
+    def _register(self, metric):
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric {metric.name} is already registered")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def take_snapshot(self) -> Dict[str, object]:
+        """
+        Counter and histogram values recorded since the last call, then reset
+        Extraction workers hand these to the parent process with each result.
+        """
+        with self._lock:
+            values = {name: metric.snapshot() for name, metric in self._metrics.items()
+                      if not isinstance(metric, Gauge) and metric._values}
+            for name in values:
+                self._metrics[name]._values = {}
+        return values
+
+    def merge(self, values: Optional[Dict[str, object]]):
+        """Add a worker process's take_snapshot() into this registry"""
+        for name, metric_values in (values or {}).items():
+            metric = self._metrics.get(name)
+            if metric is not None:
+                metric.merge(metric_values)
+
+    def render(self) -> str:
+        lines = []
+        for name, metric in self._metrics.items():
+            try:
+                samples = metric.render()
+            except Exception as e:
+                lines.append(f"# {name} unavailable: {str(e)}")
+                continue
+            lines.append(f"# HELP {name} {metric.documentation}")
+            lines.append(f"# TYPE {name} {metric.kind}")
+            lines.extend(samples)
+        return "\n".join(lines) + "\n"
+
+metrics = MetricsRegistry(enabled=settings.METRICS_ENABLED)
+
+# Per-stage instruments, shared by the services that record them
+UPLOAD_WRITE_SECONDS = metrics.histogram("upload_write_seconds", "Time to stream an upload to storage")
+UPLOAD_BYTES = metrics.counter("upload_bytes_total", "Bytes written to upload storage")
+PDF_EXTRACTION_SECONDS = metrics.histogram(
+    "pdf_extraction_seconds", "Time to extract a PDF invoice", ["mode"]
+)
+PDF_PAGES = metrics.counter("pdf_pages_total", "PDF pages seen by extraction", ["result"])
+FIELD_EXTRACTION_SECONDS = metrics.histogram(
+    "field_extraction_seconds", "Time to scan text for header fields"
+)
+DB_QUERY_SECONDS = metrics.histogram("db_query_seconds", "Database statement time", ["statement"])
+DB_WRITE_QUEUE_SECONDS = metrics.histogram(
+    "db_write_queue_seconds", "Time from queueing a SQLite write to its batch committing"
+)
+DB_WRITE_BATCH_SIZE = metrics.histogram(
+    "db_write_batch_size", "Writes committed per SQLite write batch", buckets=(1, 2, 4, 8, 16, 32, 64, 128, 256)
+)
+EPICOR_FETCH_SECONDS = metrics.histogram("epicor_baq_fetch_seconds", "Time to fetch one BAQ page")
+EPICOR_MAP_SECONDS = metrics.histogram("epicor_baq_map_seconds", "Time to map one BAQ page to PO dicts")
+EPICOR_ROWS = metrics.counter("epicor_baq_rows_total", "BAQ rows received")
+EPICOR_ERRORS = metrics.counter("epicor_baq_errors_total", "Failed BAQ requests")
+LLM_REQUEST_SECONDS = metrics.histogram(
+    "llm_request_seconds", "Chat completion latency", ["kind", "outcome"]
+)
+LLM_TOKENS = metrics.counter("llm_tokens_total", "Tokens reported by the model API", ["kind", "type"])
+LLM_CACHE_LOOKUPS = metrics.counter("llm_cache_lookups_total", "LLM cache lookups", ["kind", "result"])
+FUZZY_MATCH_SECONDS = metrics.histogram("fuzzy_match_seconds", "Fuzzy match time per invoice", ["engine"])
+MATCH_FALLBACKS = metrics.counter("match_fallback_total", "AI matches that fell back to fuzzy matching")
+PO_SYNC_SECONDS = metrics.histogram("po_sync_seconds", "Time for one PO sync run, including the BAQ stream")
+PO_SYNC_ROWS = metrics.counter("po_sync_rows_total", "PO lines processed by sync", ["result"])
+
+def instrument_engine(engine):
+    """Time every statement on a SQLAlchemy engine, labelled by its verb"""
+    from sqlalchemy import event
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        if context is not None:
+            context._metrics_started = time.perf_counter()
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        started = getattr(context, "_metrics_started", None)
+        if started is not None:
+            verb = statement.lstrip()[:6].upper()
+            DB_QUERY_SECONDS.labels(verb if verb in _VERBS else "OTHER").observe(time.perf_counter() - started)
+
+_VERBS = {"SELECT", "INSERT", "UPDATE", "DELETE"}
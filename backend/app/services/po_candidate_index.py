@@ -0,0 +1,319 @@
+"""In-memory blocking index that narrows open POs to plausible match candidates"""
+import asyncio
+import heapq
+import logging
+import math
+import os
+import re
+import threading
+from collections import defaultdict
+from typing import Any, Dict, List, Optional, Sequence, Set, Union
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from app.config import settings
+from app.models.database import PurchaseOrder, SyncState
+from app.models.session import SessionLocal
+from app.services.po_snapshot import MappedPOSnapshot, POSnapshotStore
+from app.services.po_sync_service import WATERMARK_NAME
+
+logger = logging.getLogger(__name__)
+
+# Legal suffixes dropped when normalizing vendor names
+VENDOR_STOPWORDS = {
+    "inc", "incorporated", "corp", "corporation", "co", "company", "llc",
+    "ltd", "limited", "plc", "gmbh", "the", "and", "of",
+}
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+_DIGITS_RE = re.compile(r"\d+")
+
+# Signal weights mirror AIMatchingService.fuzzy_match so candidates rank the same way
+WEIGHT_PO_REFERENCE = 0.4
+WEIGHT_VENDOR_EXACT = 0.3
+WEIGHT_VENDOR_TOKEN = 0.15
+WEIGHT_AMOUNT = 0.3
+
+def normalize_vendor(name: Optional[str]) -> str:
+    """Lowercase, strip punctuation and legal suffixes ("ACME Corp." -> "acme")"""
+    tokens = [t for t in _TOKEN_RE.findall((name or "").lower()) if t not in VENDOR_STOPWORDS]
+    return " ".join(tokens)
+
+# Postings tables of a snapshot, in and out of memory. purchase_orders stores no
+# part numbers, so there is no part key to block on
+POSTINGS = ("by_vendor", "by_vendor_token", "by_po_token", "by_amount")
+
+def po_tokens(value: Any) -> Set[str]:
+    """Normalized PO number and its digits alone ("PO-2024-1001" -> {"po20241001", "20241001"})"""
+    text = str(value or "").lower()
+    tokens = {"".join(_TOKEN_RE.findall(text)), "".join(_DIGITS_RE.findall(text)).lstrip("0")}
+    tokens.discard("")
+    return tokens
+
+def amount_bucket(amount: Any, bucket_log: float) -> Optional[int]:
+    """Log-scale bucket so neighbouring buckets cover a fixed relative tolerance"""
+    try:
+        amount = abs(float(amount))
+    except (TypeError, ValueError):
+        return None
+    if amount <= 0:
+        return None
+    return int(math.floor(math.log(amount) / bucket_log))
+
+class _Snapshot:
+    """Immutable set of postings lists, swapped in whole on rebuild"""
+
+    def __init__(self, pos: List[Dict[str, Any]], bucket_ratio: float):
+        self.pos = pos
+        self.bucket_log = math.log1p(bucket_ratio)
+        self.by_vendor: Dict[str, List[int]] = defaultdict(list)
+        self.by_vendor_token: Dict[str, List[int]] = defaultdict(list)
+        self.by_po_token: Dict[str, List[int]] = defaultdict(list)
+        self.by_amount: Dict[int, List[int]] = defaultdict(list)
+
+        for i, po in enumerate(pos):
+            vendor = normalize_vendor(po.get("vendor_name"))
+            if vendor:
+                self.by_vendor[vendor].append(i)
+                for token in set(vendor.split()):
+                    self.by_vendor_token[token].append(i)
+            for token in po_tokens(po.get("po_number")):
+                self.by_po_token[token].append(i)
+            bucket = amount_bucket(po.get("line_amount"), self.bucket_log)
+            if bucket is not None:
+                self.by_amount[bucket].append(i)
+
+    def __len__(self) -> int:
+        return len(self.pos)
+
+    def postings(self, index: str, key: Any) -> Sequence[int]:
+        return getattr(self, index).get(key, ())
+
+    def line_amounts(self, rows: Sequence[int]) -> List[Any]:
+        return [self.pos[i].get("line_amount") for i in rows]
+
+    def select(self, rows: Sequence[int]) -> List[Dict[str, Any]]:
+        return [self.pos[i] for i in rows]
+
+class POCandidateIndex:
+    """Blocking index over open PO lines keyed by vendor, PO-number tokens and amount
+
+    With a snapshot store, a rebuild is published as a memory-mapped file
+    that every worker process attaches to, instead of each worker loading
+    and indexing the PO table itself. Workers check the store's pointer on
+    each lookup and swap to a newer version as soon as one is published.
+    """
+
+    def __init__(
+        self,
+        bucket_ratio: float = 0.05,
+        max_block_size: int = 2000,
+        store: Optional[POSnapshotStore] = None
+    ):
+        # Two buckets either side span the 10% "close amount" fuzzy tolerance
+        self.bucket_ratio = bucket_ratio
+        self.max_block_size = max_block_size
+        self.store = store
+        self._snapshot: Optional[Union[_Snapshot, MappedPOSnapshot]] = None
+        # Last published version looked at, attached or not
+        self._seen_path: Optional[str] = None
+        # Sync stamp of the database the current snapshot was built from
+        self._stamp: Optional[str] = None
+        self._lock = threading.Lock()
+
+    @property
+    def size(self) -> int:
+        snapshot = self._snapshot
+        return len(snapshot) if snapshot else 0
+
+    def rebuild(self, db: Session):
+        """Reload open PO lines from the database and atomically swap the index
+
+        With a snapshot store the result is published for every worker.
+        """
+        rows = db.query(
+            PurchaseOrder.id,
+            PurchaseOrder.po_number,
+            PurchaseOrder.po_line,
+            PurchaseOrder.vendor_id,
+            PurchaseOrder.vendor_name,
+            PurchaseOrder.line_amount,
+            PurchaseOrder.remaining_amount,
+            PurchaseOrder.line_description,
+        ).filter(PurchaseOrder.remaining_amount > 0).all()
+
+        pos = [
+            {
+                "po_id": r.id,
+                "po_number": r.po_number,
+                "po_line": r.po_line,
+                "vendor_id": r.vendor_id,
+                "vendor_name": r.vendor_name,
+                "line_amount": r.line_amount,
+                "remaining_amount": r.remaining_amount,
+                "line_description": r.line_description,
+            }
+            for r in rows
+        ]
+        stamp = self._sync_stamp(db)
+        if self.store is None:
+            self.build(pos)
+            self._stamp = stamp
+            return
+        snapshot = _Snapshot(pos, self.bucket_ratio)
+        self._stamp = stamp
+        try:
+            path = self.store.publish(pos, {name: getattr(snapshot, name) for name in POSTINGS}, {
+                "bucket_log": snapshot.bucket_log,
+                "database": _DATABASE_ID,
+                "stamp": stamp,
+            })
+            self._snapshot = MappedPOSnapshot(path)
+            self._seen_path = path
+        except Exception as e:
+            logger.warning(f"Could not publish PO snapshot, indexing in this worker only: {str(e)}")
+            self._snapshot = snapshot
+        logger.info(f"PO candidate index built over {len(pos)} open lines")
+
+    def build(self, pos: List[Dict[str, Any]]):
+        """Build this worker's index from PO dicts (same shape the matching service consumes)"""
+        snapshot = _Snapshot(pos, self.bucket_ratio)
+        self._snapshot = snapshot
+        logger.info(f"PO candidate index built over {len(pos)} open lines")
+
+    def invalidate(self):
+        """Drop the index so the next lookup reloads it"""
+        self._snapshot = None
+        self._seen_path = None
+        self._stamp = None
+
+    def ensure_built(self, db: Session):
+        if self._published_changed():
+            with self._lock:
+                if self._published_changed():
+                    self._follow(db)
+        elif self.store is None and self._snapshot is not None and self._sync_stamp(db) != self._stamp:
+            # No store to learn of a sync another worker ran from: rebuild on the stamp
+            with self._lock:
+                if self._sync_stamp(db) != self._stamp:
+                    self.rebuild(db)
+        if self._snapshot is None:
+            with self._lock:
+                if self._snapshot is None:
+                    self.rebuild(db)
+
+    async def ensure_built_async(self, db: AsyncSession):
+        """ensure_built for async routes: a cold build runs on a worker thread with its own session"""
+        stale = False
+        if self.store is None and self._snapshot is not None:
+            stale = _stamp(await db.get(SyncState, WATERMARK_NAME)) != self._stamp
+        if self._snapshot is None or stale or self._published_changed():
+            def build():
+                with SessionLocal() as db:
+                    self.ensure_built(db)
+            await asyncio.to_thread(build)
+
+    def _published_changed(self) -> bool:
+        return self.store is not None and self.store.current_path() not in (None, self._seen_path)
+
+    def _follow(self, db: Session):
+        """Attach the newest published snapshot if it is for this database's last sync"""
+        path = self.store.current_path()
+        self._seen_path = path
+        try:
+            snapshot = MappedPOSnapshot(path)
+        except Exception as e:
+            logger.warning(f"Could not attach PO snapshot {path}: {str(e)}")
+            return
+        if snapshot.meta.get("database") != _DATABASE_ID or snapshot.meta.get("stamp") != self._sync_stamp(db):
+            # Left over from another database, or from before a sync that changed
+            # nothing; a cold worker rebuilds and publishes a current one
+            return
+        self._snapshot = snapshot
+        self._stamp = snapshot.meta.get("stamp")
+        logger.info(f"Attached PO snapshot {os.path.basename(path)} ({len(snapshot)} open lines)")
+
+    def _sync_stamp(self, db: Session) -> Optional[str]:
+        return _stamp(db.get(SyncState, WATERMARK_NAME))
+
+    def candidates(
+        self,
+        invoice_data: Dict[str, Any],
+        limit: Optional[int] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Return up to `limit` open POs that share at least one blocking key with
+        the invoice, best first
+        """
+        snapshot = self._snapshot
+        if not snapshot:
+            return []
+        limit = limit or settings.MATCH_CANDIDATE_LIMIT
+
+        scores: Dict[int, float] = defaultdict(float)
+
+        # Selective keys first: PO reference, exact vendor, vendor tokens
+        for token in po_tokens(invoice_data.get("po_reference")):
+            for i in snapshot.postings("by_po_token", token):
+                scores[i] = max(scores[i], WEIGHT_PO_REFERENCE)
+
+        vendor = normalize_vendor(invoice_data.get("vendor_name"))
+        if vendor:
+            vendor_scores: Dict[int, float] = {}
+            for token in set(vendor.split()):
+                postings = snapshot.postings("by_vendor_token", token)
+                # Tokens shared by a large share of vendors ("supply") do not block
+                if len(postings) <= self.max_block_size:
+                    for i in postings:
+                        vendor_scores[i] = WEIGHT_VENDOR_TOKEN
+            for i in snapshot.postings("by_vendor", vendor):
+                vendor_scores[i] = WEIGHT_VENDOR_EXACT
+            for i, weight in vendor_scores.items():
+                scores[i] += weight
+
+        invoice_amount = self._amount(invoice_data.get("invoice_amount"))
+        if invoice_amount:
+            if scores:
+                # Refine the blocked set by amount closeness
+                rows = list(scores)
+                for i, po_amount in zip(rows, snapshot.line_amounts(rows)):
+                    scores[i] += self._amount_score(invoice_amount, po_amount)
+            else:
+                # Nothing else to go on: fall back to the amount buckets alone
+                bucket = amount_bucket(invoice_amount, snapshot.bucket_log)
+                for b in (bucket - 2, bucket - 1, bucket, bucket + 1, bucket + 2):
+                    rows = snapshot.postings("by_amount", b)
+                    for i, po_amount in zip(rows, snapshot.line_amounts(rows)):
+                        scores[i] = self._amount_score(invoice_amount, po_amount)
+
+        ranked = heapq.nlargest(limit, scores.items(), key=lambda item: item[1])
+        return snapshot.select([i for i, _ in ranked])
+
+    def _amount(self, value: Any) -> Optional[float]:
+        try:
+            return abs(float(value))
+        except (TypeError, ValueError):
+            return None
+
+    def _amount_score(self, invoice_amount: float, po_amount: Any) -> float:
+        """Same tolerance bands as fuzzy_match: 5% full weight, 10% half weight"""
+        po_amount = self._amount(po_amount)
+        if not po_amount:
+            return 0.0
+        diff = abs(invoice_amount - po_amount)
+        if diff <= po_amount * 0.05:
+            return WEIGHT_AMOUNT
+        if diff <= po_amount * 0.10:
+            return WEIGHT_AMOUNT / 2
+        return 0.0
+
+def _stamp(state: Optional[SyncState]) -> Optional[str]:
+    """When the last PO sync finished, which a snapshot is current as of"""
+    return state.last_synced.isoformat() if state and state.last_synced else None
+
+# Identifies the database a published snapshot was built from
+_DATABASE_ID = make_url(settings.DATABASE_URL).render_as_string(hide_password=True)
+
+po_candidate_index = POCandidateIndex(
+    store=POSnapshotStore(settings.PO_SNAPSHOT_DIR, settings.PO_SNAPSHOT_KEEP) if settings.PO_SNAPSHOT_ENABLED else None
+)
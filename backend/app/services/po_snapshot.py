@@ -0,0 +1,228 @@
+"""Versioned, memory-mapped columnar snapshots of the open-PO candidate index"""
+import hashlib
+import json
+import logging
+import mmap
+import os
+import struct
+import time
+from typing import Any, Dict, List, Mapping, Optional, Sequence
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"POSNAP1\n"
+POINTER_NAME = "CURRENT"
+
+# PO dict fields by storage type. Strings are one UTF-8 buffer per column with
+# row offsets and a null mask; missing numbers are a sentinel or NaN
+INT_COLUMNS = ("po_id", "po_line")
+FLOAT_COLUMNS = ("line_amount", "remaining_amount")
+STRING_COLUMNS = ("po_number", "vendor_id", "vendor_name", "line_description")
+# Key order of the dicts handed back, which the LLM prompt (and so its cache key) follows
+FIELDS = ("po_id", "po_number", "po_line", "vendor_id", "vendor_name", "line_amount", "remaining_amount",
+          "line_description")
+_NULL_INT = np.iinfo(np.int64).min
+_ALIGN = 8
+
+def key_hash(key: Any) -> int:
+    """64-bit hash a postings key is stored and looked up under"""
+    return int.from_bytes(hashlib.blake2b(str(key).encode("utf-8"), digest_size=8).digest(), "little")
+
+def _aligned(offset: int) -> int:
+    return (offset + _ALIGN - 1) // _ALIGN * _ALIGN
+
+def _columns(pos: Sequence[Dict[str, Any]]) -> Dict[str, np.ndarray]:
+    n = len(pos)
+    arrays: Dict[str, np.ndarray] = {}
+    for name in INT_COLUMNS:
+        arrays[name] = np.fromiter(
+            (_NULL_INT if po.get(name) is None else po[name] for po in pos), dtype=np.int64, count=n
+        )
+    for name in FLOAT_COLUMNS:
+        arrays[name] = np.fromiter(
+            (np.nan if po.get(name) is None else po[name] for po in pos), dtype=np.float64, count=n
+        )
+    for name in STRING_COLUMNS:
+        values = [po.get(name) for po in pos]
+        encoded = [b"" if value is None else str(value).encode("utf-8") for value in values]
+        arrays[f"{name}.offsets"] = np.cumsum([0] + [len(e) for e in encoded], dtype=np.int64)
+        arrays[f"{name}.data"] = np.frombuffer(b"".join(encoded), dtype=np.uint8)
+        arrays[f"{name}.null"] = np.fromiter((value is None for value in values), dtype=np.bool_, count=n)
+    return arrays
+
+def _postings(name: str, table: Mapping[Any, Sequence[int]]) -> Dict[str, np.ndarray]:
+    """Postings as hash-sorted keys, start offsets and one flat row array"""
+    by_hash: Dict[int, List[int]] = {}
+    for key, rows in table.items():
+        # A (vanishingly rare) collision merges two lists; candidates are re-scored anyway
+        by_hash.setdefault(key_hash(key), []).extend(rows)
+    hashes = sorted(by_hash)
+    lengths = [len(by_hash[h]) for h in hashes]
+    return {
+        f"{name}.hashes": np.array(hashes, dtype=np.uint64),
+        f"{name}.starts": np.cumsum([0] + lengths, dtype=np.int64),
+        f"{name}.rows": np.fromiter(
+            (row for h in hashes for row in by_hash[h]), dtype=np.uint32, count=sum(lengths)
+        ),
+    }
+
+def write_snapshot(
+    path: str,
+    pos: Sequence[Dict[str, Any]],
+    postings: Mapping[str, Mapping[Any, Sequence[int]]],
+    meta: Dict[str, Any]
+):
+    """Write PO columns and postings tables to path
+
+    Layout: magic, header length, JSON header, then each array 8-byte aligned
+    at the offset (from the end of the header) the header records.
+    """
+    arrays = _columns(pos)
+    for name, table in postings.items():
+        arrays.update(_postings(name, table))
+
+    layout, offset = {}, 0
+    for name, array in arrays.items():
+        layout[name] = [array.dtype.str, len(array), offset]
+        offset = _aligned(offset + array.nbytes)
+    header = json.dumps({**meta, "rows": len(pos), "postings": list(postings), "arrays": layout}).encode("utf-8")
+    base = _aligned(len(MAGIC) + 8 + len(header))
+
+    with open(path, "wb") as f:
+        f.write(MAGIC + struct.pack("<Q", len(header)) + header)
+        for name, array in arrays.items():
+            f.write(b"\x00" * (base + layout[name][2] - f.tell()))
+            f.write(array.tobytes())
+        f.write(b"\x00" * (base + offset - f.tell()))
+
+class MappedPOSnapshot:
+    """Read-only view of a snapshot file
+
+    Every array points straight into the mapping, so attaching costs no
+    parsing and all processes mapping the same file share its pages. Only
+    the candidates a lookup returns are turned into PO dicts.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._mmap[:len(MAGIC)] != MAGIC:
+            raise ValueError(f"Not a PO snapshot: {path}")
+        (length,) = struct.unpack_from("<Q", self._mmap, len(MAGIC))
+        start = len(MAGIC) + 8
+        self.meta = json.loads(self._mmap[start:start + length])
+        base = _aligned(start + length)
+        self._arrays: Dict[str, np.ndarray] = {}
+        self._data_start: Dict[str, int] = {}
+        for name, (dtype, count, offset) in self.meta["arrays"].items():
+            if base + offset + np.dtype(dtype).itemsize * count > len(self._mmap):
+                raise ValueError(f"Truncated PO snapshot: {path}")
+            self._arrays[name] = np.frombuffer(self._mmap, dtype=np.dtype(dtype), count=count, offset=base + offset)
+            self._data_start[name] = base + offset
+        self.rows = self.meta["rows"]
+        self.bucket_log = self.meta["bucket_log"]
+
+    def __len__(self) -> int:
+        return self.rows
+
+    def postings(self, index: str, key: Any) -> List[int]:
+        hashes = self._arrays[f"{index}.hashes"]
+        target = np.uint64(key_hash(key))
+        i = int(np.searchsorted(hashes, target))
+        if i == len(hashes) or hashes[i] != target:
+            return []
+        starts = self._arrays[f"{index}.starts"]
+        return self._arrays[f"{index}.rows"][starts[i]:starts[i + 1]].tolist()
+
+    def line_amounts(self, rows: Sequence[int]) -> List[Optional[float]]:
+        values = self._arrays["line_amount"][np.asarray(rows, dtype=np.int64)].tolist()
+        return [None if value != value else value for value in values]
+
+    def select(self, rows: Sequence[int]) -> List[Dict[str, Any]]:
+        """PO dicts for the given rows, in the shape the matching service consumes"""
+        index = np.asarray(rows, dtype=np.int64)
+        columns: Dict[str, List[Any]] = {}
+        for name in INT_COLUMNS:
+            columns[name] = [None if v == _NULL_INT else v for v in self._arrays[name][index].tolist()]
+        for name in FLOAT_COLUMNS:
+            columns[name] = [None if v != v else v for v in self._arrays[name][index].tolist()]
+        for name in STRING_COLUMNS:
+            offsets = self._arrays[f"{name}.offsets"]
+            data = self._data_start[f"{name}.data"]
+            columns[name] = [
+                None if null else self._mmap[data + start:data + end].decode("utf-8")
+                for start, end, null in zip(
+                    offsets[index].tolist(), offsets[index + 1].tolist(), self._arrays[f"{name}.null"][index].tolist()
+                )
+            ]
+        return [dict(zip(FIELDS, values)) for values in zip(*(columns[name] for name in FIELDS))]
+
+class POSnapshotStore:
+    """Directory of snapshot versions and a CURRENT pointer to the newest
+
+    A version is written under a temporary name and renamed into place, then
+    the pointer is replaced the same way, so readers only ever see complete
+    files. Old versions are unlinked; processes still mapping one keep it
+    until they move on.
+    """
+
+    def __init__(self, directory: str, keep: int = 3):
+        self.directory = directory
+        self.keep = max(1, keep)
+        self._pointer = os.path.join(directory, POINTER_NAME)
+        self._pointer_stat = None
+        self._current: Optional[str] = None
+
+    def publish(
+        self,
+        pos: Sequence[Dict[str, Any]],
+        postings: Mapping[str, Mapping[Any, Sequence[int]]],
+        meta: Dict[str, Any]
+    ) -> str:
+        """Write a new version, point CURRENT at it and return its path"""
+        os.makedirs(self.directory, exist_ok=True)
+        version = time.time_ns()
+        name = f"po-{version:020d}.snap"
+        path = os.path.join(self.directory, name)
+        temporary = f"{path}.{os.getpid()}.tmp"
+        started = time.perf_counter()
+        write_snapshot(temporary, pos, postings, {**meta, "version": version})
+        os.replace(temporary, path)
+
+        pointer_tmp = f"{self._pointer}.{os.getpid()}.tmp"
+        with open(pointer_tmp, "w", encoding="utf-8") as f:
+            f.write(name)
+        os.replace(pointer_tmp, self._pointer)
+        logger.info(
+            f"Published PO snapshot {name} ({len(pos)} lines, {os.path.getsize(path)} bytes) "
+            f"in {(time.perf_counter() - started) * 1000:.0f}ms"
+        )
+        self._prune(name)
+        return path
+
+    def current_path(self) -> Optional[str]:
+        """Path of the newest published version; a stat() unless the pointer changed"""
+        try:
+            stat = os.stat(self._pointer)
+        except FileNotFoundError:
+            return None
+        key = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+        if key != self._pointer_stat:
+            with open(self._pointer, encoding="utf-8") as f:
+                self._current = os.path.join(self.directory, f.read().strip())
+            self._pointer_stat = key
+        return self._current
+
+    def _prune(self, current: str):
+        """Keep the newest PO_SNAPSHOT_KEEP versions"""
+        versions = sorted(name for name in os.listdir(self.directory) if name.endswith(".snap"))
+        for stale in versions[:max(0, len(versions) - self.keep)]:
+            if stale == current:
+                continue
+            try:
+                os.remove(os.path.join(self.directory, stale))
+            except OSError:
+                # Still mapped on a platform that forbids removing it; next time
+                pass
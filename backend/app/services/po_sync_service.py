@@ -0,0 +1,287 @@
+"""Service for bulk syncing Epicor BAQ rows into the purchase_orders table"""
+import hashlib
+import logging
+import time
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+from sqlalchemy import inspect, select, update
+from sqlalchemy.orm import Session
+from app.config import settings
+from app.models.database import PurchaseOrder, SyncState
+from app.models.write_queue import write_queue
+from app.services.metrics_service import PO_SYNC_ROWS, PO_SYNC_SECONDS
+
+logger = logging.getLogger(__name__)
+
+# Columns written from a BAQ row; everything else is managed by the database
+SYNC_COLUMNS = (
+    "vendor_id",
+    "vendor_name",
+    "line_description",
+    "line_amount",
+    "received_amount",
+    "remaining_amount",
+    "due_date",
+)
+
+WATERMARK_NAME = "epicor_po"
+
+PoKey = Tuple[str, int]
+# Runs write(fn, *args) as fn(session, *args) in some transaction
+Writer = Callable[..., Any]
+
+class POSyncService:
+    """Set-based upsert of BAQ purchase order lines"""
+
+    def __init__(self, chunk_size: Optional[int] = None):
+        self.chunk_size = chunk_size or settings.PO_SYNC_CHUNK_SIZE
+        # Per database URL: whether ON CONFLICT (po_number, po_line) has a unique key to target
+        self._line_key: Dict[str, bool] = {}
+
+    def sync(self, db: Session, epicor_pos: Iterable[Dict[str, Any]], full: bool = False) -> Dict[str, Any]:
+        """
+        Upsert BAQ rows keyed on (po_number, po_line)
+        Rows are consumed as they arrive and written in chunks, so a streamed
+        BAQ never has to be materialized in full. Each chunk reads the stored
+        row_hash of its own keys only, so a delta sync costs what it carries,
+        and rows whose hash matches are skipped without any write.
+        With full=True the rows are the whole open-PO BAQ: stored open lines
+        it no longer returns have been closed or cancelled, and are closed.
+        Everything is written in one transaction on db.
+        Returns: counts of inserted, updated, closed and unchanged lines
+        """
+        started = time.perf_counter()
+        counts = self._sync(epicor_pos, lambda fn, *args: fn(db, *args), full)
+        db.commit()
+        return self._finish(counts, started)
+
+    def sync_queued(self, epicor_pos: Iterable[Dict[str, Any]], full: bool = False) -> Dict[str, Any]:
+        """
+        sync() for the API: each chunk, and then the watermark, is its own
+        write on the shared SQLite writer
+        The BAQ is fetched outside any transaction, so a long fetch never holds
+        the write lock. A sync that fails part way leaves the chunks written so
+        far, which are correct rows, and the old watermark, so the next sync
+        reads the same changes again.
+        """
+        started = time.perf_counter()
+        return self._finish(self._sync(epicor_pos, write_queue.run, full), started)
+
+    def _sync(self, epicor_pos: Iterable[Dict[str, Any]], write: Writer, full: bool = False) -> Dict[str, Any]:
+        counts = {"total": 0, "inserted": 0, "updated": 0, "closed": 0, "unchanged": 0}
+        seen = set()
+        watermark: Optional[datetime] = None
+        # Keyed buffer so a chunk never carries the same key twice (ON CONFLICT
+        # cannot touch a row twice in one statement); values are (row, closed)
+        pending: Dict[PoKey, Tuple[Dict[str, Any], bool]] = {}
+
+        for po_data in epicor_pos:
+            changed_at = self._parse_date(po_data.get("changed_at"))
+            if changed_at and (watermark is None or changed_at > watermark):
+                watermark = changed_at
+
+            row = self._normalize(po_data)
+            key = (row["po_number"], row["po_line"])
+            if key not in seen:
+                seen.add(key)
+                counts["total"] += 1
+
+            pending[key] = (row, po_data.get("open_line") is False)
+            if len(pending) >= self.chunk_size:
+                write(self._sync_chunk, pending, counts)
+                pending.clear()
+
+        write(self._sync_chunk, pending, counts)
+        if full and seen:
+            # An empty BAQ is far likelier a misconfigured query than no open POs at all
+            write(self._close_unseen, seen, counts)
+        write(self._save_watermark, watermark, counts["total"])
+        counts["watermark"] = self._format_watermark(watermark) if watermark else None
+        return counts
+
+    def _finish(self, counts: Dict[str, Any], started: float) -> Dict[str, Any]:
+        PO_SYNC_SECONDS.observe(time.perf_counter() - started)
+        for result in ("inserted", "updated", "closed", "unchanged"):
+            PO_SYNC_ROWS.labels(result).inc(counts[result])
+        logger.info(
+            f"PO sync: {counts['inserted']} inserted, {counts['updated']} updated, "
+            f"{counts['closed']} closed, {counts['unchanged']} unchanged"
+        )
+        return counts
+
+    def get_watermark(self, db: Session) -> Optional[str]:
+        """Return the change watermark recorded by the previous sync, if any"""
+        state = db.get(SyncState, WATERMARK_NAME)
+        return state.watermark if state else None
+
+    def _save_watermark(self, db: Session, watermark: Optional[datetime], row_count: int):
+        state = db.get(SyncState, WATERMARK_NAME)
+        if state is None:
+            state = SyncState(name=WATERMARK_NAME)
+            db.add(state)
+        # Never move the watermark backwards, e.g. after an empty delta
+        if watermark is not None:
+            stored = self._parse_date(state.watermark)
+            if stored is None or watermark > stored:
+                state.watermark = self._format_watermark(watermark)
+        state.last_synced = datetime.utcnow()
+        state.last_row_count = row_count
+
+    def _format_watermark(self, value: datetime) -> str:
+        return value.strftime("%Y-%m-%dT%H:%M:%S")
+
+    def _normalize(self, po_data: Dict[str, Any]) -> Dict[str, Any]:
+        """Map a BAQ row onto purchase_orders column values"""
+        line_amount = float(po_data.get("line_amount") or 0.0)
+        received_amount = float(po_data.get("received_amount") or 0.0)
+        remaining_amount = line_amount - received_amount
+        if po_data.get("open_line") is False:
+            # Closed lines stay for history but drop out of matching
+            remaining_amount = 0.0
+        row = {
+            "po_number": str(po_data["po_number"]),
+            "po_line": int(po_data.get("po_line") or 0),
+            "vendor_id": po_data.get("vendor_id"),
+            "vendor_name": po_data.get("vendor_name"),
+            "line_description": po_data.get("line_description"),
+            "line_amount": line_amount,
+            "received_amount": received_amount,
+            "remaining_amount": remaining_amount,
+            "due_date": self._parse_date(po_data.get("due_date")),
+        }
+        row["row_hash"] = self._row_hash(row)
+        return row
+
+    def _row_hash(self, row: Dict[str, Any]) -> str:
+        """Stable content hash of the synced columns"""
+        payload = "\x1f".join(repr(row[c]) for c in SYNC_COLUMNS)
+        return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+    def _sync_chunk(self, db: Session, pending: Dict[PoKey, Tuple[Dict[str, Any], bool]], counts: Dict[str, int]):
+        """Compare a chunk against the stored hashes and write the lines that changed"""
+        if not pending:
+            return
+        stored = self._load_hashes(db, pending)
+        changed = []
+        for key, (row, closed) in pending.items():
+            current = stored.get(key, False)
+            if current is False:
+                counts["inserted"] += 1
+            elif row["row_hash"] != current:
+                counts["closed" if closed else "updated"] += 1
+            else:
+                counts["unchanged"] += 1
+                continue
+            changed.append(row)
+        self._write(db, changed)
+
+    def _close_unseen(self, db: Session, seen: set, counts: Dict[str, int]):
+        """Close stored open lines a full sync did not return"""
+        stmt = select(PurchaseOrder.id, PurchaseOrder.po_number, PurchaseOrder.po_line).where(
+            PurchaseOrder.remaining_amount > 0
+        )
+        ids = [i for i, number, line in db.execute(stmt) if (str(number), int(line or 0)) not in seen]
+        now = datetime.utcnow()
+        for start in range(0, len(ids), self.chunk_size):
+            # No hash: the line is rewritten if it ever comes back open
+            db.execute(
+                update(PurchaseOrder)
+                .where(PurchaseOrder.id.in_(ids[start:start + self.chunk_size]))
+                .values(remaining_amount=0.0, row_hash=None, updated_date=now)
+            )
+        counts["closed"] += len(ids)
+
+    def _load_hashes(self, db: Session, keys: Iterable[PoKey]) -> Dict[PoKey, Optional[str]]:
+        """Content hashes of the stored lines among keys, so a sync reads only what it was sent"""
+        keys = set(keys)
+        # po_number is indexed and a PO has few lines; a tuple IN is not portable
+        stmt = select(PurchaseOrder.po_number, PurchaseOrder.po_line, PurchaseOrder.row_hash).where(
+            PurchaseOrder.po_number.in_({number for number, _ in keys})
+        )
+        stored = {}
+        for number, line, row_hash in db.execute(stmt):
+            key = (str(number), int(line or 0))
+            if key in keys:
+                stored[key] = row_hash
+        return stored
+
+    def _write(self, db: Session, rows: List[Dict[str, Any]]):
+        """Write changed rows in chunks using the dialect's native upsert"""
+        if not rows:
+            return
+        now = datetime.utcnow()
+        dialect = db.get_bind().dialect.name
+        for start in range(0, len(rows), self.chunk_size):
+            chunk = [
+                dict(r, created_date=now, updated_date=now)
+                for r in rows[start:start + self.chunk_size]
+            ]
+            if dialect in ("postgresql", "sqlite") and self._has_line_key(db):
+                self._upsert_chunk(db, dialect, chunk)
+            else:
+                self._fallback_chunk(db, chunk)
+
+    def _has_line_key(self, db: Session) -> bool:
+        """Whether purchase_orders has the unique (po_number, po_line) key the upsert targets
+
+        Migration 0002 adds it; a database create_all built earlier, and that
+        was never migrated (DB_AUTO_MIGRATE=False), only has po_number unique.
+        """
+        bind = db.get_bind()
+        url = str(bind.url)
+        if url not in self._line_key:
+            inspector = inspect(db.connection())
+            target = {"po_number", "po_line"}
+            keys = [set(u["column_names"]) for u in inspector.get_unique_constraints("purchase_orders")]
+            keys += [set(i["column_names"]) for i in inspector.get_indexes("purchase_orders") if i["unique"]]
+            self._line_key[url] = target in keys
+            if not self._line_key[url]:
+                logger.warning(
+                    "purchase_orders has no unique (po_number, po_line) key; syncing without ON CONFLICT "
+                    "until the database is migrated (alembic upgrade head)"
+                )
+        return self._line_key[url]
+
+    def _upsert_chunk(self, db: Session, dialect: str, chunk: List[Dict[str, Any]]):
+        if dialect == "postgresql":
+            from sqlalchemy.dialects.postgresql import insert
+        else:
+            from sqlalchemy.dialects.sqlite import insert
+        stmt = insert(PurchaseOrder.__table__)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["po_number", "po_line"],
+            set_={c: stmt.excluded[c] for c in SYNC_COLUMNS + ("row_hash", "updated_date")},
+        )
+        # executemany lets SQLAlchemy batch the chunk into multi-row VALUES
+        db.execute(stmt, chunk)
+
+    def _fallback_chunk(self, db: Session, chunk: List[Dict[str, Any]]):
+        """Generic path for dialects without ON CONFLICT support"""
+        keys = [(r["po_number"], r["po_line"]) for r in chunk]
+        ids = {
+            (str(n), int(l or 0)): i
+            for i, n, l in db.execute(
+                select(PurchaseOrder.id, PurchaseOrder.po_number, PurchaseOrder.po_line)
+                .where(PurchaseOrder.po_number.in_({k[0] for k in keys}))
+            )
+        }
+        # An update keeps the line's original created_date, as the upsert's set_ does
+        to_update = [
+            dict({c: v for c, v in r.items() if c != "created_date"}, id=ids[k])
+            for k, r in zip(keys, chunk) if k in ids
+        ]
+        to_insert = [r for k, r in zip(keys, chunk) if k not in ids]
+        if to_update:
+            db.execute(update(PurchaseOrder), to_update)
+        if to_insert:
+            db.execute(PurchaseOrder.__table__.insert(), to_insert)
+
+    def _parse_date(self, value: Any) -> Optional[datetime]:
+        if value is None or isinstance(value, datetime):
+            return value
+        try:
+            return datetime.fromisoformat(str(value).replace("Z", "+00:00")).replace(tzinfo=None)
+        except ValueError:
+            return None
+
+po_sync_service = POSyncService()
@@ -0,0 +1,240 @@
+"""Per-request stage timings and slow-request profile capture"""
+import asyncio
+import cProfile
+import json
+import logging
+import os
+import re
+import sys
+import threading
+import time
+from collections import deque
+from contextvars import ContextVar
+from datetime import datetime
+from typing import Deque, Dict, List, Optional, Tuple
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Leaf frames of threads that are parked waiting for work
+_IDLE_LEAVES = {("thread.py", "_worker"), ("threading.py", "wait"), ("queue.py", "get")}
+_SAFE_ID = re.compile(r"[^A-Za-z0-9_.\-]")
+
+class RequestTrace:
+    """Stage timings collected while one request is being handled"""
+
+    def __init__(self, request_id: str, method: str, path: str, forced: bool):
+        self.request_id = request_id
+        self.method = method
+        self.path = path
+        self.forced = forced
+        self.started_at = datetime.utcnow()
+        self.started = time.perf_counter()
+        self.monotonic_start = time.monotonic()  # sampler clock
+        self.stages: Dict[Tuple[str, tuple], List[float]] = {}  # (stage, labels) -> [calls, seconds]
+        self.profiler: Optional[cProfile.Profile] = None
+        self._lock = threading.Lock()
+
+    def add(self, stage: str, seconds: float, labels: tuple = (), calls: int = 1):
+        # Threads spawned for this request share the trace
+        key = (stage, labels)
+        with self._lock:
+            entry = self.stages.get(key)
+            if entry is None:
+                self.stages[key] = [calls, seconds]
+            else:
+                entry[0] += calls
+                entry[1] += seconds
+
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.started
+
+    def breakdown(self) -> Dict[str, Dict[str, float]]:
+        with self._lock:
+            return {
+                ":".join((stage,) + labels): {"calls": int(calls), "ms": round(seconds * 1000, 2)}
+                for (stage, labels), (calls, seconds) in sorted(self.stages.items(), key=lambda kv: -kv[1][1])
+            }
+
+    def server_timing(self) -> str:
+        """Server-Timing header value (durations in ms)"""
+        parts = [f"{stage.replace(':', '.')};dur={info['ms']}" for stage, info in self.breakdown().items()]
+        parts.append(f"total;dur={round(self.elapsed() * 1000, 2)}")
+        return ", ".join(parts)
+
+_current_trace: ContextVar[Optional[RequestTrace]] = ContextVar("request_trace", default=None)
+
+def record_stage(stage: str, seconds: float, labels: tuple = (), calls: int = 1):
+    """Add time to the current request's breakdown; a no-op outside requests"""
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.add(stage, seconds, labels, calls)
+
+class SamplingProfiler:
+    """
+    Samples every thread's Python stack at a fixed interval while requests
+    are in flight, keeping a time-bounded window so the stacks behind a slow
+    request can be pulled out after it finishes
+    """
+
+    def __init__(self, interval: float, window: float):
+        self.interval = interval
+        self.window = window
+        self._samples: Deque[Tuple[float, int, tuple]] = deque()
+        self._lock = threading.Lock()
+        self._active = 0
+        self._wake = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def acquire(self):
+        with self._lock:
+            self._active += 1
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="request-sampler", daemon=True)
+                self._thread.start()
+        self._wake.set()
+
+    def release(self):
+        with self._lock:
+            self._active -= 1
+            if self._active <= 0:
+                self._active = 0
+                self._wake.clear()
+
+    def _run(self):
+        own = threading.get_ident()
+        while True:
+            self._wake.wait()
+            now = time.monotonic()
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(frame.f_code)
+                    frame = frame.f_back
+                if stack and (os.path.basename(stack[0].co_filename), stack[0].co_name) in _IDLE_LEAVES:
+                    continue
+                self._samples.append((now, ident, tuple(reversed(stack))))
+            cutoff = now - self.window
+            while self._samples and self._samples[0][0] < cutoff:
+                self._samples.popleft()
+            time.sleep(self.interval)
+
+    def collapsed(self, start: float, end: float) -> Dict[str, int]:
+        """Samples taken between two monotonic times, as folded stacks -> count"""
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        folded: Dict[str, int] = {}
+        for taken, ident, stack in list(self._samples):
+            if start <= taken <= end:
+                frames = [names.get(ident, f"thread-{ident}")]
+                frames += [f"{co.co_name} ({os.path.basename(co.co_filename)}:{co.co_firstlineno})" for co in stack]
+                key = ";".join(frames)
+                folded[key] = folded.get(key, 0) + 1
+        return folded
+
+class ProfilingService:
+    """
+    Starts a trace for every request and, when a request is slower than
+    PROFILE_SLOW_REQUEST_MS or asked for a profile, saves its stage
+    breakdown, the sampled stacks from its time window and (when forced) a
+    cProfile dump to PROFILE_DIR, named by request ID
+    """
+
+    def __init__(self):
+        self.slow_seconds = settings.PROFILE_SLOW_REQUEST_MS / 1000
+        self.profile_dir = settings.PROFILE_DIR
+        self.sampler = (
+            SamplingProfiler(settings.PROFILE_SAMPLE_INTERVAL_MS / 1000, settings.PROFILE_SAMPLE_WINDOW_SECONDS)
+            if settings.PROFILE_SAMPLE_INTERVAL_MS > 0 else None
+        )
+        # cProfile hooks one thread and cannot be nested; one forced profile at a time
+        self._cprofile_lock = threading.Lock()
+
+    def begin(self, request_id: str, method: str, path: str, forced: bool = False):
+        """Start tracing the current request; returns (trace, token) for finish()"""
+        trace = RequestTrace(request_id, method, path, forced)
+        if self.sampler is not None:
+            self.sampler.acquire()
+        if forced and self._cprofile_lock.acquire(blocking=False):
+            trace.profiler = cProfile.Profile()
+            try:
+                trace.profiler.enable()
+            except ValueError:
+                # Another profiler (e.g. a debugger) owns the hook
+                trace.profiler = None
+                self._cprofile_lock.release()
+        return trace, _current_trace.set(trace)
+
+    async def finish(self, trace: RequestTrace, token, status: int):
+        """Stop tracing and save the profile if the request qualifies"""
+        _current_trace.reset(token)
+        elapsed = trace.elapsed()
+        ended = time.monotonic()
+        if trace.profiler is not None:
+            trace.profiler.disable()
+            self._cprofile_lock.release()
+        if self.sampler is not None:
+            self.sampler.release()
+
+        slow = elapsed >= self.slow_seconds
+        if not (slow or trace.forced):
+            return
+        if slow:
+            logger.warning(
+                f"Slow request {trace.method} {trace.path} ({trace.request_id}): {elapsed * 1000:.0f}ms "
+                + ", ".join(f"{stage} {info['ms']:.0f}ms" for stage, info in list(trace.breakdown().items())[:5])
+            )
+        try:
+            await asyncio.to_thread(self._save, trace, status, elapsed, ended)
+        except Exception as e:
+            logger.error(f"Could not save request profile {trace.request_id}: {str(e)}")
+
+    def _save(self, trace: RequestTrace, status: int, elapsed: float, ended: float):
+        os.makedirs(self.profile_dir, exist_ok=True)
+        base = os.path.join(
+            self.profile_dir,
+            f"{trace.started_at.strftime('%Y%m%dT%H%M%S')}_{_SAFE_ID.sub('_', trace.request_id)[:64]}"
+        )
+        folded = self.sampler.collapsed(trace.monotonic_start, ended) if self.sampler else {}
+        if folded:
+            with open(base + ".folded", "w", encoding="utf-8") as f:
+                for stack, count in sorted(folded.items(), key=lambda kv: -kv[1]):
+                    f.write(f"{stack} {count}\n")
+        if trace.profiler is not None:
+            trace.profiler.dump_stats(base + ".prof")
+
+        attributed = sum(info["ms"] for info in trace.breakdown().values())
+        with open(base + ".json", "w", encoding="utf-8") as f:
+            json.dump({
+                "request_id": trace.request_id,
+                "method": trace.method,
+                "path": trace.path,
+                "status": status,
+                "started_at": trace.started_at.isoformat(),
+                "elapsed_ms": round(elapsed * 1000, 2),
+                "reason": "requested" if trace.forced else "slow",
+                # Stages can nest (a PO sync includes its BAQ fetches and DB writes)
+                "stages": trace.breakdown(),
+                "attributed_ms": round(attributed, 2),
+                "samples": sum(folded.values()),
+                "sample_interval_ms": settings.PROFILE_SAMPLE_INTERVAL_MS,
+                "files": {
+                    "folded": base + ".folded" if folded else None,
+                    "cprofile": base + ".prof" if trace.profiler is not None else None,
+                },
+            }, f, indent=2)
+        logger.info(f"Saved request profile {base}.json")
+        self._prune()
+
+    def _prune(self):
+        """Keep the newest PROFILE_MAX_FILES captures"""
+        captures = sorted(name[:-5] for name in os.listdir(self.profile_dir) if name.endswith(".json"))
+        for stale in captures[:max(0, len(captures) - settings.PROFILE_MAX_FILES)]:
+            for extension in (".json", ".folded", ".prof"):
+                try:
+                    os.remove(os.path.join(self.profile_dir, stale + extension))
+                except FileNotFoundError:
+                    pass
+
+profiling_service = ProfilingService()
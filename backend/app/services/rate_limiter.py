@@ -0,0 +1,66 @@
+"""Async token-bucket rate limiting for outbound API calls"""
+import asyncio
+import time
+from typing import Optional
+
+class TokenBucket:
+    """Refills `rate_per_minute` units per minute up to one minute of burst"""
+
+    def __init__(self, rate_per_minute: float):
+        self.capacity = float(rate_per_minute)
+        self.rate = rate_per_minute / 60.0
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float) -> float:
+        """Seconds until `amount` units are available (0 if available now)"""
+        self._refill()
+        # A single request larger than the bucket waits for a full bucket
+        amount = min(amount, self.capacity)
+        if self.tokens >= amount:
+            return 0.0
+        return (amount - self.tokens) / self.rate
+
+    def take(self, amount: float):
+        self.tokens -= min(amount, self.capacity)
+
+    def give_back(self, amount: float):
+        self._refill()
+        self.tokens = min(self.capacity, self.tokens + amount)
+
+class AsyncRateLimiter:
+    """Requests-per-minute and tokens-per-minute limits shared by all callers in a process"""
+
+    def __init__(self, requests_per_minute: float, tokens_per_minute: float):
+        self.requests = TokenBucket(requests_per_minute) if requests_per_minute > 0 else None
+        self.tokens = TokenBucket(tokens_per_minute) if tokens_per_minute > 0 else None
+        self._lock: Optional[asyncio.Lock] = None
+
+    async def acquire(self, tokens: int = 0):
+        """Wait until one request and `tokens` tokens fit in both buckets, then take them"""
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        # Serialize waiters so they are served in arrival order
+        async with self._lock:
+            while True:
+                wait = max(
+                    self.requests.wait_time(1) if self.requests else 0.0,
+                    self.tokens.wait_time(tokens) if self.tokens else 0.0,
+                )
+                if wait <= 0:
+                    break
+                await asyncio.sleep(wait)
+            if self.requests:
+                self.requests.take(1)
+            if self.tokens:
+                self.tokens.take(tokens)
+
+    def refund(self, tokens: int):
+        """Return over-estimated tokens once the real usage is known"""
+        if self.tokens and tokens > 0:
+            self.tokens.give_back(tokens)
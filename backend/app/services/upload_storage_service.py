@@ -0,0 +1,169 @@
+"""Streamed, content-addressed storage for uploaded invoice files"""
+import asyncio
+import hashlib
+import logging
+import os
+import tempfile
+import time
+import zipfile
+from pathlib import Path
+from typing import BinaryIO, List, NamedTuple, Optional, Tuple
+from fastapi import UploadFile
+from app.config import settings
+from app.services.metrics_service import UPLOAD_BYTES, UPLOAD_WRITE_SECONDS
+
+logger = logging.getLogger(__name__)
+
+# Extensions InvoiceExtractionService.extract_from_file understands
+SUPPORTED_EXTENSIONS = {".pdf", ".txt", ".csv"}
+
+def file_sha256(file_path: str, chunk_size: Optional[int] = None) -> str:
+    """SHA-256 of a stored file, read in chunks"""
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size or settings.UPLOAD_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+class UploadTooLargeError(ValueError):
+    """Raised when a file (or archive member) exceeds MAX_FILE_SIZE"""
+
+class StoredUpload(NamedTuple):
+    filename: str
+    file_path: str
+    sha256: str
+    size: int
+    duplicate: bool  # identical content was already stored
+
+class UploadStorageService:
+    """
+    Writes uploads in fixed-size chunks to UPLOAD_DIR/<sha[:2]>/<sha><ext>,
+    hashing while streaming, so memory use does not grow with file size and
+    files with the same name never overwrite each other
+    """
+
+    def __init__(self, upload_dir: Optional[str] = None, chunk_size: Optional[int] = None):
+        self.upload_dir = upload_dir or settings.UPLOAD_DIR
+        self.chunk_size = chunk_size or settings.UPLOAD_CHUNK_SIZE
+
+    def path_for(self, sha256: str, extension: str) -> str:
+        return os.path.join(self.upload_dir, sha256[:2], f"{sha256}{extension.lower()}")
+
+    async def save_upload(self, file: UploadFile) -> StoredUpload:
+        """Stream an UploadFile to storage without reading it into memory"""
+        started = time.perf_counter()
+        temp, digest = self._open_temp()
+        size = 0
+        try:
+            while True:
+                chunk = await file.read(self.chunk_size)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if size > settings.MAX_FILE_SIZE:
+                    raise UploadTooLargeError(f"{file.filename} exceeds {settings.MAX_FILE_SIZE} bytes")
+                # Hash and write off the event loop
+                await asyncio.to_thread(self._write_chunk, temp, digest, chunk)
+        except BaseException:
+            self._discard(temp)
+            raise
+        stored = await asyncio.to_thread(self._commit, temp, digest, size, file.filename)
+        UPLOAD_WRITE_SECONDS.observe(time.perf_counter() - started)
+        return stored
+
+    def save_stream(self, stream: BinaryIO, filename: str) -> StoredUpload:
+        """Blocking variant of save_upload for file-like sources such as archive members"""
+        started = time.perf_counter()
+        temp, digest = self._open_temp()
+        size = 0
+        try:
+            while True:
+                chunk = stream.read(self.chunk_size)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if size > settings.MAX_FILE_SIZE:
+                    raise UploadTooLargeError(f"{filename} exceeds {settings.MAX_FILE_SIZE} bytes")
+                self._write_chunk(temp, digest, chunk)
+        except BaseException:
+            self._discard(temp)
+            raise
+        stored = self._commit(temp, digest, size, filename)
+        UPLOAD_WRITE_SECONDS.observe(time.perf_counter() - started)
+        return stored
+
+    def save_archive(
+        self,
+        archive: BinaryIO,
+        archive_name: str,
+        max_members: int
+    ) -> Tuple[List[StoredUpload], List[dict]]:
+        """
+        Store every supported file in a zip archive, one member at a time
+        Returns the stored files and a list of skipped members with reasons.
+        """
+        stored: List[StoredUpload] = []
+        skipped: List[dict] = []
+        try:
+            zf = zipfile.ZipFile(archive)
+        except zipfile.BadZipFile as e:
+            return stored, [{"filename": archive_name, "error": f"Invalid zip archive: {str(e)}"}]
+
+        with zf:
+            for info in zf.infolist():
+                name = Path(info.filename).name
+                if info.is_dir() or not name or name.startswith(".") or "__MACOSX" in info.filename:
+                    continue
+                label = f"{archive_name}/{info.filename}"
+                if Path(name).suffix.lower() not in SUPPORTED_EXTENSIONS:
+                    skipped.append({"filename": label, "error": "Unsupported file type"})
+                    continue
+                if len(stored) >= max_members:
+                    skipped.append({"filename": label, "error": "Too many files in request"})
+                    continue
+                # Declared size is checked up front; save_stream enforces the real size
+                if info.file_size > settings.MAX_FILE_SIZE:
+                    skipped.append({"filename": label, "error": "File too large"})
+                    continue
+                try:
+                    with zf.open(info) as member:
+                        stored.append(self.save_stream(member, name))
+                except (UploadTooLargeError, zipfile.BadZipFile, RuntimeError) as e:
+                    skipped.append({"filename": label, "error": str(e)})
+        return stored, skipped
+
+    def _open_temp(self):
+        os.makedirs(self.upload_dir, exist_ok=True)
+        # Same directory as the final path so the rename is atomic
+        temp = tempfile.NamedTemporaryFile(dir=self.upload_dir, prefix=".upload-", delete=False)
+        return temp, hashlib.sha256()
+
+    @staticmethod
+    def _write_chunk(temp, digest, chunk: bytes):
+        digest.update(chunk)
+        temp.write(chunk)
+
+    @staticmethod
+    def _discard(temp):
+        temp.close()
+        try:
+            os.remove(temp.name)
+        except OSError:
+            pass
+
+    def _commit(self, temp, digest, size: int, filename: str) -> StoredUpload:
+        """Move the finished temp file to its content address"""
+        temp.close()
+        sha256 = digest.hexdigest()
+        file_path = self.path_for(sha256, Path(filename or "").suffix)
+        os.makedirs(os.path.dirname(file_path), exist_ok=True)
+        duplicate = os.path.exists(file_path)
+        if duplicate:
+            os.remove(temp.name)
+        else:
+            os.replace(temp.name, file_path)
+        UPLOAD_BYTES.inc(size)
+        logger.info(f"Stored upload {filename} as {file_path} ({size} bytes)")
+        return StoredUpload(filename, file_path, sha256, size, duplicate)
+
+upload_storage_service = UploadStorageService()
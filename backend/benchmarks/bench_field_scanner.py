@@ -0,0 +1,78 @@
+"""
+Field scanner benchmark: single-pass FieldScanner vs the previous per-pattern
+re.search loop, on synthetic text dumps from 1 to 500 pages
+
+    cd backend && python -m benchmarks.bench_field_scanner [--pages 1,10,100,500] [--repeat 3]
+
+A linear scanner shows a flat per-page time as the document grows.
+"""
+import argparse
+import re
+import time
+from typing import Any, Dict, List
+from app.services.field_scanner import FieldScanner
+from benchmarks.corpus import text_invoice
+
+# The patterns and loop _extract_fields used before the scanner, for comparison
+LEGACY_PATTERNS = {
+    "invoice_number": ([
+        r"invoice\s+(?:number|#|no\.?)[\s:]*([A-Z0-9\-]+)",
+        r"inv\s+(?:number|#|no\.?)[\s:]*([A-Z0-9\-]+)",
+        r"^([A-Z0-9\-]{5,20})$",
+    ], re.IGNORECASE),
+    "invoice_amount": ([
+        r"(?:total|amount|due)\s+(?:amount)?[\s:]*\$?([\d,]+\.?\d*)",
+        r"\$?([\d,]+\.?\d*)(?:\s*(?:total|amount|due))?",
+    ], re.IGNORECASE),
+    "invoice_date": ([
+        r"(?:invoice|bill)\s+(?:date|issued)[\s:]*(\d{1,2}/\d{1,2}/\d{2,4})",
+        r"(\d{1,2}/\d{1,2}/\d{2,4})",
+        r"(\d{4}-\d{2}-\d{2})",
+    ], 0),
+    "vendor_name": ([
+        r"(?:from|bill\s+from|vendor|supplier)[\s:]*\n?([A-Z][A-Za-z\s&.,']+)",
+    ], re.IGNORECASE | re.MULTILINE),
+}
+
+def legacy_extract(text: str) -> Dict[str, Any]:
+    data: Dict[str, Any] = {}
+    for field, (patterns, flags) in LEGACY_PATTERNS.items():
+        for pattern in patterns:
+            match = re.search(pattern, text, flags)
+            if match:
+                data[field] = match.group(1).strip()
+                break
+    po_match = re.search(r"(?:p\.?o\.?|purchase\s+order)\s*[#:]*\s*([A-Z0-9\-]+)", text, re.IGNORECASE)
+    if po_match:
+        data["po_reference"] = po_match.group(1)
+    return data
+
+def best_of(fn, text: str, repeat: int) -> float:
+    times = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn(text)
+        times.append(time.perf_counter() - started)
+    return min(times)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--pages", default="1,10,50,100,250,500")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    scanner = FieldScanner()
+    print(f"{'pages':>6} {'KB':>8} {'scanner ms':>11} {'us/page':>9} {'legacy ms':>10}  scanner amount / legacy amount")
+    for pages in [int(p) for p in args.pages.split(",")]:
+        text = text_invoice(pages)
+        scan_s = best_of(scanner.extract, text, args.repeat)
+        legacy_s = best_of(legacy_extract, text, args.repeat)
+        found = scanner.extract(text)
+        amount = found["invoice_amount"].value if "invoice_amount" in found else None
+        print(
+            f"{pages:>6} {len(text) / 1024:>8.0f} {scan_s * 1000:>11.2f} {scan_s / pages * 1e6:>9.1f} "
+            f"{legacy_s * 1000:>10.2f}  {amount} / {legacy_extract(text).get('invoice_amount')}"
+        )
+
+if __name__ == "__main__":
+    main()
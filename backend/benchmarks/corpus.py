@@ -0,0 +1,150 @@
+"""Deterministic synthetic corpus: text/PDF invoices and BAQ-shaped PO rows"""
+import random
+from typing import Any, Dict, List, Optional
+
+VENDOR_WORDS = [
+    "Acme", "Globex", "Initech", "Umbrella", "Stark", "Wayne", "Hooli", "Vandelay",
+    "Cyberdyne", "Soylent", "Tyrell", "Wonka", "Gringotts", "Oscorp", "Massive", "Dynamic",
+]
+VENDOR_KINDS = ["Industrial", "Supply", "Fasteners", "Logistics", "Packaging", "Electric", "Tooling"]
+VENDOR_SUFFIXES = ["Inc", "LLC", "Corp", "Co", "Ltd"]
+PARTS = ["Hex bolt", "Washer", "Bearing", "Gasket", "Bracket", "Cable tie", "Fuse", "Valve", "Filter"]
+
+def vendor_names(count: int, seed: int = 1) -> List[str]:
+    rng = random.Random(seed)
+    names = set()
+    while len(names) < count:
+        names.add(f"{rng.choice(VENDOR_WORDS)} {rng.choice(VENDOR_KINDS)} {rng.choice(VENDOR_SUFFIXES)}"
+                  + (f" {len(names)}" if len(names) >= len(VENDOR_WORDS) * len(VENDOR_KINDS) else ""))
+    return sorted(names)
+
+def text_invoice(pages: int = 1, lines_per_page: int = 40, seed: int = 7) -> str:
+    """Invoice-like text: a header, `pages` pages of line items, then totals"""
+    rng = random.Random(seed)
+    lines: List[str] = [
+        "Globex Industrial Supply Inc",
+        "1200 Commerce Way, Springfield",
+        "",
+        "Invoice Number: INV-2024-118877",
+        "Invoice Date: 03/14/2024",
+        "Due Date: 04/13/2024",
+        "Purchase Order: PO-2024-5521",
+        "",
+    ]
+    total = 0.0
+    for page in range(1, pages + 1):
+        lines.append(f"Page {page} of {pages}")
+        for item in range(lines_per_page):
+            qty = rng.randint(1, 500)
+            price = rng.randint(100, 99999) / 100
+            total += qty * price
+            lines.append(
+                f"{page:03d}-{item:02d}  {rng.choice(PARTS)} M{rng.randint(4, 24)} zinc plated, "
+                f"lot {rng.randint(1000, 9999)}  {qty}  {price:,.2f}  {qty * price:,.2f}"
+            )
+        lines.append("Continued on next page")
+    lines += ["", f"Subtotal: {total:,.2f}", f"Tax: {total * 0.08:,.2f}", f"TOTAL AMOUNT DUE: {total * 1.08:,.2f}"]
+    return "\n".join(lines)
+
+def write_pdf_invoice(path: str, pages: int = 1, lines_per_page: int = 45, seed: int = 7):
+    """
+    Write a minimal text-only PDF (Helvetica, one content stream per page)
+    with the invoice header on page 1 and the total on the last page
+    """
+    rng = random.Random(seed)
+    objects: List[bytes] = []
+
+    def add(body: bytes) -> int:
+        objects.append(body)
+        return len(objects)
+
+    font_id = add(b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>")
+    pages_id = add(b"")  # filled in once the page ids are known
+    page_ids = []
+    total = 0.0
+    for page in range(1, pages + 1):
+        lines = []
+        if page == 1:
+            lines += [
+                "Globex Industrial Supply Inc",
+                "Invoice Number: INV-2024-118877",
+                "Invoice Date: 03/14/2024",
+                "Purchase Order: PO-2024-5521",
+                "Description   Qty   Unit Price   Amount",
+            ]
+        for item in range(lines_per_page):
+            qty = rng.randint(1, 50)
+            price = rng.randint(100, 9999) / 100
+            total += qty * price
+            lines.append(f"{page:03d}-{item:02d} {rng.choice(PARTS)} lot {rng.randint(1000, 9999)}   "
+                         f"{qty}   {price:.2f}   {qty * price:,.2f}")
+        if page == pages:
+            lines += [f"Subtotal: {total:,.2f}", f"TOTAL AMOUNT DUE: {total * 1.08:,.2f}"]
+        text = " ".join("(" + line.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)") + ") Tj T*"
+                        for line in lines)
+        content = f"BT /F1 9 Tf 40 800 Td 11 TL {text} ET".encode("latin-1")
+        content_id = add(b"<< /Length %d >>\nstream\n%s\nendstream" % (len(content), content))
+        page_ids.append(add(
+            b"<< /Type /Page /Parent %d 0 R /MediaBox [0 0 612 842] /Contents %d 0 R "
+            b"/Resources << /Font << /F1 %d 0 R >> >> >>" % (pages_id, content_id, font_id)
+        ))
+    objects[pages_id - 1] = (b"<< /Type /Pages /Kids [" + b" ".join(b"%d 0 R" % i for i in page_ids)
+                             + b"] /Count %d >>" % len(page_ids))
+    catalog_id = add(b"<< /Type /Catalog /Pages %d 0 R >>" % pages_id)
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, 1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n%s\nendobj\n" % (number, body)
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    out += b"".join(b"%010d 00000 n \n" % offset for offset in offsets)
+    out += b"trailer\n<< /Size %d /Root %d 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, catalog_id, xref)
+    with open(path, "wb") as f:
+        f.write(out)
+
+def baq_rows(count: int, seed: int = 11, lines_per_po: int = 5, vendors: Optional[int] = None) -> List[Dict[str, Any]]:
+    """Raw BAQ rows with Epicor column names, as EpicorService._map_po_row expects"""
+    rng = random.Random(seed)
+    names = vendor_names(vendors or max(16, min(5000, count // 50)), seed)
+    rows = []
+    for i in range(count):
+        po_num = 100000 + i // lines_per_po
+        vendor_index = (po_num * 7919) % len(names)  # stable vendor per PO
+        qty = rng.randint(1, 200)
+        unit_cost = rng.randint(50, 500000) / 100
+        part = f"P{rng.randint(10000, 99999)}"
+        rows.append({
+            "PODetail_PONUM": po_num,
+            "PODetail_POLine": i % lines_per_po + 1,
+            "Vendor_VendorID": f"V{vendor_index:05d}",
+            "Vendor_Name": names[vendor_index],
+            "PODetail_PartNum": part,
+            "PODetail_VenPartNum": f"S-{part}",
+            "PODetail_LineDesc": f"{rng.choice(PARTS)} {rng.choice(['steel', 'brass', 'nylon'])} {rng.randint(1, 99)}mm",
+            "PODetail_UnitCost": unit_cost,
+            "PODetail_OrderQty": qty,
+            "PODetail_XOrderQty": qty,
+            "PODetail_BaseUOM": "EA",
+            "PODetail_DocExitCost": round(qty * unit_cost, 2),
+            "PODetail_OpenLine": rng.random() > 0.05,
+        })
+    return rows
+
+def invoices_for(pos: List[Dict[str, Any]], count: int, seed: int = 13) -> List[Dict[str, Any]]:
+    """Extracted-invoice dicts aimed at random PO lines, with realistic noise"""
+    rng = random.Random(seed)
+    invoices = []
+    for i in range(count):
+        po = pos[rng.randrange(len(pos))]
+        amount = po.get("line_amount") or 100.0
+        invoices.append({
+            "invoice_number": f"INV-{seed}-{i:06d}",
+            "vendor_name": po.get("vendor_name") if rng.random() < 0.8 else (po.get("vendor_name") or "").split(" ")[0],
+            "invoice_amount": round(amount * rng.uniform(0.97, 1.03), 2),
+            "po_reference": str(po.get("po_number")) if rng.random() < 0.6 else None,
+            "part_number": po.get("part_number") if rng.random() < 0.3 else "",
+            "line_items": [],
+        })
+    return invoices
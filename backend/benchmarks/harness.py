@@ -0,0 +1,108 @@
+"""Timing, percentile and baseline helpers for the benchmark suite"""
+import json
+import math
+import os
+import platform
+import statistics
+import sys
+import time
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional
+
+def percentile(samples: List[float], pct: float) -> float:
+    """Nearest-rank percentile of a non-empty sample list"""
+    ordered = sorted(samples)
+    rank = max(0, math.ceil(pct / 100 * len(ordered)) - 1)
+    return ordered[rank]
+
+def measure(
+    name: str,
+    fn: Callable[[], Any],
+    repeat: int,
+    items: int = 1,
+    warmup: int = 1,
+    setup: Optional[Callable[[], Any]] = None
+) -> Dict[str, Any]:
+    """
+    Time `repeat` calls of fn (after `warmup` untimed calls)
+    `items` is the work done per call (rows, invoices, pages) for throughput;
+    `setup`, if given, runs untimed before every call.
+    """
+    for _ in range(warmup):
+        if setup:
+            setup()
+        fn()
+    samples = []
+    for _ in range(repeat):
+        if setup:
+            setup()
+        started = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - started)
+    total = sum(samples)
+    return {
+        "name": name,
+        "runs": repeat,
+        "items_per_run": items,
+        "mean_ms": round(statistics.mean(samples) * 1000, 4),
+        "p50_ms": round(percentile(samples, 50) * 1000, 4),
+        "p95_ms": round(percentile(samples, 95) * 1000, 4),
+        "p99_ms": round(percentile(samples, 99) * 1000, 4),
+        "throughput_per_s": round(items * repeat / total, 2) if total > 0 else None,
+    }
+
+def environment() -> Dict[str, Any]:
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "date": datetime.utcnow().isoformat(timespec="seconds"),
+    }
+
+def save_baseline(path: str, profile: str, results: List[Dict[str, Any]]):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"profile": profile, "environment": environment(),
+                   "results": {r["name"]: r for r in results}}, f, indent=2, sort_keys=True)
+        f.write("\n")
+
+def load_baseline(path: str) -> Optional[Dict[str, Any]]:
+    if not os.path.exists(path):
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+def compare(
+    results: List[Dict[str, Any]],
+    baseline: Dict[str, Any],
+    threshold: float
+) -> List[Dict[str, Any]]:
+    """p50 change against the baseline; a regression is a slowdown beyond threshold"""
+    rows = []
+    previous = baseline.get("results", {})
+    for result in results:
+        before = previous.get(result["name"])
+        if not before or not before.get("p50_ms"):
+            rows.append({"name": result["name"], "change": None, "regression": False})
+            continue
+        change = result["p50_ms"] / before["p50_ms"] - 1
+        rows.append({"name": result["name"], "change": change, "regression": change > threshold})
+    return rows
+
+def print_table(results: List[Dict[str, Any]], comparison: Optional[List[Dict[str, Any]]] = None):
+    changes = {row["name"]: row for row in comparison or []}
+    header = f"{'benchmark':<40} {'runs':>5} {'p50 ms':>11} {'p95 ms':>11} {'p99 ms':>11} {'items/s':>13}"
+    if comparison is not None:
+        header += f" {'vs base':>9}"
+    print(header)
+    print("-" * len(header))
+    for r in results:
+        line = (f"{r['name']:<40} {r['runs']:>5} {r['p50_ms']:>11.3f} {r['p95_ms']:>11.3f} "
+                f"{r['p99_ms']:>11.3f} {r['throughput_per_s'] or 0:>13,.1f}")
+        if comparison is not None:
+            row = changes.get(r["name"], {})
+            if row.get("change") is None:
+                line += f" {'new':>9}"
+            else:
+                line += f" {row['change'] * 100:>+8.1f}%" + (" REGRESSION" if row["regression"] else "")
+        print(line)
+    sys.stdout.flush()
@@ -0,0 +1,140 @@
+"""
+Query-plan check for the hot read paths
+
+    cd backend
+    python -m benchmarks.query_plans                            # scratch SQLite, migrated and seeded
+    python -m benchmarks.query_plans --database-url postgresql://...   # an existing migrated database
+
+EXPLAINs the statements the routes and services actually run (PO listing
+filters, the candidate index rebuild, sync key lookups, the review queue,
+PO detail invoices, unmatched invoices and job claims) and checks that each
+plan uses the index added for it. Exits 1 if any plan does not. Against
+PostgreSQL, sequential scans are disabled for the check so small tables
+still show whether an index is usable.
+"""
+import argparse
+import os
+import sys
+import tempfile
+
+def _parse_args():
+    parser = argparse.ArgumentParser(description="Check that the hot queries use their indexes")
+    parser.add_argument("--database-url", help="existing migrated database to check (default: scratch SQLite)")
+    parser.add_argument("--rows", type=int, default=20_000, help="PO lines to seed the scratch database with")
+    return parser.parse_args()
+
+# Point the app at the database to check before anything imports app.config
+_ARGS = _parse_args()
+os.environ.setdefault("OPENAI_API_KEY", "offline-benchmark")
+os.environ.update({
+    "DATABASE_URL": _ARGS.database_url or f"sqlite:///{os.path.join(tempfile.mkdtemp(prefix='invoice-plans-'), 'plans.db')}",
+    "JOBS_ENABLED": "False",
+    "METRICS_ENABLED": "False",
+})
+
+from datetime import datetime, timedelta  # noqa: E402
+from typing import Any, List, Tuple  # noqa: E402
+from sqlalchemy import func, select, text  # noqa: E402
+from app.models.database import Invoice, InvoiceMatch, Job, PurchaseOrder  # noqa: E402
+from app.models.session import SessionLocal, engine  # noqa: E402
+from app.routes.invoices import review_queue_query  # noqa: E402
+from app.routes.purchase_orders import DEFAULT_PO_LIST_FIELDS, PO_INVOICE_FIELDS, PO_LIST_FIELDS  # noqa: E402
+
+def _po_page(*conditions):
+    """The PO listing statement (see get_all_purchase_orders) for some filters"""
+    return (
+        select(*(PO_LIST_FIELDS[name].label(name) for name in DEFAULT_PO_LIST_FIELDS))
+        .where(*conditions, PurchaseOrder.id > 100)
+        .order_by(PurchaseOrder.id)
+        .limit(101)
+    )
+
+# SQLite names a table's UNIQUE constraint index sqlite_autoindex_<table>_<n>
+PO_LINE_KEY = ("uq_purchase_orders_po_line", "sqlite_autoindex_purchase_orders_")
+
+def hot_queries() -> List[Tuple[str, Any, Tuple[str, ...]]]:
+    """(name, statement, names of the index the plan should use)"""
+    now = datetime.utcnow()
+    return [
+        ("po_list.open_only", _po_page(PurchaseOrder.remaining_amount > 0), ("ix_purchase_orders_open",)),
+        ("po_list.vendor_id", _po_page(PurchaseOrder.vendor_id == "V00042"), ("ix_purchase_orders_vendor_id",)),
+        ("po_list.due_range", _po_page(
+            PurchaseOrder.due_date >= now, PurchaseOrder.due_date < now + timedelta(days=7)
+        ), ("ix_purchase_orders_due_date",)),
+        ("po_list.po_number", _po_page(PurchaseOrder.po_number == "PO-000042"), PO_LINE_KEY),
+        ("candidate_index.rebuild", select(
+            PurchaseOrder.id, PurchaseOrder.po_number, PurchaseOrder.vendor_name, PurchaseOrder.remaining_amount
+        ).where(PurchaseOrder.remaining_amount > 0), ("ix_purchase_orders_open",)),
+        ("po_sync.key_lookup", select(PurchaseOrder.id).where(
+            PurchaseOrder.po_number.in_(["PO-000042", "PO-000043"])
+        ), PO_LINE_KEY),
+        ("review_queue.page", review_queue_query().where(InvoiceMatch.id > 100).limit(101),
+         ("ix_invoice_matches_pending",)),
+        ("review_queue.count", select(func.count(InvoiceMatch.id)).where(InvoiceMatch.is_approved == False),
+         ("ix_invoice_matches_pending",)),
+        ("po_detail.invoices", select(*(c.label(n) for n, c in PO_INVOICE_FIELDS.items())).where(
+            Invoice.purchase_order_id == 42, Invoice.id > 0
+        ).order_by(Invoice.id).limit(101), ("ix_invoices_purchase_order_id",)),
+        ("match_batch.unmatched", select(Invoice.id).where(~Invoice.matches.any()),
+         ("ix_invoice_matches_invoice_id",)),
+        ("po_matches", select(InvoiceMatch.id).where(InvoiceMatch.po_id == 42), ("ix_invoice_matches_po_id",)),
+        ("jobs.claim", select(Job.id).where(Job.status == "queued", Job.next_run_at <= now).order_by(
+            Job.next_run_at, Job.id
+        ).limit(5), ("ix_jobs_status_next_run",)),
+    ]
+
+def explain(connection, statement) -> str:
+    dialect = connection.dialect.name
+    sql = str(statement.compile(dialect=connection.dialect, compile_kwargs={"literal_binds": True}))
+    if dialect == "sqlite":
+        rows = connection.exec_driver_sql("EXPLAIN QUERY PLAN " + sql).fetchall()
+        return "\n".join(row[-1] for row in rows)
+    return "\n".join(row[0] for row in connection.exec_driver_sql("EXPLAIN " + sql).fetchall())
+
+def seed(rows: int):
+    """Migrate the scratch database and fill it with a synthetic PO set and review backlog"""
+    from benchmarks import corpus
+    from app.models.migrations import upgrade_database
+    from app.services.epicor_service import epicor_service
+    from app.services.po_sync_service import po_sync_service
+    upgrade_database()
+    with SessionLocal() as db:
+        po_sync_service.sync(db, (epicor_service._map_po_row(row) for row in corpus.baq_rows(rows)))
+        # Closed lines pile up over time; most of a long-lived table is history
+        db.execute(text("UPDATE purchase_orders SET remaining_amount = 0 WHERE id % 5 != 0"))
+        invoices = rows // 10
+        db.execute(Invoice.__table__.insert(), [
+            {"invoice_number": f"INV-{i:06d}", "purchase_order_id": i % rows + 1 if i % 2 else None}
+            for i in range(invoices)
+        ])
+        db.execute(InvoiceMatch.__table__.insert(), [
+            {"invoice_id": i + 1, "po_id": i % rows + 1, "match_score": 0.9, "is_approved": i % 5 != 0}
+            for i in range(invoices)
+        ])
+        db.commit()
+        db.execute(text("ANALYZE"))
+        db.commit()
+
+def main(args) -> int:
+    if not args.database_url:
+        seed(args.rows)
+    failures = 0
+    with engine.connect() as connection:
+        if connection.dialect.name == "postgresql":
+            connection.exec_driver_sql("SET enable_seqscan = off")
+        print(f"{'query':<26} {'index':<32} plan")
+        for name, statement, indexes in hot_queries():
+            plan = explain(connection, statement)
+            used = [line.strip() for line in plan.splitlines() if any(index in line for index in indexes)]
+            failures += not used
+            first = used[0] if used else plan.splitlines()[0].strip()
+            print(f"{name:<26} {indexes[0]:<32} {'ok  ' if used else 'MISS'} {first}")
+            if not used:
+                print("    " + plan.replace("\n", "\n    "))
+        connection.rollback()
+    print(f"\n{failures} of {len(hot_queries())} hot queries do not use their index" if failures
+          else "\nAll hot queries use their indexes")
+    return 1 if failures else 0
+
+if __name__ == "__main__":
+    sys.exit(main(_ARGS))
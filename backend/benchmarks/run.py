@@ -0,0 +1,226 @@
+"""
+Offline benchmark suite for the extraction, matching and PO sync hot paths
+
+    cd backend
+    python -m benchmarks.run                         # quick profile, compared to baseline.json
+    python -m benchmarks.run --profile full          # adds 100k loop matching and 1M-line PO sets
+    python -m benchmarks.run --only matching,sync    # run some groups
+    python -m benchmarks.run --save-baseline         # record the results as the new baseline
+
+Everything runs in-process against a throwaway SQLite database: no Epicor,
+no OpenAI, no network. Results are p50/p95/p99 latency per call plus
+throughput in items per second (rows, invoices or documents).
+"""
+import argparse
+import itertools
+import logging
+import os
+import sys
+import tempfile
+
+# Point the app at a scratch workspace before anything imports app.config
+_WORKDIR = tempfile.mkdtemp(prefix="invoice-bench-")
+os.environ.setdefault("OPENAI_API_KEY", "offline-benchmark")
+os.environ.update({
+    "DATABASE_URL": f"sqlite:///{os.path.join(_WORKDIR, 'bench.db')}",
+    "UPLOAD_DIR": os.path.join(_WORKDIR, "uploads"),
+    "PO_SNAPSHOT_DIR": os.path.join(_WORKDIR, "snapshots"),
+    "EXTRACTION_WORKERS": "0",
+    "EXTRACTION_CACHE_ENABLED": "False",
+    "LLM_CACHE_ENABLED": "False",
+    "JOBS_ENABLED": "False",
+})
+
+from typing import Any, Callable, Dict, List  # noqa: E402
+from benchmarks import corpus  # noqa: E402
+from benchmarks.harness import compare, load_baseline, measure, print_table, save_baseline  # noqa: E402
+
+BASELINE_PATH = os.path.join(os.path.dirname(__file__), "baseline.json")
+
+PROFILES: Dict[str, Dict[str, List[int]]] = {
+    "quick": {
+        "text_pages": [1, 50],
+        "pdf_pages": [1, 20],
+        "loop_pos": [1_000, 10_000],
+        "matrix_pos": [1_000, 10_000, 100_000],
+        "sync_rows": [1_000, 10_000, 100_000],
+    },
+    "full": {
+        "text_pages": [1, 50, 500],
+        "pdf_pages": [1, 20, 100],
+        "loop_pos": [1_000, 10_000, 100_000],
+        "matrix_pos": [1_000, 10_000, 100_000, 1_000_000],
+        "sync_rows": [1_000, 10_000, 100_000, 1_000_000],
+    },
+}
+
+def _repeat(size: int, work_per_run: int = 200_000, low: int = 3, high: int = 200) -> int:
+    """More runs for cheap cases, fewer for expensive ones"""
+    return max(low, min(high, work_per_run // max(size, 1)))
+
+def _cycle(items: List[Any]) -> Callable[[], Any]:
+    iterator = itertools.cycle(items)
+    return lambda: next(iterator)
+
+def _po_dicts(count: int) -> List[Dict[str, Any]]:
+    from app.services.epicor_service import epicor_service
+    pos = [epicor_service._map_po_row(row) for row in corpus.baq_rows(count)]
+    for i, po in enumerate(pos, 1):
+        po["po_id"] = i
+    return pos
+
+def bench_extraction(profile: Dict[str, List[int]]) -> List[Dict[str, Any]]:
+    from app.services.invoice_extraction_service import invoice_extraction_service as service
+    results = []
+    for pages in profile["text_pages"]:
+        text = corpus.text_invoice(pages)
+        results.append(measure(f"extract_text[{pages}p]", lambda: service.extract_from_text(text),
+                               repeat=_repeat(pages, 500, 3, 200)))
+        results.append(measure(f"extract_fields.scanner[{pages}p]", lambda: service.scanner.extract(text),
+                               repeat=_repeat(pages, 500, 3, 200)))
+    for pages in profile["pdf_pages"]:
+        path = os.path.join(_WORKDIR, f"invoice_{pages}p.pdf")
+        corpus.write_pdf_invoice(path, pages)
+        repeat = _repeat(pages, 20, 2, 10)
+        results.append(measure(f"extract_pdf.lazy[{pages}p]", lambda: service.extract_from_pdf(path),
+                               repeat=repeat, items=pages))
+        results.append(measure(f"extract_pdf.full[{pages}p]", lambda: service._extract_pdf_full(path),
+                               repeat=repeat, items=pages))
+    return results
+
+def bench_matching(profile: Dict[str, List[int]]) -> List[Dict[str, Any]]:
+    from app.services.ai_matching_service import ai_matching_service as service
+    from app.services.fuzzy_matcher import POMatrix
+    from app.services.po_candidate_index import POSTINGS, POCandidateIndex, _Snapshot
+    from app.services.po_snapshot import MappedPOSnapshot, POSnapshotStore
+    store = POSnapshotStore(os.path.join(_WORKDIR, "snapshots"), keep=2)
+    results = []
+    for size in sorted(set(profile["loop_pos"]) | set(profile["matrix_pos"])):
+        pos = _po_dicts(size)
+        invoices = corpus.invoices_for(pos, 256)
+        next_invoice = _cycle(invoices)
+
+        if size in profile["loop_pos"]:
+            results.append(measure(f"fuzzy_match.loop[{size}]",
+                                   lambda: service.fuzzy_match(next_invoice(), pos),
+                                   repeat=_repeat(size, 100_000, 3, 100)))
+        if size in profile["matrix_pos"]:
+            matrix = POMatrix(pos)
+            results.append(measure(f"fuzzy_match.matrix_build[{size}]", lambda: POMatrix(pos),
+                                   repeat=_repeat(size, 1_000_000, 1, 20), warmup=0, items=size))
+            results.append(measure(f"fuzzy_match.matrix[{size}]",
+                                   lambda: service.fuzzy_match(next_invoice(), matrix),
+                                   repeat=_repeat(size, 5_000_000, 5, 200)))
+            batch = invoices[:64]
+            results.append(measure(f"fuzzy_match.batch64[{size}]",
+                                   lambda: service.fuzzy_match_batch(batch, matrix),
+                                   repeat=_repeat(size, 500_000, 2, 50), items=len(batch)))
+
+        index = POCandidateIndex()
+        results.append(measure(f"candidate_index.build[{size}]", lambda: index.build(pos),
+                               repeat=_repeat(size, 1_000_000, 1, 20), warmup=0, items=size))
+        results.append(measure(f"candidate_index.query[{size}]", lambda: index.candidates(next_invoice()),
+                               repeat=500))
+        snapshot = _Snapshot(pos, index.bucket_ratio)
+        publish = lambda: store.publish(pos, {name: getattr(snapshot, name) for name in POSTINGS},
+                                        {"bucket_log": snapshot.bucket_log})
+        results.append(measure(f"po_snapshot.publish[{size}]", publish,
+                               repeat=_repeat(size, 1_000_000, 1, 20), warmup=0, items=size))
+        path = publish()
+        results.append(measure(f"po_snapshot.attach[{size}]", lambda: MappedPOSnapshot(path), repeat=200))
+        mapped = POCandidateIndex()
+        mapped._snapshot = MappedPOSnapshot(path)
+        results.append(measure(f"po_snapshot.query[{size}]", lambda: mapped.candidates(next_invoice()),
+                               repeat=500))
+        del snapshot, mapped
+        del pos, invoices
+
+    candidates = _po_dicts(50)
+    invoice = corpus.invoices_for(candidates, 1)[0]
+    results.append(measure("prepare_pos_context[50]", lambda: service._prepare_pos_context(candidates),
+                           repeat=2000))
+    results.append(measure("prepare_invoice_context", lambda: service._prepare_invoice_context(invoice),
+                           repeat=2000))
+    return results
+
+def bench_sync(profile: Dict[str, List[int]]) -> List[Dict[str, Any]]:
+    from app.models.database import Base
+    from app.models.session import SessionLocal, engine
+    from app.services.epicor_service import epicor_service
+    from app.services.po_sync_service import po_sync_service
+    results = []
+
+    def reset():
+        Base.metadata.drop_all(bind=engine)
+        Base.metadata.create_all(bind=engine)
+
+    def sync(rows):
+        # Same path as sync_purchase_orders_from_epicor: map BAQ rows, then upsert
+        with SessionLocal() as db:
+            po_sync_service.sync(db, (epicor_service._map_po_row(row) for row in rows))
+
+    for size in profile["sync_rows"]:
+        rows = corpus.baq_rows(size)
+        repeat = _repeat(size, 300_000, 1, 10)
+        results.append(measure(f"po_sync.insert[{size}]", lambda: sync(rows),
+                               repeat=repeat, warmup=0, items=size, setup=reset))
+        reset()
+        sync(rows)
+        results.append(measure(f"po_sync.unchanged[{size}]", lambda: sync(rows),
+                               repeat=repeat, warmup=0, items=size))
+
+        step = max(1, size // 100)
+        bump = itertools.count(1)
+
+        def change_one_percent():
+            delta = next(bump)
+            for row in rows[::step]:
+                row["PODetail_DocExitCost"] += delta
+        results.append(measure(f"po_sync.update_1pct[{size}]", lambda: sync(rows),
+                               repeat=repeat, warmup=0, items=size, setup=change_one_percent))
+        del rows
+    return results
+
+GROUPS: Dict[str, Callable[[Dict[str, List[int]]], List[Dict[str, Any]]]] = {
+    "extraction": bench_extraction,
+    "matching": bench_matching,
+    "sync": bench_sync,
+}
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline benchmarks for extraction, matching and PO sync")
+    parser.add_argument("--profile", choices=sorted(PROFILES), default="quick")
+    parser.add_argument("--only", default="", help=f"comma-separated groups: {', '.join(GROUPS)}")
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--save-baseline", action="store_true", help="write these results as the baseline")
+    parser.add_argument("--threshold", type=float, default=0.25, help="p50 slowdown counted as a regression")
+    parser.add_argument("--fail-on-regression", action="store_true", help="exit 1 if anything regressed")
+    args = parser.parse_args()
+
+    logging.disable(logging.INFO)
+    selected = [g for g in args.only.split(",") if g] or list(GROUPS)
+    unknown = [g for g in selected if g not in GROUPS]
+    if unknown:
+        parser.error(f"unknown group(s): {', '.join(unknown)}")
+
+    results: List[Dict[str, Any]] = []
+    for group in selected:
+        print(f"== {group} ({args.profile})", file=sys.stderr)
+        results.extend(GROUPS[group](PROFILES[args.profile]))
+
+    baseline = None if args.save_baseline else load_baseline(args.baseline)
+    comparison = None
+    if baseline:
+        if baseline.get("profile") != args.profile:
+            print(f"note: baseline was recorded with profile '{baseline.get('profile')}'", file=sys.stderr)
+        comparison = compare(results, baseline, args.threshold)
+    print_table(results, comparison)
+
+    if args.save_baseline:
+        save_baseline(args.baseline, args.profile, results)
+        print(f"Baseline written to {args.baseline}")
+    elif comparison and args.fail_on_regression and any(row["regression"] for row in comparison):
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
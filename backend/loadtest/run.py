@@ -0,0 +1,308 @@
+"""
+Closed-loop load driver for the API, optionally against local Epicor/OpenAI stubs
+
+    cd backend
+    # Start the stubs and N API workers on a scratch database, then drive them
+    python -m loadtest.run --spawn --workers 4 --concurrency 32 --duration 60 --rows 50000
+    # Or drive an already running deployment
+    python -m loadtest.run --target http://localhost:8000 --mix upload=5,match=3,list=1
+
+`concurrency` clients each send one request at a time, choosing the endpoint
+by the weighted mix, until the duration or request count is reached. The
+report has throughput, p50/p95/p99, a latency histogram and error rates per
+scenario; --json writes the same numbers to a file.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Any, Dict, List, Optional
+import httpx
+from benchmarks import corpus
+from benchmarks.harness import percentile
+from loadtest.stubs import StubConfig, add_stub_arguments, config_from_args
+
+DEFAULT_MIX = "upload=4,match=3,list=1,pending=1,sync=0.1"
+HISTOGRAM_BUCKETS_MS = [10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000]
+
+class Recorder:
+    """Latencies, statuses and errors per scenario"""
+
+    def __init__(self):
+        self.samples: Dict[str, List[float]] = {}
+        self.statuses: Dict[str, Dict[str, int]] = {}
+        self.errors: Dict[str, Dict[str, int]] = {}
+
+    def record(self, scenario: str, seconds: float, status: str, error: Optional[str] = None):
+        self.samples.setdefault(scenario, []).append(seconds)
+        counts = self.statuses.setdefault(scenario, {})
+        counts[status] = counts.get(status, 0) + 1
+        if error:
+            errors = self.errors.setdefault(scenario, {})
+            errors[error] = errors.get(error, 0) + 1
+
+    def summary(self, elapsed: float) -> Dict[str, Any]:
+        scenarios = {}
+        for scenario, samples in sorted(self.samples.items()):
+            failed = sum(self.errors.get(scenario, {}).values())
+            ms = [s * 1000 for s in samples]
+            histogram = {}
+            for bound in HISTOGRAM_BUCKETS_MS:
+                histogram[f"<={bound}"] = sum(1 for v in ms if v <= bound)
+            histogram["+Inf"] = len(ms)  # cumulative, Prometheus style
+            scenarios[scenario] = {
+                "requests": len(samples),
+                "errors": failed,
+                "error_rate": round(failed / len(samples), 4),
+                "throughput_per_s": round(len(samples) / elapsed, 2) if elapsed > 0 else None,
+                "p50_ms": round(percentile(ms, 50), 2),
+                "p95_ms": round(percentile(ms, 95), 2),
+                "p99_ms": round(percentile(ms, 99), 2),
+                "max_ms": round(max(ms), 2),
+                "statuses": self.statuses.get(scenario, {}),
+                "error_kinds": self.errors.get(scenario, {}),
+                "histogram_ms": histogram,
+            }
+        total = sum(s["requests"] for s in scenarios.values())
+        failed = sum(s["errors"] for s in scenarios.values())
+        return {
+            "elapsed_seconds": round(elapsed, 2),
+            "requests": total,
+            "errors": failed,
+            "error_rate": round(failed / total, 4) if total else 0.0,
+            "throughput_per_s": round(total / elapsed, 2) if elapsed > 0 else None,
+            "scenarios": scenarios,
+        }
+
+class LoadDriver:
+    """Sends the scenario mix and tracks the invoices it created for match requests"""
+
+    def __init__(self, client: httpx.AsyncClient, mix: Dict[str, float], stub_config: StubConfig,
+                 recorder: Recorder, seed: int = 5):
+        self.client = client
+        self.scenarios = list(mix)
+        self.weights = [mix[name] for name in self.scenarios]
+        self.recorder = recorder
+        self.rng = random.Random(seed)
+        # Same rows the BAQ stub serves, so uploaded invoices have real matches
+        self.po_rows = corpus.baq_rows(stub_config.rows, seed=stub_config.seed)
+        self.invoice_ids: List[int] = []
+        self._uploads = 0
+
+    async def run_client(self, deadline: float, budget: List[int]):
+        while time.monotonic() < deadline and budget[0] != 0:
+            budget[0] -= 1
+            scenario = self.rng.choices(self.scenarios, self.weights)[0]
+            await self.run_scenario(scenario)
+
+    async def run_scenario(self, scenario: str):
+        if scenario == "match" and not self.invoice_ids:
+            scenario = "upload"  # nothing to match yet
+        started = time.perf_counter()
+        try:
+            response = await getattr(self, f"_{scenario.replace('-', '_')}")()
+        except httpx.HTTPError as e:
+            self.recorder.record(scenario, time.perf_counter() - started, "exception", type(e).__name__)
+            return
+        elapsed = time.perf_counter() - started
+        error = f"HTTP {response.status_code}" if response.status_code >= 400 else None
+        self.recorder.record(scenario, elapsed, str(response.status_code), error)
+
+    def _invoice_file(self) -> Dict[str, Any]:
+        self._uploads += 1
+        row = self.rng.choice(self.po_rows)
+        text = "\n".join([
+            row["Vendor_Name"],
+            "",
+            f"Invoice Number: LT-{os.getpid()}-{self._uploads:07d}",
+            f"Invoice Date: {self.rng.randint(1, 12):02d}/{self.rng.randint(1, 28):02d}/2024",
+            f"Purchase Order: {row['PODetail_PONUM']}",
+            "",
+            f"{row['PODetail_PartNum']}  {row['PODetail_LineDesc']}  {row['PODetail_OrderQty']}  "
+            f"{row['PODetail_UnitCost']:.2f}  {row['PODetail_DocExitCost']:,.2f}",
+            "",
+            f"TOTAL AMOUNT DUE: {row['PODetail_DocExitCost']:,.2f}",
+        ])
+        return {"file": (f"loadtest-{self._uploads}.txt", text.encode(), "text/plain")}
+
+    async def _upload(self) -> httpx.Response:
+        response = await self.client.post("/api/invoices/upload", files=self._invoice_file())
+        if response.status_code == 200:
+            self.invoice_ids.append(response.json()["invoice_id"])
+        return response
+
+    async def _upload_async(self) -> httpx.Response:
+        return await self.client.post("/api/invoices/upload-async", files=self._invoice_file())
+
+    async def _match(self) -> httpx.Response:
+        invoice_id = self.rng.choice(self.invoice_ids)
+        return await self.client.post(f"/api/invoices/match/{invoice_id}")
+
+    async def _list(self) -> httpx.Response:
+        return await self.client.get("/api/purchase-orders/")
+
+    async def _pending(self) -> httpx.Response:
+        return await self.client.get("/api/invoices/pending-matches")
+
+    async def _sync(self) -> httpx.Response:
+        return await self.client.get("/api/purchase-orders/sync-from-epicor", params={"delta": "false"})
+
+SCENARIOS = ["upload", "upload-async", "match", "list", "pending", "sync"]
+
+def parse_mix(value: str) -> Dict[str, float]:
+    mix = {}
+    for part in value.split(","):
+        name, _, weight = part.partition("=")
+        name = name.strip()
+        if name not in SCENARIOS:
+            raise argparse.ArgumentTypeError(f"unknown scenario '{name}' (choose from {', '.join(SCENARIOS)})")
+        mix[name] = float(weight or 1)
+    if not any(mix.values()):
+        raise argparse.ArgumentTypeError("mix needs at least one positive weight")
+    return mix
+
+def _wait_ready(url: str, timeout: float = 120.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if httpx.get(url, timeout=2).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.5)
+    raise RuntimeError(f"{url} did not become ready within {timeout:.0f}s")
+
+def spawn(args: argparse.Namespace) -> List[subprocess.Popen]:
+    """Start the stubs and the API (uvicorn, args.workers processes) on a scratch workspace"""
+    backend_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    workdir = tempfile.mkdtemp(prefix="invoice-load-")
+    stub_url = f"http://127.0.0.1:{args.stub_port}"
+    stub_args = [f"--rows={args.rows}", f"--baq-latency-ms={args.baq_latency_ms}",
+                 f"--baq-error-rate={args.baq_error_rate}", f"--llm-latency-ms={args.llm_latency_ms}",
+                 f"--llm-error-rate={args.llm_error_rate}", f"--jitter={args.jitter}", f"--seed={args.seed}"]
+    env = dict(os.environ)
+    env.update({
+        "DATABASE_URL": f"sqlite:///{os.path.join(workdir, 'load.db')}",
+        "UPLOAD_DIR": os.path.join(workdir, "uploads"),
+        "PO_SNAPSHOT_DIR": os.path.join(workdir, "snapshots"),
+        "EPICOR_API_URL": f"{stub_url}/api/v2",
+        "OPENAI_BASE_URL": f"{stub_url}/v1",
+        "OPENAI_API_KEY": "load-test",
+        "DEBUG": "False",
+    })
+    env.update(dict(item.split("=", 1) for item in args.env))
+
+    processes = [subprocess.Popen(
+        [sys.executable, "-m", "loadtest.stubs", f"--port={args.stub_port}", *stub_args],
+        cwd=backend_dir, env=env
+    )]
+    try:
+        _wait_ready(f"{stub_url}/health")
+        processes.append(subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "app.main:app", "--host=127.0.0.1", f"--port={args.port}",
+             f"--workers={args.workers}", "--log-level=warning"],
+            cwd=backend_dir, env=env
+        ))
+        _wait_ready(f"http://127.0.0.1:{args.port}/health")
+    except BaseException:
+        stop(processes)
+        raise
+    print(f"Spawned stubs on :{args.stub_port} and {args.workers} API worker(s) on :{args.port} "
+          f"(workspace {workdir})", file=sys.stderr)
+    return processes
+
+def stop(processes: List[subprocess.Popen]):
+    for process in reversed(processes):
+        process.terminate()
+    for process in processes:
+        try:
+            process.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            process.kill()
+
+async def drive(args: argparse.Namespace, target: str) -> Dict[str, Any]:
+    recorder = Recorder()
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=target, timeout=args.timeout, limits=limits) as client:
+        driver = LoadDriver(client, args.mix, config_from_args(args), recorder, seed=args.seed)
+        if not args.skip_initial_sync:
+            # Load the PO table before measuring; not part of the results
+            response = await client.get("/api/purchase-orders/sync-from-epicor", timeout=None)
+            print(f"Initial sync: HTTP {response.status_code} {response.text[:200]}", file=sys.stderr)
+
+        budget = [args.requests or -1]
+        deadline = time.monotonic() + (args.duration if not args.requests else float("inf"))
+        started = time.perf_counter()
+        await asyncio.gather(*(driver.run_client(deadline, budget) for _ in range(args.concurrency)))
+        return recorder.summary(time.perf_counter() - started)
+
+def print_report(summary: Dict[str, Any], args: argparse.Namespace):
+    header = (f"{'scenario':<14} {'reqs':>7} {'req/s':>8} {'err %':>7} {'p50 ms':>9} "
+              f"{'p95 ms':>9} {'p99 ms':>9} {'max ms':>9}")
+    print(f"\nconcurrency {args.concurrency}, {summary['elapsed_seconds']}s, {summary['requests']} requests, "
+          f"{summary['throughput_per_s']} req/s, error rate {summary['error_rate'] * 100:.2f}%")
+    print(header)
+    print("-" * len(header))
+    for name, s in summary["scenarios"].items():
+        print(f"{name:<14} {s['requests']:>7} {s['throughput_per_s'] or 0:>8.2f} {s['error_rate'] * 100:>6.2f}% "
+              f"{s['p50_ms']:>9.1f} {s['p95_ms']:>9.1f} {s['p99_ms']:>9.1f} {s['max_ms']:>9.1f}")
+
+    print("\nlatency histogram (requests per bucket, ms)")
+    bounds = [f"<={b}" for b in HISTOGRAM_BUCKETS_MS] + ["+Inf"]
+    print(f"{'scenario':<14} " + " ".join(f"{b:>7}" for b in bounds))
+    for name, s in summary["scenarios"].items():
+        previous = 0
+        cells = []
+        for bound in bounds:
+            cumulative = s["histogram_ms"][bound]
+            cells.append(f"{cumulative - previous:>7}")
+            previous = cumulative
+        print(f"{name:<14} " + " ".join(cells))
+
+    errors = {name: s["error_kinds"] for name, s in summary["scenarios"].items() if s["error_kinds"]}
+    if errors:
+        print("\nerrors")
+        for name, kinds in errors.items():
+            print(f"{name:<14} " + ", ".join(f"{kind}: {count}" for kind, count in sorted(kinds.items())))
+    sys.stdout.flush()
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the invoice matching API")
+    parser.add_argument("--target", default="", help="base URL of a running API (default: spawned or :8000)")
+    parser.add_argument("--spawn", action="store_true", help="start the stubs and the API locally")
+    parser.add_argument("--port", type=int, default=8765, help="API port when spawning")
+    parser.add_argument("--stub-port", type=int, default=9100)
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn worker processes when spawning")
+    parser.add_argument("--env", action="append", default=[], metavar="KEY=VALUE",
+                        help="extra API environment when spawning, e.g. JOB_WORKERS=8")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--duration", type=float, default=30.0, help="seconds")
+    parser.add_argument("--requests", type=int, default=0, help="stop after this many requests instead")
+    parser.add_argument("--mix", type=parse_mix, default=parse_mix(DEFAULT_MIX),
+                        help=f"weighted scenarios (default {DEFAULT_MIX}); choose from {', '.join(SCENARIOS)}")
+    parser.add_argument("--timeout", type=float, default=120.0, help="per-request timeout in seconds")
+    parser.add_argument("--skip-initial-sync", action="store_true")
+    parser.add_argument("--json", default="", help="also write the summary to this file")
+    add_stub_arguments(parser)
+    args = parser.parse_args()
+
+    processes = spawn(args) if args.spawn else []
+    try:
+        target = args.target or f"http://127.0.0.1:{args.port if args.spawn else 8000}"
+        summary = asyncio.run(drive(args, target))
+    finally:
+        stop(processes)
+
+    print_report(summary, args)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"config": {k: v for k, v in vars(args).items()}, "summary": summary}, f, indent=2)
+        print(f"Summary written to {args.json}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,165 @@
+"""
+Local stand-ins for the Epicor BAQ service and the OpenAI chat-completions API
+
+    cd backend
+    python -m loadtest.stubs --port 9100 --rows 100000 --baq-latency-ms 150 --llm-latency-ms 1200
+
+One app serves both:
+    GET  /api/v2/BaqSvc/{baq_id}     OData $top/$skip paging over a synthetic PO set
+    POST /v1/chat/completions        OpenAI-compatible answers to the matching prompts
+Point EPICOR_API_URL at http://host:port/api/v2 and OPENAI_BASE_URL at
+http://host:port/v1. Latency (with jitter) and error rate are set per service.
+"""
+import argparse
+import asyncio
+import json
+import random
+import re
+import time
+from typing import Any, Dict, List, NamedTuple, Optional
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+from benchmarks import corpus
+
+class StubConfig(NamedTuple):
+    rows: int = 10_000
+    baq_latency_ms: float = 100.0
+    baq_error_rate: float = 0.0
+    llm_latency_ms: float = 800.0
+    llm_error_rate: float = 0.0
+    jitter: float = 0.25  # +/- fraction applied to every latency
+    seed: int = 11
+
+# JSON blocks in AIMatchingService._create_matching_prompt, each followed by a blank line
+_SECTION = re.compile(r"^(?:INVOICE DATA|AVAILABLE PURCHASE ORDERS[^:\n]*):\n(.*?)\n\n", re.S | re.M)
+
+def _delay(config: StubConfig, latency_ms: float, rng: random.Random) -> float:
+    return max(0.0, latency_ms * (1 + rng.uniform(-config.jitter, config.jitter)) / 1000)
+
+def _sections(prompt: str) -> List[Any]:
+    """The invoice and PO JSON blocks of a matching prompt, where present"""
+    blocks = []
+    for block in _SECTION.findall(prompt):
+        try:
+            blocks.append(json.loads(block))
+        except ValueError:
+            blocks.append(None)
+    return blocks
+
+def answer_prompt(prompt: str) -> str:
+    """
+    Deterministic model answer: the candidate PO whose line amount is closest
+    to the invoice amount, or a validation verdict for validate prompts
+    """
+    blocks = _sections(prompt)
+    if len(blocks) < 2 or not isinstance(blocks[1], list) or not blocks[1]:
+        return json.dumps({
+            "is_valid": True,
+            "confidence": 80,
+            "discrepancies": [],
+            "recommendation": "review"
+        })
+
+    invoice, pos = blocks[0] or {}, blocks[1]
+    amount = invoice.get("invoice_amount") or 0.0
+
+    def distance(po: Dict[str, Any]) -> float:
+        return abs((po.get("line_amount") or 0.0) - amount)
+
+    ranked = sorted(pos, key=distance)
+    best = ranked[0]
+    score = 0.95 if amount and distance(best) <= 0.05 * amount else 0.6
+    return json.dumps({
+        "best_match": {
+            "po_number": best.get("po_number"),
+            "po_line": best.get("po_line"),
+            "match_score": score,
+            "matching_criteria": ["amount match"] if score > 0.9 else ["closest amount"]
+        },
+        "alternative_matches": [
+            {"po_number": po.get("po_number"), "po_line": po.get("po_line"),
+             "match_score": 0.5, "matching_criteria": ["vendor match"]}
+            for po in ranked[1:3]
+        ],
+        "confidence": score,
+        "reasoning": f"Stub: closest line amount to {amount}"
+    })
+
+def create_app(config: Optional[StubConfig] = None) -> FastAPI:
+    config = config or StubConfig()
+    rows = corpus.baq_rows(config.rows, seed=config.seed)
+    rng = random.Random(config.seed)
+    app = FastAPI(title="Epicor BAQ and OpenAI stubs")
+
+    @app.get("/health")
+    def health():
+        return {"status": "healthy", "rows": len(rows)}
+
+    @app.get("/api/v2/BaqSvc/{baq_id}")
+    async def baq(baq_id: str, request: Request):
+        await asyncio.sleep(_delay(config, config.baq_latency_ms, rng))
+        if rng.random() < config.baq_error_rate:
+            return JSONResponse({"ErrorMessage": "Stub: BAQ service unavailable"}, status_code=503)
+        # $filter and $orderby are accepted but not applied: the set is already ordered
+        skip = int(request.query_params.get("$skip", 0))
+        top = request.query_params.get("$top")
+        page = rows[skip:skip + int(top)] if top is not None else rows[skip:]
+        return {"odata.metadata": f"{request.base_url}api/v2/BaqSvc/$metadata#{baq_id}", "value": page}
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        await asyncio.sleep(_delay(config, config.llm_latency_ms, rng))
+        if rng.random() < config.llm_error_rate:
+            return JSONResponse(
+                {"error": {"message": "Stub: rate limit reached", "type": "rate_limit_error",
+                           "code": "rate_limit_exceeded"}},
+                status_code=429
+            )
+        prompt = "\n".join(m.get("content") or "" for m in body.get("messages", []))
+        content = answer_prompt(prompt)
+        prompt_tokens = len(prompt) // 4
+        completion_tokens = len(content) // 4
+        return {
+            "id": f"chatcmpl-stub-{rng.getrandbits(32):08x}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model", "stub"),
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": content},
+                "finish_reason": "stop"
+            }],
+            "usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens
+            }
+        }
+
+    return app
+
+def add_stub_arguments(parser: argparse.ArgumentParser):
+    defaults = StubConfig()
+    parser.add_argument("--rows", type=int, default=defaults.rows, help="PO lines served by the BAQ stub")
+    parser.add_argument("--baq-latency-ms", type=float, default=defaults.baq_latency_ms)
+    parser.add_argument("--baq-error-rate", type=float, default=defaults.baq_error_rate)
+    parser.add_argument("--llm-latency-ms", type=float, default=defaults.llm_latency_ms)
+    parser.add_argument("--llm-error-rate", type=float, default=defaults.llm_error_rate)
+    parser.add_argument("--jitter", type=float, default=defaults.jitter)
+    parser.add_argument("--seed", type=int, default=defaults.seed)
+
+def config_from_args(args: argparse.Namespace) -> StubConfig:
+    return StubConfig(*(getattr(args, field) for field in StubConfig._fields))
+
+def main():
+    import uvicorn
+    parser = argparse.ArgumentParser(description="Serve local Epicor BAQ and OpenAI stand-ins")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9100)
+    add_stub_arguments(parser)
+    args = parser.parse_args()
+    uvicorn.run(create_app(config_from_args(args)), host=args.host, port=args.port, log_level="warning")
+
+if __name__ == "__main__":
+    main()
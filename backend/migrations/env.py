@@ -0,0 +1,49 @@
+"""Alembic environment: migrates DATABASE_URL against the app's models"""
+from logging.config import fileConfig
+from alembic import context
+from sqlalchemy import create_engine
+from app.config import settings
+from app.models.database import Base
+
+config = context.config
+target_metadata = Base.metadata
+
+# The app passes its own connection (see app.models.migrations) and keeps its logging
+connection = config.attributes.get("connection")
+if connection is None and config.config_file_name is not None:
+    fileConfig(config.config_file_name)
+
+def _configure(**kwargs):
+    context.configure(
+        target_metadata=target_metadata,
+        # SQLite cannot ALTER constraints; batch mode rebuilds the table instead
+        render_as_batch=True,
+        compare_type=True,
+        **kwargs
+    )
+
+def run_migrations_offline():
+    """Emit SQL for DATABASE_URL without connecting (alembic upgrade --sql)"""
+    _configure(url=settings.DATABASE_URL, literal_binds=True, dialect_opts={"paramstyle": "named"})
+    with context.begin_transaction():
+        context.run_migrations()
+
+def run_migrations_online():
+    if connection is not None:
+        _configure(connection=connection)
+        with context.begin_transaction():
+            context.run_migrations()
+        return
+    engine = create_engine(settings.DATABASE_URL)
+    try:
+        with engine.connect() as conn:
+            _configure(connection=conn)
+            with context.begin_transaction():
+                context.run_migrations()
+    finally:
+        engine.dispose()
+
+if context.is_offline_mode():
+    run_migrations_offline()
+else:
+    run_migrations_online()
@@ -0,0 +1,74 @@
+"""Initial schema: purchase orders, invoices and matches
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-18
+
+Matches what Base.metadata.create_all produced before migrations existed,
+so those databases are stamped at this revision and upgraded from here.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0001"
+down_revision = None
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    op.create_table(
+        "purchase_orders",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("po_number", sa.String()),
+        sa.Column("po_line", sa.Integer()),
+        sa.Column("vendor_id", sa.String()),
+        sa.Column("vendor_name", sa.String()),
+        sa.Column("line_description", sa.String()),
+        sa.Column("line_amount", sa.Float()),
+        sa.Column("received_amount", sa.Float()),
+        sa.Column("remaining_amount", sa.Float()),
+        sa.Column("due_date", sa.DateTime()),
+        sa.Column("created_date", sa.DateTime()),
+        sa.Column("updated_date", sa.DateTime()),
+    )
+    op.create_index("ix_purchase_orders_id", "purchase_orders", ["id"])
+    op.create_index("ix_purchase_orders_po_number", "purchase_orders", ["po_number"], unique=True)
+
+    op.create_table(
+        "invoices",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("invoice_number", sa.String()),
+        sa.Column("vendor_id", sa.String()),
+        sa.Column("vendor_name", sa.String()),
+        sa.Column("invoice_date", sa.DateTime()),
+        sa.Column("invoice_amount", sa.Float()),
+        sa.Column("invoice_type", sa.String()),
+        sa.Column("file_path", sa.String()),
+        sa.Column("extracted_data", sa.Text()),
+        sa.Column("created_date", sa.DateTime()),
+        sa.Column("updated_date", sa.DateTime()),
+        sa.Column("purchase_order_id", sa.Integer(), sa.ForeignKey("purchase_orders.id"), nullable=True),
+    )
+    op.create_index("ix_invoices_id", "invoices", ["id"])
+    op.create_index("ix_invoices_invoice_number", "invoices", ["invoice_number"])
+
+    op.create_table(
+        "invoice_matches",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("invoice_id", sa.Integer(), sa.ForeignKey("invoices.id")),
+        sa.Column("po_id", sa.Integer(), sa.ForeignKey("purchase_orders.id")),
+        sa.Column("match_score", sa.Float()),
+        sa.Column("matched_amount", sa.Float()),
+        sa.Column("match_type", sa.String()),
+        sa.Column("ai_reasoning", sa.Text()),
+        sa.Column("is_approved", sa.Boolean()),
+        sa.Column("approved_by", sa.String(), nullable=True),
+        sa.Column("approved_date", sa.DateTime(), nullable=True),
+        sa.Column("created_date", sa.DateTime()),
+    )
+    op.create_index("ix_invoice_matches_id", "invoice_matches", ["id"])
+
+def downgrade():
+    op.drop_table("invoice_matches")
+    op.drop_table("invoices")
+    op.drop_table("purchase_orders")
@@ -0,0 +1,109 @@
+"""Matching pipeline schema: per-line PO key, row hash, sync state, caches and jobs
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-18
+
+Databases adopted from create_all may already have some of these tables or
+columns (create_all adds missing tables but never alters existing ones), so
+each step only runs when its object is missing.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0002"
+down_revision = "0001"
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    if op.get_context().as_sql:
+        # Offline (--sql): emit the full upgrade from revision 0001
+        tables, columns, uniques = set(), set(), set()
+        old_key = {"unique": True}
+    else:
+        inspector = sa.inspect(op.get_bind())
+        tables = set(inspector.get_table_names())
+        columns = {c["name"] for c in inspector.get_columns("purchase_orders")}
+        uniques = {u["name"] for u in inspector.get_unique_constraints("purchase_orders")}
+        old_key = {i["name"]: i for i in inspector.get_indexes("purchase_orders")}.get("ix_purchase_orders_po_number")
+
+    # BAQ rows are per PO line: the key moves from po_number to (po_number, po_line)
+    if "row_hash" not in columns or (old_key and old_key["unique"]) or "uq_purchase_orders_po_line" not in uniques:
+        with op.batch_alter_table("purchase_orders") as batch_op:
+            if "row_hash" not in columns:
+                batch_op.add_column(sa.Column("row_hash", sa.String(40)))
+            if old_key and old_key["unique"]:
+                batch_op.drop_index("ix_purchase_orders_po_number")
+                batch_op.create_index("ix_purchase_orders_po_number", ["po_number"])
+            if "uq_purchase_orders_po_line" not in uniques:
+                batch_op.create_unique_constraint("uq_purchase_orders_po_line", ["po_number", "po_line"])
+
+    if "sync_state" not in tables:
+        op.create_table(
+            "sync_state",
+            sa.Column("name", sa.String(), primary_key=True),
+            sa.Column("watermark", sa.String(), nullable=True),
+            sa.Column("last_synced", sa.DateTime(), nullable=True),
+            sa.Column("last_row_count", sa.Integer()),
+        )
+
+    if "llm_cache" not in tables:
+        op.create_table(
+            "llm_cache",
+            sa.Column("cache_key", sa.String(64), primary_key=True),
+            sa.Column("kind", sa.String()),
+            sa.Column("model", sa.String()),
+            sa.Column("response", sa.Text()),
+            sa.Column("created_date", sa.DateTime()),
+            sa.Column("expires_at", sa.DateTime()),
+        )
+        op.create_index("ix_llm_cache_kind", "llm_cache", ["kind"])
+        op.create_index("ix_llm_cache_expires_at", "llm_cache", ["expires_at"])
+
+    if "extraction_cache" not in tables:
+        op.create_table(
+            "extraction_cache",
+            sa.Column("file_hash", sa.String(64), primary_key=True),
+            sa.Column("extractor_version", sa.String(16), primary_key=True),
+            sa.Column("result", sa.Text()),
+            sa.Column("hits", sa.Integer()),
+            sa.Column("created_date", sa.DateTime()),
+            sa.Column("last_hit_date", sa.DateTime()),
+        )
+        op.create_index("ix_extraction_cache_extractor_version", "extraction_cache", ["extractor_version"])
+
+    if "jobs" not in tables:
+        op.create_table(
+            "jobs",
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("stage", sa.String()),
+            sa.Column("status", sa.String()),
+            sa.Column("file_path", sa.String()),
+            sa.Column("filename", sa.String()),
+            sa.Column("invoice_id", sa.Integer(), sa.ForeignKey("invoices.id"), nullable=True),
+            sa.Column("match_id", sa.Integer(), sa.ForeignKey("invoice_matches.id"), nullable=True),
+            sa.Column("attempts", sa.Integer()),
+            sa.Column("max_attempts", sa.Integer()),
+            sa.Column("next_run_at", sa.DateTime()),
+            sa.Column("locked_by", sa.String(), nullable=True),
+            sa.Column("locked_at", sa.DateTime(), nullable=True),
+            sa.Column("last_error", sa.Text(), nullable=True),
+            sa.Column("result", sa.Text(), nullable=True),
+            sa.Column("created_date", sa.DateTime()),
+            sa.Column("updated_date", sa.DateTime()),
+        )
+        op.create_index("ix_jobs_id", "jobs", ["id"])
+        op.create_index("ix_jobs_status_next_run", "jobs", ["status", "next_run_at"])
+
+def downgrade():
+    op.drop_table("jobs")
+    op.drop_table("extraction_cache")
+    op.drop_table("llm_cache")
+    op.drop_table("sync_state")
+    # Fails if a PO now has several lines, as the old key cannot hold them
+    with op.batch_alter_table("purchase_orders") as batch_op:
+        batch_op.drop_constraint("uq_purchase_orders_po_line", type_="unique")
+        batch_op.drop_index("ix_purchase_orders_po_number")
+        batch_op.create_index("ix_purchase_orders_po_number", ["po_number"], unique=True)
+        batch_op.drop_column("row_hash")
@@ -0,0 +1,85 @@
+"""Indexes for the hot filters and foreign-key joins
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-18
+
+- ix_purchase_orders_open: partial index of open lines (remaining_amount > 0)
+  in id order, for the candidate index rebuild and open_only listing pages
+- ix_purchase_orders_vendor_id / ix_purchase_orders_due_date: listing filters
+- ix_invoice_matches_pending: partial index of unapproved matches, the review queue
+- Foreign-key indexes on invoices, invoice_matches and jobs
+- ix_purchase_orders_po_number is dropped; the (po_number, po_line) unique
+  index already serves po_number lookups
+
+On PostgreSQL the indexes are built CONCURRENTLY so a large table stays
+writable while this runs. Indexes that already exist are left alone.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0003"
+down_revision = "0002"
+branch_labels = None
+depends_on = None
+
+# name -> (table, columns, extra create_index arguments)
+INDEXES = {
+    "ix_purchase_orders_open": ("purchase_orders", ["id"], {
+        "postgresql_where": sa.text("remaining_amount > 0"),
+        "sqlite_where": sa.text("remaining_amount > 0"),
+    }),
+    "ix_purchase_orders_vendor_id": ("purchase_orders", ["vendor_id", "id"], {}),
+    "ix_purchase_orders_due_date": ("purchase_orders", ["due_date"], {}),
+    "ix_invoices_purchase_order_id": ("invoices", ["purchase_order_id", "id"], {}),
+    "ix_invoice_matches_invoice_id": ("invoice_matches", ["invoice_id"], {}),
+    "ix_invoice_matches_po_id": ("invoice_matches", ["po_id"], {}),
+    "ix_invoice_matches_pending": ("invoice_matches", ["id"], {
+        "postgresql_where": sa.text("is_approved = false"),
+        "sqlite_where": sa.text("is_approved = 0"),
+    }),
+    "ix_jobs_invoice_id": ("jobs", ["invoice_id"], {}),
+    "ix_jobs_match_id": ("jobs", ["match_id"], {}),
+}
+
+def _existing_indexes():
+    if op.get_context().as_sql:
+        # Offline (--sql): assume the schema revision 0002 creates
+        return {"ix_purchase_orders_po_number"}
+    inspector = sa.inspect(op.get_bind())
+    names = set()
+    for table in {table for table, _, _ in INDEXES.values()}:
+        names.update(i["name"] for i in inspector.get_indexes(table))
+    return names
+
+def _run(statements):
+    """Run index DDL, outside the migration transaction on PostgreSQL"""
+    if op.get_bind().dialect.name == "postgresql":
+        with op.get_context().autocommit_block():
+            for statement in statements:
+                statement(postgresql_concurrently=True)
+    else:
+        for statement in statements:
+            statement()
+
+def upgrade():
+    existing = _existing_indexes()
+    statements = []
+    if "ix_purchase_orders_po_number" in existing:
+        statements.append(lambda **kw: op.drop_index("ix_purchase_orders_po_number", "purchase_orders", **kw))
+    for name, (table, columns, extra) in INDEXES.items():
+        if name not in existing:
+            statements.append(
+                lambda name=name, table=table, columns=columns, extra=extra, **kw:
+                    op.create_index(name, table, columns, **extra, **kw)
+            )
+    _run(statements)
+
+def downgrade():
+    existing = _existing_indexes()
+    statements = [
+        lambda name=name, table=table, **kw: op.drop_index(name, table, **kw)
+        for name, (table, _, _) in INDEXES.items() if name in existing
+    ]
+    statements.append(lambda **kw: op.create_index("ix_purchase_orders_po_number", "purchase_orders", ["po_number"], **kw))
+    _run(statements)
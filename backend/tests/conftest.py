@@ -0,0 +1,31 @@
+"""Test settings; app.config reads the environment once, at import"""
+import os
+import tempfile
+import pytest
+
+_DB_DIR = tempfile.mkdtemp(prefix="invoice-tests-")
+
+os.environ.update({
+    "DATABASE_URL": f"sqlite:///{os.path.join(_DB_DIR, 'test.db')}",
+    "OPENAI_API_KEY": "test",
+    "JOBS_ENABLED": "False",
+    "EXTRACTION_WORKERS": "0",
+    "DB_AUTO_MIGRATE": "False",
+    "PO_SNAPSHOT_ENABLED": "False",
+    "UPLOAD_DIR": os.path.join(_DB_DIR, "uploads"),
+})
+
+# Only now, with the environment above in place
+from app.models.database import Base  # noqa: E402
+from app.models.session import SessionLocal, engine  # noqa: E402
+
+@pytest.fixture
+def db():
+    """Session on a freshly created schema"""
+    Base.metadata.create_all(engine)
+    session = SessionLocal()
+    try:
+        yield session
+    finally:
+        session.close()
+        Base.metadata.drop_all(engine)
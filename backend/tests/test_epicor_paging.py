@@ -0,0 +1,39 @@
+"""BAQ paging: every row once, and no extra requests at a normal last page"""
+import threading
+import pytest
+from app.services.epicor_service import EpicorService
+
+class FakeBAQ:
+    """Serves rows by $top/$skip, capping $top at cap like some OData servers do"""
+
+    def __init__(self, rows: int, cap: int = 10_000):
+        self.rows = [{"PODetail_PONUM": "PO-1", "PODetail_POLine": i} for i in range(rows)]
+        self.cap = cap
+        self.requests = []
+        self._lock = threading.Lock()
+
+    def fetch(self, url, skip, top, changed_since=None):
+        with self._lock:
+            self.requests.append((skip, top))
+        return self.rows[skip:skip + min(top, self.cap)]
+
+def stream(monkeypatch, baq: FakeBAQ, page_size: int, concurrency: int):
+    service = EpicorService()
+    monkeypatch.setattr(service, "_fetch_page", baq.fetch)
+    return [po["po_line"] for po in service.iter_purchase_orders(page_size=page_size, max_concurrency=concurrency)]
+
+@pytest.mark.parametrize("rows", [0, 7, 30, 95])
+@pytest.mark.parametrize("concurrency", [1, 4])
+def test_short_last_page_ends_without_repaging(monkeypatch, rows, concurrency):
+    baq = FakeBAQ(rows)
+    assert stream(monkeypatch, baq, 10, concurrency) == list(range(rows))
+    # One request per page plus the empty one, and whatever was already in flight
+    assert len(baq.requests) <= rows // 10 + 1 + concurrency
+    assert {top for _, top in baq.requests} == {10}
+
+# The cap shows once a short page is followed by more rows, i.e. past one page
+@pytest.mark.parametrize("rows", [13, 30, 95])
+@pytest.mark.parametrize("concurrency", [1, 4])
+def test_server_cap_below_page_size_still_returns_every_row(monkeypatch, rows, concurrency):
+    baq = FakeBAQ(rows, cap=3)
+    assert stream(monkeypatch, baq, 10, concurrency) == list(range(rows))
@@ -0,0 +1,56 @@
+"""Extraction cache keys: file content hash and extractor version"""
+import asyncio
+import hashlib
+from app.config import settings
+from app.services.extraction_cache_service import ExtractionCacheService
+from app.services.field_scanner import DEFAULT_RULES, FieldRule, FieldScanner
+from app.services import invoice_extraction_service as invoice_extraction_module
+from app.services.invoice_extraction_service import InvoiceExtractionService
+from app.services.upload_storage_service import file_sha256
+
+def test_file_hash_is_the_content_sha256_for_any_chunk_size(tmp_path):
+    path = tmp_path / "invoice.txt"
+    data = b"Invoice Number: INV-1\n" * 1000
+    path.write_bytes(data)
+    expected = hashlib.sha256(data).hexdigest()
+    assert file_sha256(str(path)) == expected
+    assert file_sha256(str(path), chunk_size=7) == expected
+
+def test_extractor_version_is_stable():
+    assert InvoiceExtractionService().extractor_version == InvoiceExtractionService().extractor_version
+
+def test_extractor_version_follows_the_rules():
+    service = InvoiceExtractionService()
+    base = service.extractor_version
+    changed = InvoiceExtractionService()
+    changed.scanner = FieldScanner(DEFAULT_RULES + [FieldRule("po_reference", r"(REQ-\d+)", 0.5)])
+    assert changed.extractor_version != base
+
+def test_extractor_version_follows_the_pdf_mode(monkeypatch):
+    base = InvoiceExtractionService().extractor_version
+    monkeypatch.setattr(settings, "PDF_EXTRACTION_MODE", "full" if settings.PDF_EXTRACTION_MODE != "full" else "lazy")
+    assert InvoiceExtractionService().extractor_version != base
+
+def test_cache_is_keyed_on_hash_and_version(db):
+    cache = ExtractionCacheService(enabled=True)
+    cache.set("a" * 64, "v1", {"invoice_number": "INV-1"})
+    assert cache.get("a" * 64, "v1") == {"invoice_number": "INV-1"}
+    assert cache.get("a" * 64, "v2") is None
+    assert cache.get("b" * 64, "v1") is None
+
+def test_same_bytes_are_extracted_once(db, tmp_path, monkeypatch):
+    monkeypatch.setattr(invoice_extraction_module, "extraction_cache_service", ExtractionCacheService(enabled=True))
+    service = InvoiceExtractionService()
+    calls = []
+
+    async def extract(file_path):
+        calls.append(file_path)
+        return {"invoice_number": "INV-1"}
+
+    monkeypatch.setattr(service, "_extract_in_pool", extract)
+    first, second = tmp_path / "a.txt", tmp_path / "b.txt"
+    first.write_bytes(b"same bytes")
+    second.write_bytes(b"same bytes")
+    assert asyncio.run(service.extract_from_file_async(str(first))) == {"invoice_number": "INV-1"}
+    assert asyncio.run(service.extract_from_file_async(str(second))) == {"invoice_number": "INV-1"}
+    assert calls == [str(first)]
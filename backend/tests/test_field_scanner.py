@@ -0,0 +1,74 @@
+"""FieldScanner rules: default extraction, rule priority and rule-set validation"""
+import json
+import pytest
+from app.services.field_scanner import FieldRule, FieldScanner
+
+INVOICE = """ACME Corporation
+Invoice Department
+
+Invoice Number: INV-2024-001001
+Invoice Date: 02/10/2024
+Due Date: 03/10/2024
+PO Number: PO-2024-1001
+
+Item   Qty  Price
+Widget 2    1,250.00
+Subtotal: 2,500.00
+Tax: 254.00
+Total Amount Due: $2,754.00
+"""
+
+def values(scanner: FieldScanner, text: str):
+    return {field: candidate.value for field, candidate in scanner.extract(text).items()}
+
+def test_default_rules_read_a_text_invoice():
+    assert values(FieldScanner(), INVOICE) == {
+        "vendor_name": "ACME Corporation",
+        "invoice_number": "INV-2024-001001",
+        "invoice_date": "02/10/2024",
+        "due_date": "03/10/2024",
+        "po_reference": "PO-2024-1001",
+        "invoice_amount": 2754.0,
+    }
+
+def test_labelled_due_date_is_not_taken_as_the_invoice_date():
+    assert values(FieldScanner(), "Due Date: 03/10/2024") == {"due_date": "03/10/2024"}
+
+def test_tie_breaks():
+    scanner = FieldScanner()
+    # "last": the final total on the page wins among equal-confidence totals
+    assert values(scanner, "Total: 10.00\nTotal: 12.50")["invoice_amount"] == 12.5
+    # "max": the largest dollar figure wins when nothing is labelled
+    assert values(scanner, "Ref 2024-01-05 costs $1,200.00 and $99.99")["invoice_amount"] == 1200.0
+
+def test_codes_and_dates_are_not_amounts():
+    found = values(FieldScanner(), "ACME Corporation\nPart 123-456 shipped 2024-01-05")
+    assert "invoice_amount" not in found
+    assert found["invoice_date"] == "2024-01-05"
+
+def test_matches_start_at_word_boundaries_only():
+    scanner = FieldScanner([FieldRule("po_reference", r"(PO-\d+)", 0.6)])
+    assert values(scanner, "XPO-123") == {}
+    assert values(scanner, "see PO-123") == {"po_reference": "PO-123"}
+
+def test_higher_confidence_beats_earlier_position():
+    scanner = FieldScanner([
+        FieldRule("invoice_number", r"(\d{5})", 0.2),
+        FieldRule("invoice_number", r"(?i:invoice\s+no\.?)\s*(\d{5})", 0.9),
+    ])
+    assert values(scanner, "12345 ... Invoice No. 67890")["invoice_number"] == "67890"
+
+def test_invalid_rules_are_rejected():
+    with pytest.raises(ValueError, match="capturing group"):
+        FieldScanner([FieldRule("invoice_number", r"INV-\d+", 0.5)])
+    with pytest.raises(ValueError, match="prefer"):
+        FieldScanner([FieldRule("invoice_number", r"(INV-\d+)", 0.5, prefer="best")])
+
+def test_rules_load_from_file_and_sign_the_rule_set(tmp_path):
+    rules = [{"field": "po_reference", "pattern": r"(REQ-\d+)", "confidence": 0.5}]
+    path = tmp_path / "rules.json"
+    path.write_text(json.dumps(rules))
+    scanner = FieldScanner.from_file(str(path))
+    assert values(scanner, "REQ-42") == {"po_reference": "REQ-42"}
+    assert scanner.signature == FieldScanner([FieldRule(**rules[0])]).signature
+    assert scanner.signature != FieldScanner().signature
@@ -0,0 +1,79 @@
+"""POMatrix must pick the same PO, score and reasoning as fuzzy_match's loop"""
+import random
+import pytest
+from app.services.ai_matching_service import ai_matching_service
+from app.services.fuzzy_matcher import POMatrix
+
+VENDORS = ["ACME Corporation", "acme", "Globex", "Globex Industrial Supply", "Initech", "", None]
+DESCRIPTIONS = ["Office supplies", "Steel bolts M8", "Freight", "", None]
+PARTS = ["OFF-SUP-001", "BOLT-M8", "FRT", "", None]
+
+def make_pos(rng: random.Random, count: int):
+    pos = []
+    for i in range(count):
+        pos.append({
+            "po_id": i,
+            "po_number": f"PO-{rng.randint(1000, 1050)}",
+            "po_line": rng.randint(1, 3),
+            "vendor_name": rng.choice(VENDORS),
+            # Missing and zero amounts never score on amount
+            "line_amount": rng.choice([None, 0.0, 100.0, 104.0, 109.0, 250.0, round(rng.uniform(1, 500), 2)]),
+            "line_description": rng.choice(DESCRIPTIONS),
+            "part_number": rng.choice(PARTS),
+            "supplier_part": rng.choice(PARTS),
+        })
+    return pos
+
+def make_invoices(rng: random.Random, count: int):
+    invoices = []
+    for _ in range(count):
+        invoice = {
+            "vendor_name": rng.choice(VENDORS + ["acme corporation inc", "Glob"]),
+            "invoice_amount": rng.choice([None, 0, 100.0, 105.0, 250.0, round(rng.uniform(1, 500), 2)]),
+            "po_reference": rng.choice([None, "", "PO-1001", "1002", "PO-1003-A"]),
+            "description": rng.choice(DESCRIPTIONS + ["bolts"]),
+        }
+        part = rng.choice(PARTS)
+        if part is not None:
+            invoice["part_number"] = part
+        invoices.append(invoice)
+    return invoices
+
+@pytest.mark.parametrize("seed", [1, 2, 3])
+def test_matrix_matches_loop_on_seeded_corpus(seed):
+    rng = random.Random(seed)
+    pos = make_pos(rng, 300)
+    matrix = POMatrix(pos)
+    for invoice in make_invoices(rng, 200):
+        assert matrix.best_match(invoice) == ai_matching_service.fuzzy_match(invoice, pos)
+
+def test_ties_keep_the_first_best_po():
+    po = {"po_number": "PO-1", "vendor_name": "Acme", "line_amount": 100.0}
+    pos = [dict(po, po_id=1), dict(po, po_id=2), dict(po, po_id=3)]
+    invoice = {"vendor_name": "acme", "invoice_amount": 100.0}
+    best_po, score, reasoning = POMatrix(pos).best_match(invoice)
+    assert best_po["po_id"] == 1
+    assert (best_po, score, reasoning) == ai_matching_service.fuzzy_match(invoice, pos)
+
+def test_missing_amounts_and_empty_vendors_do_not_score():
+    pos = [
+        {"po_id": 1, "po_number": "PO-1", "vendor_name": "", "line_amount": None},
+        {"po_id": 2, "po_number": "PO-2", "vendor_name": None, "line_amount": 0.0},
+    ]
+    for invoice in ({"vendor_name": "", "invoice_amount": 0}, {"invoice_amount": None}, {}):
+        assert POMatrix(pos).best_match(invoice) == (None, 0.0, "No suitable matches found")
+        assert ai_matching_service.fuzzy_match(invoice, pos) == (None, 0.0, "No suitable matches found")
+
+def test_empty_po_set():
+    assert POMatrix([]).best_match({"vendor_name": "Acme"}) == ai_matching_service.fuzzy_match(
+        {"vendor_name": "Acme"}, []
+    )
+
+@pytest.mark.parametrize("invoice_count", [1, 40])
+def test_batch_matches_loop_on_either_engine(invoice_count):
+    rng = random.Random(4)
+    pos = make_pos(rng, 250)
+    invoices = make_invoices(rng, invoice_count)
+    expected = [ai_matching_service.fuzzy_match(invoice, pos) for invoice in invoices]
+    assert ai_matching_service.fuzzy_match_batch(invoices, pos) == expected
+    assert ai_matching_service.fuzzy_match_batch(invoices, POMatrix(pos)) == expected
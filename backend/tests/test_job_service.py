@@ -0,0 +1,67 @@
+"""Job failure handling: retries, permanent failures and worker survival"""
+import asyncio
+from datetime import datetime
+from fastapi.testclient import TestClient
+from app.models.database import Job
+from app.services import job_service as job_service_module
+from app.services.job_service import JobService
+
+def add_job(db, **values) -> int:
+    job = Job(file_path="missing.txt", filename="missing.txt", next_run_at=datetime.utcnow(), **values)
+    db.add(job)
+    db.commit()
+    return job.id
+
+def test_retryable_failure_is_requeued_with_backoff(db):
+    job_id = add_job(db, status="running", attempts=1, max_attempts=5)
+    JobService()._record_failure(db, job_id, "timed out")
+    job = db.get(Job, job_id)
+    assert (job.status, job.last_error) == ("queued", "timed out")
+    assert job.next_run_at > datetime.utcnow()
+
+def test_permanent_failure_is_not_retried(db):
+    job_id = add_job(db, status="running", attempts=1, max_attempts=5)
+    JobService()._record_failure(db, job_id, "Unsupported file type: .doc", retryable=False)
+    assert db.get(Job, job_id).status == "failed"
+
+def test_missing_job_is_nothing_to_record(db):
+    JobService()._record_failure(db, 12345, "gone")
+
+def test_unreadable_file_fails_the_job_at_once(db):
+    job_id = add_job(db, status="running", attempts=1, max_attempts=5)
+    asyncio.run(JobService()._run(job_id))
+    db.expire_all()
+    job = db.get(Job, job_id)
+    assert job.status == "failed" and job.attempts == 1
+
+def test_worker_survives_a_job_that_cannot_be_recorded(db, monkeypatch):
+    service = JobService()
+    claims = iter([1, 2])
+    ran = []
+
+    async def claim(fn, *args):
+        return next(claims, None)
+
+    async def run(job_id):
+        ran.append(job_id)
+        if job_id == 1:
+            raise RuntimeError("database is locked")
+        service._stopping.set()
+
+    monkeypatch.setattr(service, "_poll", lambda now: (True, False))
+    monkeypatch.setattr(job_service_module.write_queue, "run_async", claim)
+    monkeypatch.setattr(service, "_run", run)
+
+    async def main():
+        service._stopping = asyncio.Event()
+        await asyncio.wait_for(service._worker_loop(0), timeout=5)
+
+    asyncio.run(main())
+    assert ran == [1, 2]
+
+def test_upload_async_rejects_unsupported_types(db):
+    from app.main import app
+    with TestClient(app) as client:
+        response = client.post("/api/invoices/upload-async", files={"file": ("invoice.exe", b"MZ")})
+    assert response.status_code == 400
+    assert db.query(Job).count() == 0
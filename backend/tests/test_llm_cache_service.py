@@ -0,0 +1,44 @@
+"""LLM cache keys and the two cache layers"""
+from datetime import datetime
+from app.services.ai_matching_service import ai_matching_service
+from app.services.llm_cache_service import LLMCacheService
+
+INVOICE = {"invoice_number": "INV-1", "vendor_name": "Acme", "invoice_amount": 100.0}
+POS = [{"po_number": "PO-1", "po_line": 1, "vendor_name": "Acme", "line_amount": 100.0}]
+
+def test_make_key_is_stable_and_separates_parts():
+    assert LLMCacheService.make_key("match", "m", "a") == LLMCacheService.make_key("match", "m", "a")
+    assert LLMCacheService.make_key("ab", "c") != LLMCacheService.make_key("a", "bc")
+    assert LLMCacheService.make_key("match", "m1", "a") != LLMCacheService.make_key("match", "m2", "a")
+    assert LLMCacheService.make_key(None, "a") == LLMCacheService.make_key("", "a")
+
+def test_match_key_follows_the_prompt_context():
+    _, _, key = ai_matching_service._prepare_match_request(INVOICE, POS)
+    assert ai_matching_service._prepare_match_request(dict(INVOICE), [dict(POS[0])])[2] == key
+    assert ai_matching_service._prepare_match_request(dict(INVOICE, invoice_amount=101.0), POS)[2] != key
+    assert ai_matching_service._prepare_match_request(INVOICE, [dict(POS[0], line_amount=99.0)])[2] != key
+
+def test_round_trip_through_memory_and_database(db):
+    cache = LLMCacheService(max_entries=10, ttl_seconds=60, enabled=True)
+    key = cache.make_key("match", "m", "ctx")
+    assert cache.get(key) is None
+    cache.set(key, "match", "m", '{"po_index": 0}')
+    assert cache.get(key) == '{"po_index": 0}'
+    # A fresh process-level cache falls through to the table
+    assert LLMCacheService(max_entries=10, ttl_seconds=60, enabled=True).get(key) == '{"po_index": 0}'
+
+def test_invalidate_drops_one_kind(db):
+    cache = LLMCacheService(max_entries=10, ttl_seconds=60, enabled=True)
+    match_key, other_key = cache.make_key("match", "x"), cache.make_key("validate", "x")
+    cache.set(match_key, "match", "m", "a")
+    cache.set(other_key, "validate", "m", "b")
+    cache.invalidate("match")
+    assert cache.get(match_key) is None
+    assert cache.get(other_key) == "b"
+
+def test_lru_evicts_the_least_recently_used():
+    cache = LLMCacheService(max_entries=2, ttl_seconds=60, enabled=True)
+    with cache._lock:
+        for key in ("a", "b", "c"):
+            cache._remember(key, key, datetime.max)
+    assert list(cache._lru) == ["b", "c"]
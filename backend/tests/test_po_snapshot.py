@@ -0,0 +1,74 @@
+"""PO snapshot files: write, map and read back"""
+import pytest
+from app.services.po_candidate_index import POSTINGS, POCandidateIndex, _Snapshot
+from app.services.po_snapshot import FIELDS, MappedPOSnapshot, POSnapshotStore, write_snapshot
+
+POS = [
+    {"po_id": 1, "po_number": "PO-1001", "po_line": 1, "vendor_id": "V1", "vendor_name": "Acme Supply",
+     "line_amount": 1250.0, "remaining_amount": 1250.0, "line_description": "Widgets"},
+    {"po_id": 2, "po_number": "PO-1001", "po_line": 2, "vendor_id": "V1", "vendor_name": "Acme Supply",
+     "line_amount": None, "remaining_amount": 0.0, "line_description": None},
+    {"po_id": 3, "po_number": "PO-2002", "po_line": None, "vendor_id": None, "vendor_name": "Zürich Tools",
+     "line_amount": 99.99, "remaining_amount": None, "line_description": ""},
+]
+
+def publish(store: POSnapshotStore, pos=POS) -> str:
+    snapshot = _Snapshot(pos, 0.05)
+    return store.publish(pos, {name: getattr(snapshot, name) for name in POSTINGS}, {
+        "bucket_log": snapshot.bucket_log,
+    })
+
+def mapped(tmp_path, pos=POS) -> MappedPOSnapshot:
+    return MappedPOSnapshot(publish(POSnapshotStore(str(tmp_path)), pos))
+
+def test_rows_round_trip_with_nulls(tmp_path):
+    snapshot = mapped(tmp_path)
+    assert len(snapshot) == len(POS)
+    assert snapshot.select(range(len(POS))) == [{name: po[name] for name in FIELDS} for po in POS]
+    assert snapshot.select([2, 0]) == [{name: POS[i][name] for name in FIELDS} for i in (2, 0)]
+    assert snapshot.line_amounts([0, 1, 2]) == [1250.0, None, 99.99]
+
+def test_postings_match_the_in_memory_tables(tmp_path):
+    snapshot, source = mapped(tmp_path), _Snapshot(POS, 0.05)
+    for name in POSTINGS:
+        for key, rows in getattr(source, name).items():
+            assert snapshot.postings(name, key) == list(rows)
+    assert snapshot.postings("by_vendor", "no such vendor") == []
+
+def test_empty_snapshot(tmp_path):
+    snapshot = mapped(tmp_path, [])
+    assert len(snapshot) == 0
+    assert snapshot.select([]) == []
+    assert snapshot.postings("by_vendor", "acme supply") == []
+
+def test_bad_and_truncated_files_are_rejected(tmp_path):
+    path = tmp_path / "po.snap"
+    write_snapshot(str(path), POS, {}, {"bucket_log": 0.05})
+    data = path.read_bytes()
+    path.write_bytes(b"NOTASNAP" + data[8:])
+    with pytest.raises(ValueError, match="Not a PO snapshot"):
+        MappedPOSnapshot(str(path))
+    path.write_bytes(data[:-16])
+    with pytest.raises(ValueError, match="Truncated"):
+        MappedPOSnapshot(str(path))
+
+def test_store_points_at_the_newest_version_and_prunes(tmp_path):
+    store = POSnapshotStore(str(tmp_path), keep=2)
+    assert store.current_path() is None
+    paths = [publish(store) for _ in range(4)]
+    assert store.current_path() == paths[-1]
+    # Another process sees the same pointer
+    assert POSnapshotStore(str(tmp_path)).current_path() == paths[-1]
+    assert sorted(p.name for p in tmp_path.glob("*.snap")) == [p.rsplit("/", 1)[-1] for p in paths[-2:]]
+
+@pytest.mark.parametrize("invoice", [
+    {"po_reference": "PO-1001"},
+    {"vendor_name": "ACME Supply Inc", "invoice_amount": 1250.0},
+    {"invoice_amount": 100.0},
+    {"vendor_name": "Nobody"},
+])
+def test_mapped_and_in_memory_candidates_agree(tmp_path, invoice):
+    in_memory, on_disk = POCandidateIndex(), POCandidateIndex()
+    in_memory._snapshot = _Snapshot(POS, in_memory.bucket_ratio)
+    on_disk._snapshot = mapped(tmp_path)
+    assert on_disk.candidates(invoice) == in_memory.candidates(invoice)
@@ -0,0 +1,97 @@
+"""Row-hash change detection in the Epicor PO sync"""
+from app.models.database import PurchaseOrder, SyncState
+from app.services.po_sync_service import WATERMARK_NAME, POSyncService
+
+def baq_row(po_number="PO-1", po_line=1, **fields):
+    row = {
+        "po_number": po_number,
+        "po_line": po_line,
+        "vendor_id": "V1",
+        "vendor_name": "Acme",
+        "line_description": "Bolts",
+        "line_amount": 100.0,
+        "received_amount": 0.0,
+        "due_date": "2026-01-31",
+    }
+    row.update(fields)
+    return row
+
+def test_row_hash_is_stable():
+    service = POSyncService()
+    assert service._normalize(baq_row())["row_hash"] == service._normalize(baq_row())["row_hash"]
+
+def test_row_hash_follows_synced_columns_only():
+    service = POSyncService()
+    base = service._normalize(baq_row())["row_hash"]
+    for change in ({"line_amount": 101.0}, {"received_amount": 50.0}, {"vendor_name": "Acme Inc"},
+                   {"due_date": "2026-02-01"}, {"open_line": False}):
+        assert service._normalize(baq_row(**change))["row_hash"] != base, change
+    # The key and change timestamp identify the row; they are not its content
+    assert service._normalize(baq_row(po_number="PO-2", po_line=3))["row_hash"] == base
+    assert service._normalize(baq_row(changed_at="2026-01-01T00:00:00"))["row_hash"] == base
+
+def test_sync_writes_only_changed_rows(db):
+    service = POSyncService(chunk_size=2)
+    rows = [baq_row(po_line=1), baq_row(po_line=2), baq_row("PO-2", 1)]
+    first = service.sync(db, rows)
+    assert (first["total"], first["inserted"], first["unchanged"]) == (3, 3, 0)
+
+    again = service.sync(db, rows)
+    assert (again["inserted"], again["updated"], again["closed"], again["unchanged"]) == (0, 0, 0, 3)
+
+    changed = [baq_row(po_line=1, line_amount=150.0), baq_row(po_line=2, open_line=False), baq_row("PO-2", 1)]
+    delta = service.sync(db, changed)
+    assert (delta["inserted"], delta["updated"], delta["closed"], delta["unchanged"]) == (0, 1, 1, 1)
+
+    lines = {(po.po_number, po.po_line): po for po in db.query(PurchaseOrder)}
+    assert lines[("PO-1", 1)].line_amount == 150.0
+    assert lines[("PO-1", 2)].remaining_amount == 0.0
+
+def test_sync_keeps_the_last_duplicate_in_a_chunk(db):
+    service = POSyncService(chunk_size=10)
+    result = service.sync(db, [baq_row(line_amount=1.0), baq_row(line_amount=2.0)])
+    assert result["total"] == 1
+    assert db.query(PurchaseOrder.line_amount).scalar() == 2.0
+
+def test_sync_records_the_watermark_and_never_moves_it_back(db):
+    service = POSyncService()
+    service.sync(db, [baq_row(changed_at="2026-03-01T10:00:00")])
+    service.sync(db, [baq_row(changed_at="2026-02-01T10:00:00", line_amount=5.0)])
+    assert service.get_watermark(db) == "2026-03-01T10:00:00"
+    assert db.get(SyncState, WATERMARK_NAME).last_row_count == 1
+
+def test_fallback_update_keeps_created_date(db, monkeypatch):
+    service = POSyncService()
+    monkeypatch.setattr(service, "_has_line_key", lambda db: False)
+    service.sync(db, [baq_row()])
+    created = db.query(PurchaseOrder.created_date).scalar()
+    result = service.sync(db, [baq_row(line_amount=150.0)])
+    assert result["updated"] == 1
+    db.expire_all()
+    po = db.query(PurchaseOrder).one()
+    assert (po.line_amount, po.created_date) == (150.0, created)
+    assert po.updated_date > created
+
+def test_full_sync_closes_lines_the_baq_stopped_returning(db):
+    service = POSyncService(chunk_size=2)
+    service.sync(db, [baq_row(po_line=1), baq_row(po_line=2), baq_row("PO-2", 1)], full=True)
+
+    # A delta only carries what changed; absent lines stay open
+    delta = service.sync(db, [baq_row(po_line=1, line_amount=150.0)])
+    assert delta["closed"] == 0
+
+    full = service.sync(db, [baq_row(po_line=1, line_amount=150.0)], full=True)
+    assert (full["closed"], full["unchanged"]) == (2, 1)
+    open_lines = {(po.po_number, po.po_line) for po in db.query(PurchaseOrder).filter(PurchaseOrder.remaining_amount > 0)}
+    assert open_lines == {("PO-1", 1)}
+
+    # A closed line that comes back open is reopened
+    again = service.sync(db, [baq_row(po_line=1, line_amount=150.0), baq_row("PO-2", 1)], full=True)
+    assert (again["updated"], again["closed"]) == (1, 0)
+    assert db.query(PurchaseOrder).filter_by(po_number="PO-2").one().remaining_amount == 100.0
+
+def test_empty_full_sync_closes_nothing(db):
+    service = POSyncService()
+    service.sync(db, [baq_row()])
+    assert service.sync(db, [], full=True)["closed"] == 0
+    assert db.query(PurchaseOrder).one().remaining_amount == 100.0
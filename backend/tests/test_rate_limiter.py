@@ -0,0 +1,71 @@
+"""Token buckets behind the async LLM rate limiter, on a fake clock"""
+import asyncio
+import pytest
+from app.services import rate_limiter
+from app.services.rate_limiter import AsyncRateLimiter, TokenBucket
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+        self.slept = []
+
+    def monotonic(self) -> float:
+        return self.now
+
+    async def sleep(self, seconds: float):
+        self.slept.append(seconds)
+        self.now += seconds
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeClock()
+    monkeypatch.setattr(rate_limiter.time, "monotonic", fake.monotonic)
+    monkeypatch.setattr(rate_limiter.asyncio, "sleep", fake.sleep)
+    return fake
+
+def test_bucket_starts_full_and_drains(clock):
+    bucket = TokenBucket(60)  # one per second
+    assert bucket.wait_time(60) == 0.0
+    bucket.take(60)
+    assert bucket.wait_time(1) == pytest.approx(1.0)
+    assert bucket.wait_time(30) == pytest.approx(30.0)
+
+def test_bucket_refills_up_to_capacity(clock):
+    bucket = TokenBucket(60)
+    bucket.take(60)
+    clock.now += 10
+    assert bucket.wait_time(10) == 0.0
+    clock.now += 3600
+    bucket.wait_time(1)
+    assert bucket.tokens == pytest.approx(60.0)
+
+def test_oversized_request_waits_for_a_full_bucket_only(clock):
+    bucket = TokenBucket(60)
+    assert bucket.wait_time(1000) == 0.0
+    bucket.take(1000)
+    assert bucket.tokens == pytest.approx(0.0)
+
+def test_give_back_is_capped(clock):
+    bucket = TokenBucket(60)
+    bucket.take(10)
+    bucket.give_back(100)
+    assert bucket.tokens == pytest.approx(60.0)
+
+def test_limiter_waits_for_both_buckets(clock):
+    limiter = AsyncRateLimiter(requests_per_minute=2, tokens_per_minute=600)
+
+    async def run():
+        await limiter.acquire(300)
+        await limiter.acquire(300)
+        # Request bucket empty (one per 30s) and token bucket empty (10/s)
+        await limiter.acquire(100)
+
+    asyncio.run(run())
+    assert clock.slept and sum(clock.slept) == pytest.approx(30.0)
+
+def test_refund_returns_unused_tokens(clock):
+    limiter = AsyncRateLimiter(requests_per_minute=0, tokens_per_minute=600)
+    asyncio.run(limiter.acquire(600))
+    limiter.refund(200)
+    assert limiter.tokens.wait_time(200) == 0.0
+    assert limiter.requests is None
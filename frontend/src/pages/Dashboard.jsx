@@ -16,11 +16,11 @@ export default function Dashboard() {
     try {
       setLoading(true);
       const [matchesRes, posRes] = await Promise.all([
-        axios.get(`${API_BASE}/invoices/pending-matches`),
-        axios.get(`${API_BASE}/purchase-orders`)
+        axios.get(`${API_BASE}/invoices/pending-matches`, { params: { limit: 100 } }),
+        axios.get(`${API_BASE}/purchase-orders/`, { params: { limit: 100 } })
       ]);
-      setMatches(matchesRes.data);
-      setPos(posRes.data);
+      setMatches(matchesRes.data.items);
+      setPos(posRes.data.items);
     } catch (error) {
       console.error('Error fetching data:', error);
     } finally {